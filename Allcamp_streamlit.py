@@ -3,8 +3,33 @@ import pandas as pd
 import numpy as np
 import pydeck as pdk
 import altair as alt
-from datetime import datetime, timedelta
-import calendar
+import functools
+import logging
+import os
+import time
+
+from allcamp_calendar import DAY_TYPES, WEEKDAY_NAMES, memorial_to_labor_day, parse_weekdays
+from allcamp_pipeline import (
+    RESULT_CACHE_DIR,
+    Pipeline,
+    ResultCache,
+    SourceWatcher,
+    WarmUp,
+    latest_build,
+    aggregate_bookings_by_hex,
+    compute_expansion_opportunities,
+    compute_lost_revenue,
+    occupancy_for_range,
+    period_window,
+    slice_monthly_occupancy,
+    updatable_build,
+)
+from allcamp_profile import instrumented, is_profiling, profiling, stage
+
+# Copy-on-Write: frames derived from the shared artifacts (column picks,
+# filters) reuse their memory until written to, and writes never reach the
+# shared originals.
+pd.set_option("mode.copy_on_write", True)
 
 # ==============================
 # 1. PAGE CONFIG & BASIC THEME
@@ -120,162 +145,184 @@ alt.themes.enable("allcamp_theme")
 
 
 # ==============================
-# 3. DATA LOADING
+# 3. DATA PIPELINE
 # ==============================
-@st.cache_data
-def load_campgrounds_data():
-    df = pd.read_csv("campgrounds.csv")
-    df["went_live_date"] = pd.to_datetime(df["went_live_date"], errors="coerce")
-    df["first_booked_at_date"] = pd.to_datetime(
-        df["first_booked_at_date"], errors="coerce", utc=True, format='ISO8601'
+# Precomputed builds written by `python allcamp_build.py`.
+ARTIFACTS_DIR = os.environ.get("ALLCAMP_ARTIFACTS_DIR", "artifacts")
+# ALLCAMP_COMPACT=1 loads the source frames with downcast counts and
+# categorical strings (see compact_frame).
+COMPACT = os.environ.get("ALLCAMP_COMPACT", "") not in ("", "0")
+# ALLCAMP_CHUNK_SIZE=<rows> streams transactions.csv that many rows at a time
+# instead of loading it whole (for files larger than memory).
+CHUNK_SIZE = int(os.environ.get("ALLCAMP_CHUNK_SIZE") or 0) or None
+# ALLCAMP_BACKEND picks the engine for the derived tables (see BACKENDS in
+# allcamp_pipeline), "duckdb" or "polars".
+BACKEND = os.environ.get("ALLCAMP_BACKEND", "pandas")
+# ALLCAMP_WATCH=<seconds> checks the source CSVs that often and switches to
+# refreshed data when one is replaced (see SourceWatcher).
+WATCH_INTERVAL = float(os.environ.get("ALLCAMP_WATCH") or 0)
+# Results are kept on disk across restarts (see ResultCache), up to
+# ALLCAMP_RESULT_CACHE_MB megabytes; 0 turns that off.
+RESULT_CACHE_MB = float(os.environ.get("ALLCAMP_RESULT_CACHE_MB") or 1024)
+# The first run after the server starts begins building every page's tables
+# in the background (see get_warm_up); ALLCAMP_WARM=0 turns that off.
+WARM_UP = os.environ.get("ALLCAMP_WARM", "1") not in ("", "0")
+
+
+@st.cache_resource
+def get_watcher():
+    """
+    One lazily built Pipeline per server process, shared by all sessions,
+    held by a SourceWatcher (started when WATCH_INTERVAL is set). Artifacts
+    come from the latest build in ARTIFACTS_DIR when it still matches the
+    CSVs; anything it lacks is loaded from the result cache or computed
+    here. When only transactions.csv changed since a build made with
+    --incremental, that build's booking artifacts are updated rather than
+    recomputed.
+    """
+    store = latest_build(ARTIFACTS_DIR, ".")
+    base = None
+    if store is None and not CHUNK_SIZE:
+        base = updatable_build(ARTIFACTS_DIR, ".", compact=COMPACT)
+    cache = ResultCache(RESULT_CACHE_DIR, max_mb=RESULT_CACHE_MB) if RESULT_CACHE_MB else None
+    pipeline = Pipeline(
+        ".", store=store, compact=COMPACT, chunk_size=CHUNK_SIZE, backend=BACKEND, base=base,
+        cache=cache,
     )
-    df["campground_h3_hexagon_id_l4"] = df["campground_h3_hexagon_id_l4"].astype(str)
-    return df
-
-@st.cache_data
-def load_transactions_data():
-    df = pd.read_csv("transactions.csv")
-    df["trip_checkin_date"] = pd.to_datetime(df["trip_checkin_date"], errors="coerce")
-    df["trip_checkout_date"] = pd.to_datetime(df["trip_checkout_date"], errors="coerce")
-    df["h3_hexagon_id_l4"] = df["h3_hexagon_id_l4"].astype(str)
-    return df
-
-@st.cache_data
-def load_searches_data():
-    df = pd.read_csv("searches.csv")
-    df["destination_h3_cell_id"] = df["destination_h3_cell_id"].astype(str)
-    df["destination_h3_parent_id"] = df["destination_h3_parent_id"].astype(str, errors="ignore")
-    df["origin_h3_cell_id"] = df["origin_h3_cell_id"].astype(str)
-    df["origin_h3_parent_id"] = df["origin_h3_parent_id"].astype(str, errors="ignore")
-    return df
-
-df_camp = load_campgrounds_data()
-df_trans = load_transactions_data()
-df_search = load_searches_data()
+    watcher = SourceWatcher(pipeline, interval=WATCH_INTERVAL, log=logging.getLogger("allcamp.watch").info)
+    return watcher.start() if WATCH_INTERVAL else watcher
 
 
-# ==============================
-# 4. PARTIAL REVENUE LOGIC
-# ==============================
-analysis_start = pd.to_datetime("2028-01-01")
-analysis_end   = pd.to_datetime("2028-12-31")
-
-# Filter out canceled only
-df_trans_valid = df_trans[df_trans["is_booking_canceled"] == False].copy()
-
-def nights_in_overlap(checkin, checkout, window_start, window_end):
-    """Compute how many nights fall in [window_start, window_end]."""
-    if pd.isnull(checkin) or pd.isnull(checkout):
-        return 0
-    trip_start = max(checkin, window_start)
-    trip_end = min(checkout, window_end + pd.Timedelta(days=1))
-    return max((trip_end - trip_start).days, 0)
-
-def total_trip_nights(checkin, checkout):
-    """Total nights for the entire booking (checkout exclusive)."""
-    if pd.isnull(checkin) or pd.isnull(checkout):
-        return 0
-    return (checkout - checkin).days
-
-# Partial revenue column
-df_trans_valid["partial_revenue_2028"] = 0.0
-df_trans_valid["partial_nights_2028"] = 0
-df_trans_valid["total_trip_nights"] = 0
-
-for idx, row in df_trans_valid.iterrows():
-    cin = row["trip_checkin_date"]
-    cout= row["trip_checkout_date"]
-    overlap = nights_in_overlap(cin, cout, analysis_start, analysis_end)
-    full_nights = total_trip_nights(cin, cout)
-    if full_nights > 0 and overlap > 0:
-        fraction_2028 = overlap / full_nights
-        df_trans_valid.at[idx, "partial_revenue_2028"] = fraction_2028 * row["trip_total_cost"]
-        df_trans_valid.at[idx, "partial_nights_2028"]  = overlap
-        df_trans_valid.at[idx, "total_trip_nights"]    = full_nights
+def show_refresh_status(watcher):
+    if watcher.refreshing:
+        st.sidebar.info(
+            f"New {', '.join(watcher.refreshing)}: refreshing in the background; "
+            "pages show the previous data until it is ready."
+        )
+    elif watcher.last_refresh is not None:
+        last = watcher.last_refresh
+        if last["error"]:
+            st.sidebar.warning(
+                f"Refresh for {', '.join(last['changed'])} failed at {last['at']}; "
+                f"still showing the previous data until the file is replaced again. {last['error']}"
+            )
+        else:
+            st.sidebar.caption(
+                f"Refreshed at {last['at']} for {', '.join(last['changed'])}: "
+                f"{len(last['rebuilt'])} tables rebuilt, {len(last['recoded'])} renumbered, "
+                f"{len(last['kept'])} kept."
+            )
 
+# Derived tables each page reads. Opening a page builds only these and their
+# upstream dependencies (see ARTIFACTS in allcamp_pipeline).
+PAGE_ARTIFACTS = {
+    "Home / Overview": ["overview_stats"],
+    "Campgrounds": ["campgrounds", "agg_df_camp"],
+    "Transactions": ["transactions_2028", "agg_df_trans", "h3_ids"],
+    "Monthly Occupancy (By Category, 2028)": ["monthly_occupancy"],
+    "Search Demand": ["search_rollups"],
+    "Expansion Opportunities": ["transactions_2028", "expansion_data", "lost_revenue"],
+}
 
-# ==============================
-# 5. BASIC AGGREGATIONS
-# ==============================
-agg_df_camp = (
-    df_camp
-    .dropna(subset=["went_live_date"])
-    .groupby("campground_h3_hexagon_id_l4", dropna=True)
-    .agg(
-        count_of_campgrounds=("campground_uuid", "nunique"),
-        total_sites=("number_of_sites", "sum"),
-        total_tent_sites=("tent_friendly_sites", "sum"),
-        total_rv_sites=("rv_friendly_sites", "sum"),
-        total_structure_sites=("structure_sites", "sum"),
-    )
-    .reset_index()
-    .rename(columns={"campground_h3_hexagon_id_l4": "h3_id"})
-)
 
-agg_df_trans = (
-    df_trans_valid.groupby("h3_hexagon_id_l4", dropna=True)
-    .agg(
-        count_of_bookings=("booking_uuid", "nunique"),
-        total_revenue=("partial_revenue_2028", "sum"),
-    )
-    .reset_index()
-    .rename(columns={"h3_hexagon_id_l4": "h3_id"})
-)
+def select_day_type(label, key):
+    """
+    Day-type selectbox, with a weekday picker for custom sets. Returns the
+    choice's label and a hashable day type for allcamp_calendar.
+    """
+    choice = st.selectbox(label, list(DAY_TYPES) + ["Custom weekdays"], key=key)
+    if choice != "Custom weekdays":
+        return choice, choice
+    days = st.multiselect("Nights of:", WEEKDAY_NAMES, default=["Fri", "Sat"], key=key + "_days")
+    weekdays = parse_weekdays(days)
+    return "Custom: " + (" ".join(WEEKDAY_NAMES[d] for d in weekdays) or "no nights"), weekdays
 
 
-# ==============================
-# 6. OVERVIEW STATS
-# ==============================
-@st.cache_data
-def compute_overview_stats():
-    df_valid_2028 = df_trans_valid[df_trans_valid["partial_nights_2028"] > 0].copy()
-
-    total_camp_count_all = df_camp["campground_uuid"].nunique()
-    df_live = df_camp[df_camp["went_live_date"].notnull()]
-    live_camp_count = df_live["campground_uuid"].nunique()
-    df_active = df_camp[df_camp["first_booked_at_date"].notnull()]
-    active_camp_count = df_active["campground_uuid"].nunique()
-
-    total_revenue_2028 = df_valid_2028["partial_revenue_2028"].sum()
-    total_bookings_2028 = df_valid_2028["booking_uuid"].nunique()
-
-    merged = df_valid_2028.merge(
-        df_camp[["campground_uuid","campground_state"]],
-        on="campground_uuid",
-        how="left"
+def select_date_range(cube):
+    """
+    Start/end date picker bounded by the site-night cube's span. Defaults to
+    Memorial Day through Labor Day 2028. Returns inclusive Timestamps.
+    """
+    first = cube["start"]
+    last = first + pd.Timedelta(days=cube["n_days"] - 1)
+    default = tuple(
+        min(max(d, first), last) for d in memorial_to_labor_day(2028)
     )
-    revenue_by_state = (
-        merged.groupby("campground_state")["partial_revenue_2028"].sum()
-        .reset_index()
-        .rename(columns={"partial_revenue_2028":"state_revenue_2028"})
-        .sort_values("state_revenue_2028", ascending=False)
+    picked = st.date_input(
+        "Date Range:", value=(default[0].date(), default[1].date()),
+        min_value=first.date(), max_value=last.date(), key="occupancy_range",
     )
+    if len(picked) < 2:
+        picked = (picked[0], picked[0])
+    return pd.Timestamp(picked[0]), pd.Timestamp(picked[1])
 
-    cat_counts = (
-        df_valid_2028.groupby("campsite_category")["booking_uuid"]
-        .nunique()
-        .reset_index()
-        .rename(columns={"booking_uuid":"count_of_bookings"})
+
+def day_type_expansion(pipeline, day_type):
+    """
+    expansion_data and lost_revenue with capacity and usage limited to a day
+    type, through the result cache.
+    """
+    expansion = pipeline.cached(
+        "expansion_data",
+        lambda: compute_expansion_opportunities(
+            pipeline.get("campgrounds"), pipeline.get("transactions_2028"),
+            pipeline.get("search_rollups"), pipeline.get("h3_ids"), day_type=day_type,
+        ),
+        day_type=day_type,
+    )
+    lost_revenue = pipeline.cached(
+        "lost_revenue",
+        lambda: compute_lost_revenue(
+            pipeline.get("campgrounds"), pipeline.get("transactions_2028"), expansion
+        ),
+        day_type=day_type,
     )
+    return expansion, lost_revenue
 
-    return {
-        "total_camp_count_all": total_camp_count_all,
-        "live_camp_count": live_camp_count,
-        "active_camp_count": active_camp_count,
-        "total_revenue_2028": total_revenue_2028,
-        "total_bookings_2028": total_bookings_2028,
-        "revenue_by_state_df": revenue_by_state,
-        "campsite_category_df": cat_counts,
-    }
 
-overview_stats = compute_overview_stats()
+@st.cache_resource(max_entries=16)
+def expansion_for_day_type(_pipeline, generation, day_type):
+    """
+    day_type_expansion, kept in memory. `generation` is the watcher's, so a
+    refresh starts a fresh entry.
+    """
+    return day_type_expansion(_pipeline, day_type)
+
+
+@st.cache_resource
+def get_warm_up():
+    """
+    The server's WarmUp, started by the first run of any session: every
+    page's artifacts, the home page's first, then (into the result cache,
+    when there is one) the expansion figures for each preset day type.
+    """
+    pipeline = get_watcher().pipeline
+    names = list(dict.fromkeys(name for names in PAGE_ARTIFACTS.values() for name in names))
+    tasks = [
+        (f"expansion_data ({label})", functools.partial(day_type_expansion, pipeline, label))
+        for label in DAY_TYPES
+        if label != "All nights" and pipeline.cache is not None
+    ]
+    return WarmUp(pipeline, names, tasks).start()
+
+
+def show_warm_up_status(warm_up):
+    if warm_up.running:
+        st.sidebar.info(
+            f"Warming up ({warm_up.done}/{warm_up.total} ready): building {warm_up.current}."
+        )
+    elif warm_up.errors:
+        st.sidebar.warning(
+            "Warm-up could not build: " + "; ".join(f"{k}: {v}" for k, v in warm_up.errors.items())
+        )
 
 
 # ==============================
-# 7. MAP HELPERS
+# 4. MAP HELPERS
 # ==============================
+@instrumented
 def build_hex_map(df, metric_col, tooltip_label, lat=34.5, lng=-85.0, zoom=4, max_clip=None):
-    local_df = df.copy()
+    local_df = df.copy(deep=False)
     if max_clip is not None and len(local_df) > 0:
         clip_val = np.percentile(local_df[metric_col], max_clip)
         local_df["clipped"] = local_df[metric_col].clip(upper=clip_val)
@@ -325,9 +372,9 @@ def build_hex_map(df, metric_col, tooltip_label, lat=34.5, lng=-85.0, zoom=4, ma
     return pdk.Deck(layers=[tile_layer, h3_layer], initial_view_state=view_state, tooltip=tooltip)
 
 
+@instrumented
 def build_search_map(df, h3_col, metric_col="searchers", tooltip_label="Search Volume"):
-    local_df = df.copy()
-    local_df.rename(columns={h3_col:"h3_id"}, inplace=True)
+    local_df = df.rename(columns={h3_col:"h3_id"})
 
     if len(local_df) > 0:
         clip_val = np.percentile(local_df[metric_col], 95)
@@ -378,115 +425,14 @@ def build_search_map(df, h3_col, metric_col="searchers", tooltip_label="Search V
     return pdk.Deck(layers=[tile_layer, h3_layer], initial_view_state=view_state, tooltip=tooltip)
 
 
-# ==============================
-# 8. OCCUPANCY LOGIC 
-# ==============================
-
-def compute_occupancy_for_month_category_with_all(month, category, weekend_only=False):
-
-    start_date_2028 = pd.to_datetime(f"2028-{month:02d}-01")
-    last_day = calendar.monthrange(2028, month)[1]
-    end_date_2028 = pd.to_datetime(f"2028-{month:02d}-{last_day}")
-
-    df_cg = df_camp.copy()
-
-    def capacity_sites_for_cat(row):
-        if category == "All":
-            return row.get("number_of_sites", 0) or 0
-        elif category == "tent-or-rv":
-            return (row.get("tent_friendly_sites", 0) or 0) + (row.get("rv_friendly_sites", 0) or 0)
-        elif category == "rv-only":
-            return row.get("rv_friendly_sites", 0) or 0
-        elif category == "structure":
-            return row.get("structure_sites", 0) or 0
-        else:
-            # fallback
-            return row.get("number_of_sites", 0) or 0
-
-    # Only consider campgrounds that went live by end_date_2028
-    df_cg = df_cg[df_cg["went_live_date"].notnull()].copy()
-    df_cg["capacity_sites_for_cat"] = df_cg.apply(capacity_sites_for_cat, axis=1)
-
-    df_cg["start_for_capacity"] = df_cg["went_live_date"].apply(
-        lambda d: max(d, start_date_2028) if pd.notnull(d) else start_date_2028
-    )
-    df_cg["end_for_capacity"] = end_date_2028
-
-    capacity_list = []
-    for idx, row in df_cg.iterrows():
-        live_start = row["start_for_capacity"]
-        live_end   = row["end_for_capacity"]
-        cat_sites  = row["capacity_sites_for_cat"]
-        if live_end < live_start or cat_sites <= 0:
-            capacity_list.append(0)
-            continue
-
-        if not weekend_only:
-            days_in_window = (live_end - live_start).days + 1
-            capacity_list.append(days_in_window * cat_sites)
-        else:
-            # Only count FRI=4, SAT=5, SUN=6
-            days_count = 0
-            current = live_start
-            while current <= live_end:
-                if current.weekday() in [4,5,6]:
-                    days_count += 1
-                current += pd.Timedelta(days=1)
-            capacity_list.append(days_count * cat_sites)
-
-    df_cg["capacity_site_nights"] = capacity_list
-    capacity_by_hex = (
-        df_cg
-        .groupby("campground_h3_hexagon_id_l4", dropna=True)["capacity_site_nights"]
-        .sum()
-        .reset_index()
-        .rename(columns={"campground_h3_hexagon_id_l4":"h3_id"})
-    )
-
-    # If "All", do not filter by campsite_category. Otherwise filter
-    df_trans_filtered = df_trans_valid.copy()
-    df_trans_filtered = df_trans_filtered[df_trans_filtered["trip_checkout_date"] <= end_date_2028].copy()
-
-    if category != "All":
-        df_trans_filtered = df_trans_filtered[df_trans_filtered["campsite_category"] == category]
-
-    usage_list = []
-    for idx, b_row in df_trans_filtered.iterrows():
-        cin  = b_row["trip_checkin_date"]
-        cout = b_row["trip_checkout_date"]
-        overlap_start = max(cin, start_date_2028)
-        overlap_end   = min(cout, end_date_2028)
-        if overlap_end <= overlap_start:
-            usage_list.append(0)
-        else:
-            if not weekend_only:
-                usage_list.append((overlap_end - overlap_start).days)
-            else:
-                # weekend-only usage
-                day_count = 0
-                current = overlap_start
-                while current < overlap_end:
-                    if current.weekday() in [4,5,6]:
-                        day_count += 1
-                    current += pd.Timedelta(days=1)
-                usage_list.append(day_count)
-
-    df_trans_filtered["used_site_nights"] = usage_list
-    usage_by_hex = (
-        df_trans_filtered
-        .groupby("h3_hexagon_id_l4", dropna=True)["used_site_nights"]
-        .sum()
-        .reset_index()
-        .rename(columns={"h3_hexagon_id_l4":"h3_id"})
-    )
-
-    merged = capacity_by_hex.merge(usage_by_hex, on="h3_id", how="outer").fillna(0)
-    merged["occupancy_rate"] = 0.0
-    valid_mask = merged["capacity_site_nights"] > 0
-    merged.loc[valid_mask, "occupancy_rate"] = (
-        merged.loc[valid_mask,"used_site_nights"] / merged.loc[valid_mask,"capacity_site_nights"]
-    )
-    return merged, start_date_2028, end_date_2028
+def show_deck(deck):
+    """st.pydeck_chart, recording the serialized payload size when profiling."""
+    if not is_profiling():
+        st.pydeck_chart(deck)
+        return
+    with stage("pydeck_chart") as record:
+        record["payload_kb"] = len(deck.to_json()) / 1024
+        st.pydeck_chart(deck)
 
 
 def tiered_color_for_occupancy(occ):
@@ -499,243 +445,7 @@ def tiered_color_for_occupancy(occ):
 
 
 # ==============================
-# 9. SEARCH DEMAND PAGE
-# ==============================
-def group_search_by_parent_id(df, parent_col="destination_h3_parent_id"):
-    grp = (
-        df.groupby(parent_col, dropna=True)[["searchers","rv_searchers","tent_searchers"]]
-        .sum()
-        .reset_index()
-    )
-    return grp
-
-
-# ==============================
-# 10. EXPANSION OPPORTUNITIES
-# ==============================
-def days_in_overlap(start_date, end_date, window_start, window_end):
-    actual_start = max(start_date, window_start)
-    actual_end   = min(end_date, window_end)
-    diff = (actual_end - actual_start).days + 1
-    return max(diff, 0)
-
-@st.cache_data
-def compute_expansion_opportunities():
-    df_camp_se = df_camp[
-        (df_camp["campground_region"] == "Southeast")
-        & (df_camp["went_live_date"].notnull())
-    ].copy()
-
-    partial_cap = []
-    rv_cap = []
-    tent_cap = []
-    struct_cap = []
-
-    for idx, row in df_camp_se.iterrows():
-        wld = row["went_live_date"]
-        if pd.isnull(wld):
-            partial_cap.append(0)
-            rv_cap.append(0)
-            tent_cap.append(0)
-            struct_cap.append(0)
-            continue
-
-        days_live = days_in_overlap(
-            wld, pd.Timestamp("2099-12-31"), analysis_start, analysis_end
-        )
-        total_sites = row.get("number_of_sites", 0) or 0
-        rv_sites    = row.get("rv_friendly_sites", 0) or 0
-        tent_sites  = row.get("tent_friendly_sites", 0) or 0
-        st_sites    = row.get("structure_sites", 0) or 0
-
-        partial_cap.append(days_live * total_sites)
-        rv_cap.append(days_live * rv_sites)
-        tent_cap.append(days_live * tent_sites)
-        struct_cap.append(days_live * st_sites)
-
-    df_camp_se["partial_capacity"]   = partial_cap
-    df_camp_se["rv_capacity"]        = rv_cap
-    df_camp_se["tent_capacity"]      = tent_cap
-    df_camp_se["structure_capacity"] = struct_cap
-
-    cap_se = (
-        df_camp_se
-        .groupby("campground_h3_hexagon_id_l4", dropna=True)
-        .agg({
-            "partial_capacity":"sum",
-            "rv_capacity":"sum",
-            "tent_capacity":"sum",
-            "structure_capacity":"sum",
-        })
-        .reset_index()
-        .rename(columns={"campground_h3_hexagon_id_l4":"h3_id"})
-    )
-
-    df_trans_se = df_trans_valid.merge(
-        df_camp_se[["campground_uuid","campground_h3_hexagon_id_l4"]],
-        on="campground_uuid",
-        how="inner"
-    )
-
-    usage_list = []
-    rv_usage_list = []
-    tent_usage_list = []
-    struct_usage_list = []
-
-    for idx, row in df_trans_se.iterrows():
-        cin = row["trip_checkin_date"]
-        cout= row["trip_checkout_date"]
-        days_booked = days_in_overlap(cin, cout - pd.Timedelta(days=1), analysis_start, analysis_end)
-        usage_list.append(days_booked)
-
-        cat = row.get("campsite_category", None)
-        if cat == "rv-only":
-            rv_usage_list.append(days_booked)
-            tent_usage_list.append(0)
-            struct_usage_list.append(0)
-        elif cat == "tent-or-rv":
-            rv_usage_list.append(days_booked / 2.0)
-            tent_usage_list.append(days_booked / 2.0)
-            struct_usage_list.append(0)
-        elif cat == "structure":
-            rv_usage_list.append(0)
-            tent_usage_list.append(0)
-            struct_usage_list.append(days_booked)
-        else:
-            tent_usage_list.append(days_booked)
-            rv_usage_list.append(0)
-            struct_usage_list.append(0)
-
-    df_trans_se["used_site_nights"]      = usage_list
-    df_trans_se["used_rv_nights"]        = rv_usage_list
-    df_trans_se["used_tent_nights"]      = tent_usage_list
-    df_trans_se["used_structure_nights"] = struct_usage_list
-
-    usage_agg = (
-        df_trans_se
-        .groupby("campground_h3_hexagon_id_l4", dropna=True)
-        .agg({
-            "used_site_nights":"sum",
-            "used_rv_nights":"sum",
-            "used_tent_nights":"sum",
-            "used_structure_nights":"sum",
-        })
-        .reset_index()
-        .rename(columns={"campground_h3_hexagon_id_l4":"h3_id"})
-    )
-
-    merged_occ = cap_se.merge(usage_agg, on="h3_id", how="outer").fillna(0)
-    merged_occ["occupancy_rate"] = 0.0
-    valid_mask = merged_occ["partial_capacity"]>0
-    merged_occ.loc[valid_mask,"occupancy_rate"] = (
-        merged_occ.loc[valid_mask,"used_site_nights"] / merged_occ.loc[valid_mask,"partial_capacity"]
-    )
-
-    # Summarize search demand
-    if "glamping_searchers" in df_search.columns:
-        srch_cols = ["searchers","rv_searchers","tent_searchers","glamping_searchers"]
-    else:
-        srch_cols = ["searchers","rv_searchers","tent_searchers"]
-
-    search_agg = (
-        df_search
-        .groupby("destination_h3_cell_id", dropna=True)[srch_cols]
-        .sum()
-        .reset_index()
-        .rename(columns={"destination_h3_cell_id":"h3_id"})
-        .fillna(0)
-    )
-    if "glamping_searchers" not in search_agg.columns:
-        search_agg["glamping_searchers"] = 0
-
-
-    final_df = merged_occ.merge(search_agg, on="h3_id", how="outer").fillna(0)
-    final_df["priority_score"] = final_df["occupancy_rate"] * final_df["searchers"]
-
-    final_df["general_searchers"] = (
-        final_df["searchers"]
-        - final_df["rv_searchers"]
-        - final_df["tent_searchers"]
-        - final_df["glamping_searchers"]
-    )
-    final_df["sum_of_specified"] = (
-        final_df["rv_searchers"]
-        + final_df["tent_searchers"]
-        + final_df["glamping_searchers"]
-    )
-    final_df["rv_searchers_adjusted"] = final_df["rv_searchers"]
-    final_df["tent_searchers_adjusted"] = final_df["tent_searchers"]
-    final_df["structure_searchers_adjusted"] = final_df["glamping_searchers"]
-
-    has_spec = final_df["sum_of_specified"] > 0
-    final_df.loc[has_spec,"rv_searchers_adjusted"] += (
-        final_df.loc[has_spec,"general_searchers"]
-        * (final_df.loc[has_spec,"rv_searchers"]/final_df.loc[has_spec,"sum_of_specified"])
-    )
-    final_df.loc[has_spec,"tent_searchers_adjusted"] += (
-        final_df.loc[has_spec,"general_searchers"]
-        * (final_df.loc[has_spec,"tent_searchers"]/final_df.loc[has_spec,"sum_of_specified"])
-    )
-    final_df.loc[has_spec,"structure_searchers_adjusted"] += (
-        final_df.loc[has_spec,"general_searchers"]
-        * (final_df.loc[has_spec,"glamping_searchers"]/final_df.loc[has_spec,"sum_of_specified"])
-    )
-
-    # Mismatch ratio
-    # Shortfall-based approach: mismatch = 0 if demand <= supply,
-    # else (demand - supply)/ supply, and 10 if supply=0 but demand>0.
-
-    # Example for RV:
-    final_df["rv_mismatch_ratio"] = 0.0
-
-    rv_demand = final_df["rv_searchers_adjusted"]
-    rv_supply = final_df["rv_capacity"]
-
-    # Where supply > 0 and demand > supply => ratio = (demand - supply)/supply
-    short_mask = (rv_supply > 0) & (rv_demand > rv_supply)
-    final_df.loc[short_mask,"rv_mismatch_ratio"] = (
-        (rv_demand[short_mask] - rv_supply[short_mask]) / rv_supply[short_mask]
-    )
-
-    # If supply=0 but there's demand => ratio=10
-    inf_mask = (rv_supply==0) & (rv_demand>0)
-    final_df.loc[inf_mask,"rv_mismatch_ratio"] = 10
-
-    # Repeat for tent:
-    final_df["tent_mismatch_ratio"] = 0.0
-    tent_demand = final_df["tent_searchers_adjusted"]
-    tent_supply = final_df["tent_capacity"]
-    short_mask_tent = (tent_supply>0) & (tent_demand>tent_supply)
-    final_df.loc[short_mask_tent,"tent_mismatch_ratio"] = (
-        (tent_demand[short_mask_tent] - tent_supply[short_mask_tent]) / tent_supply[short_mask_tent]
-    )
-    inf_mask_tent = (tent_supply==0) & (tent_demand>0)
-    final_df.loc[inf_mask_tent,"tent_mismatch_ratio"] = 10
-
-    # And for structure:
-    final_df["structure_mismatch_ratio"] = 0.0
-    str_demand = final_df["structure_searchers_adjusted"]
-    str_supply = final_df["structure_capacity"]
-    short_mask_str = (str_supply>0) & (str_demand>str_supply)
-    final_df.loc[short_mask_str,"structure_mismatch_ratio"] = (
-        (str_demand[short_mask_str] - str_supply[short_mask_str]) / str_supply[short_mask_str]
-    )
-    inf_mask_str = (str_supply==0) & (str_demand>0)
-    final_df.loc[inf_mask_str,"structure_mismatch_ratio"] = 10
-
-    # Finally set max mismatch
-    final_df["max_mismatch_ratio"] = final_df[[
-        "rv_mismatch_ratio","tent_mismatch_ratio","structure_mismatch_ratio"
-    ]].max(axis=1)
-
-
-    return final_df
-
-expansion_data = compute_expansion_opportunities()
-
-
-# ==============================
-# 11. MULTI-PAGE APP
+# 5. MULTI-PAGE APP
 # ==============================
 def main():
     pages = [
@@ -746,12 +456,44 @@ def main():
         "Search Demand",
         "Expansion Opportunities"
     ]
-    page = st.sidebar.radio("Go to Page:", pages)
+    page = st.sidebar.radio("Go to Page:", pages, key="page")
+    watcher = get_watcher()
+    # One Pipeline for the whole rerun, even if a refresh swaps it meanwhile.
+    generation, pipeline = watcher.generation, watcher.pipeline
+    show_refresh_status(watcher)
+    warm_up = get_warm_up() if WARM_UP else None
+    if warm_up is not None:
+        show_warm_up_status(warm_up)
+    warming = warm_up is not None and warm_up.running and warm_up.pipeline is pipeline
+    if warming:
+        missing = [name for name in PAGE_ARTIFACTS[page] if not pipeline.is_built(name)]
+        if missing:
+            # Have the warm-up build this page's tables next, and check back
+            # rather than building them here alongside it.
+            warm_up.prefer(missing)
+            st.info(
+                f"Warming up: preparing {', '.join(missing)} for this page. "
+                "It opens by itself when they are ready."
+            )
+            time.sleep(1)
+            st.rerun()
+    if pipeline.store is not None:
+        st.sidebar.caption(f"Precomputed build: {pipeline.store.version}")
+    artifacts = pipeline.get_many(PAGE_ARTIFACTS[page])
+    # memory_report waits for any build in progress, so not while warming.
+    if COMPACT and pipeline.is_built("sources") and not warming:
+        report = pipeline.get("memory_report")
+        st.sidebar.caption(
+            f"Compact frames: {report['after_mb'].sum():,.1f} MB "
+            f"(from {report['before_mb'].sum():,.1f} MB)"
+        )
 
     # ===================================
     #  HOME / OVERVIEW (IMPROVED LAYOUT)
     # ===================================
     if page == "Home / Overview":
+        overview_stats = artifacts["overview_stats"]
+
         # --- Hero Banner ---
         st.markdown(
             """
@@ -882,7 +624,7 @@ def main():
 
         # Top States by 2028 Partial Revenue
         st.markdown("### Top States by 2028 Gross Booking Volume")
-        df_states = overview_stats["revenue_by_state_df"].copy()
+        df_states = overview_stats["revenue_by_state_df"]
         top_states = df_states.head(8)
 
         bar_chart = (
@@ -921,6 +663,9 @@ def main():
     #  CAMPGROUNDS PAGE
     # ===========================
     elif page == "Campgrounds":
+        df_camp = artifacts["campgrounds"]
+        agg_df_camp = artifacts["agg_df_camp"]
+
         st.markdown(
             """
             <div style="background-color:#EFF6EE; 
@@ -938,7 +683,7 @@ def main():
         # ------------------------------------
         # 1) Quick Aggregations for KPI Cards
         # ------------------------------------
-        df_camp_live = df_camp[df_camp["went_live_date"].notnull()].copy()
+        df_camp_live = df_camp[df_camp["went_live_date"].notnull()]
         total_live_cg_count = df_camp_live["campground_uuid"].nunique()
         sum_all_sites = df_camp_live["number_of_sites"].fillna(0).sum()
         avg_sites_per_cg = sum_all_sites / total_live_cg_count if total_live_cg_count else 0
@@ -1090,7 +835,7 @@ def main():
             zoom=4, 
             max_clip=95
         )
-        st.pydeck_chart(deck_map)
+        show_deck(deck_map)
 
 
 
@@ -1099,6 +844,9 @@ def main():
     #  TRANSACTIONS PAGE
     # ===========================
     elif page == "Transactions":
+        df_trans_2028 = artifacts["transactions_2028"]
+        agg_df_trans = artifacts["agg_df_trans"]
+        h3_ids = artifacts["h3_ids"]
 
         # 1) Banner Title
         st.markdown(
@@ -1117,7 +865,6 @@ def main():
 
         # ----------------------------------------------------------------
         # 2) Compute KPI metrics
-        df_trans_2028 = df_trans_valid[df_trans_valid["partial_nights_2028"] > 0].copy()
         total_bookings_2028 = df_trans_2028["booking_uuid"].nunique()
         sum_revenue_2028 = df_trans_2028["partial_revenue_2028"].sum()
         avg_revenue_2028 = sum_revenue_2028 / total_bookings_2028 if total_bookings_2028 else 0
@@ -1198,7 +945,7 @@ def main():
 
         df_cat = (
             df_trans_2028
-            .groupby("campsite_category", dropna=True)
+            .groupby("campsite_category", dropna=True, observed=True)
             .agg(
                 bookings=("booking_uuid","nunique"),
                 revenue=("partial_revenue_2028","sum")
@@ -1257,17 +1004,7 @@ def main():
             local_agg = agg_df_trans
         else:
             cat_subset = df_trans_2028[df_trans_2028["campsite_category"] == chosen_cat]
-            cat_agg = (
-                cat_subset
-                .groupby("h3_hexagon_id_l4", dropna=True)
-                .agg(
-                    count_of_bookings=("booking_uuid","nunique"),
-                    total_revenue=("partial_revenue_2028","sum")
-                )
-                .reset_index()
-                .rename(columns={"h3_hexagon_id_l4":"h3_id"})
-            )
-            local_agg = cat_agg
+            local_agg = aggregate_bookings_by_hex(cat_subset, h3_ids)
 
         metric_options = {
             "Count of Bookings (Overlap 2028)": "count_of_bookings",
@@ -1285,13 +1022,15 @@ def main():
             zoom=4,  # Zoom level set to 4
             max_clip=95
         )
-        st.pydeck_chart(deck_map)
+        show_deck(deck_map)
 
 
     # ===========================
     #  MONTHLY OCCUPANCY PAGE
     # ===========================
     elif page == "Monthly Occupancy (By Category, 2028)":
+        monthly_occupancy = artifacts["monthly_occupancy"]
+
         # 1) Banner-Style Heading
         st.markdown(
             """
@@ -1307,20 +1046,35 @@ def main():
             unsafe_allow_html=True
         )
 
-        # 2) UI for Month, Category, Weekend Filter
+        # 2) UI for Period, Category, Day-Type Filter
+        period_mode = st.radio(
+            "Period:", ["Month of 2028", "Date range"], horizontal=True, key="occupancy_period"
+        )
         col1, col2, col3 = st.columns(3)
         with col1:
-            chosen_month = st.slider("Select Month (2028):", min_value=1, max_value=12, value=6)
+            if period_mode == "Month of 2028":
+                chosen_month = st.slider("Select Month (2028):", min_value=1, max_value=12, value=6)
+                start_d, end_d = period_window(2028, month=chosen_month)
+            else:
+                start_d, end_d = select_date_range(pipeline.get("site_night_cube"))
         with col2:
             cat_options = ["All", "tent-or-rv", "rv-only", "structure"]
             chosen_category = st.selectbox("Campsite Category:", cat_options)
         with col3:
-            weekend_only = st.checkbox("Weekend Only?", value=False)
-
-        # 3) Compute occupancy data
-        occ_df, start_d, end_d = compute_occupancy_for_month_category_with_all(
-            chosen_month, chosen_category, weekend_only
-        )
+            night_label, day_type = select_day_type("Nights Counted:", key="occupancy_nights")
+
+        # 3) Slice occupancy data from the precomputed monthly cube; other
+        # periods and day types are summed from the site-night cube directly.
+        if period_mode == "Month of 2028" and night_label in ("All nights", "Weekends (Fri-Sun)"):
+            occ_df = slice_monthly_occupancy(
+                monthly_occupancy, chosen_month, chosen_category,
+                weekend_only=night_label != "All nights",
+            )
+        else:
+            occ_df = occupancy_for_range(
+                pipeline.get("site_night_cube"), start_d, end_d,
+                chosen_category, day_type=day_type,
+            )
 
         # 4) Summaries for KPI Cards
         total_capacity = occ_df["capacity_site_nights"].sum()
@@ -1388,7 +1142,7 @@ def main():
             **Date Range**: {start_d.strftime('%B %Y')} – {end_d.strftime('%Y-%m-%d')}
             
             **Category**: {chosen_category}  
-            **Weekend Only**: {weekend_only}
+            **Nights Counted**: {night_label}
 
             **Total Capacity (site-nights)**  
             Sum of `capacity_site_nights` across all H3 cells in this time window.
@@ -1403,10 +1157,10 @@ def main():
             Number of distinct H3 hex cells that have capacity > 0 in this time window.
             """)
 
-        st.write("Toggle weekend-only to see if occupancy spikes on Fridays/Saturdays/Sundays.")
+        st.write("Switch the nights counted to see if occupancy spikes on weekends, holidays or in peak season.")
 
         # 7) Display the PyDeck Map
-        local_occ = occ_df.copy()
+        local_occ = occ_df
         local_occ["color_array"] = local_occ["occupancy_rate"].apply(tiered_color_for_occupancy)
 
         tile_layer = pdk.Layer(
@@ -1438,7 +1192,7 @@ def main():
             "style":{"backgroundColor":"rgba(0,0,0,0.7)","color":"white"}
         }
         deck = pdk.Deck(layers=[tile_layer, occ_layer], initial_view_state=view_state, tooltip=tooltip)
-        st.pydeck_chart(deck)
+        show_deck(deck)
 
         # 8) Top 10 H3 Cells Table
         top_10 = local_occ.sort_values("occupancy_rate", ascending=False).head(10)
@@ -1450,6 +1204,8 @@ def main():
     #  SEARCH DEMAND PAGE
     # ===========================
     elif page == "Search Demand":
+        search_rollups = artifacts["search_rollups"]
+
         # 1) Banner Title
         st.markdown(
             """
@@ -1465,10 +1221,10 @@ def main():
             unsafe_allow_html=True
         )
 
-        # 2) Compute some KPIs from df_search
-        total_searches = df_search["searchers"].sum()
-        distinct_dests = df_search["destination_h3_cell_id"].nunique()
-        distinct_origins = df_search["origin_h3_cell_id"].nunique()
+        # 2) Compute some KPIs from the search rollups
+        total_searches = search_rollups["total_searchers"]
+        distinct_dests = search_rollups["distinct_destinations"]
+        distinct_origins = search_rollups["distinct_origins"]
         avg_searches_per_dest = (total_searches / distinct_dests) if distinct_dests else 0
 
         # 3) KPI Cards
@@ -1546,20 +1302,14 @@ def main():
         mode = st.radio("View Search Volume by:", ["Destination", "Origin"])
 
         if mode == "Destination":
-            agg_dest = (
-                df_search
-                .groupby("destination_h3_cell_id")["searchers"]
-                .sum()
-                .reset_index()
-                .rename(columns={"searchers":"total_searchers"})
-            )
+            agg_dest = search_rollups["by_destination"]
             deck_map = build_search_map(
                 agg_dest,
                 h3_col="destination_h3_cell_id",
                 metric_col="total_searchers",
                 tooltip_label="Dest Search Vol"
             )
-            st.pydeck_chart(deck_map)
+            show_deck(deck_map)
 
             top_10_dest = agg_dest.sort_values("total_searchers", ascending=False).head(10)
             st.subheader("Top 10 Destination H3s by Searchers")
@@ -1568,28 +1318,18 @@ def main():
             st.write("---")
             st.subheader("Group by Destination's Parent ID")
             if st.checkbox("Show parent_id grouping?"):
-                parent_grp = (
-                    df_search.groupby("destination_h3_parent_id")[["searchers","rv_searchers","tent_searchers"]]
-                    .sum()
-                    .reset_index()
-                )
+                parent_grp = search_rollups["by_destination_parent"]
                 st.dataframe(parent_grp.sort_values("searchers", ascending=False).head(15))
 
         else:
-            agg_orig = (
-                df_search
-                .groupby("origin_h3_cell_id")["searchers"]
-                .sum()
-                .reset_index()
-                .rename(columns={"searchers":"total_searchers"})
-            )
+            agg_orig = search_rollups["by_origin"]
             deck_map = build_search_map(
                 agg_orig,
                 h3_col="origin_h3_cell_id",
                 metric_col="total_searchers",
                 tooltip_label="Orig Search Vol"
             )
-            st.pydeck_chart(deck_map)
+            show_deck(deck_map)
 
             top_10_orig = agg_orig.sort_values("total_searchers", ascending=False).head(10)
             st.subheader("Top 10 Origin H3s by Searchers")
@@ -1598,25 +1338,14 @@ def main():
             st.write("---")
             st.subheader("Group by Origin's Parent ID")
             if st.checkbox("Show parent_id grouping?"):
-                parent_grp = (
-                    df_search.groupby("origin_h3_parent_id")[["searchers","rv_searchers","tent_searchers"]]
-                    .sum()
-                    .reset_index()
-                )
+                parent_grp = search_rollups["by_origin_parent"]
                 st.dataframe(parent_grp.sort_values("searchers", ascending=False).head(15))
 
         # 6) Channel & Type Breakdown
         st.write("---")
         st.subheader("Channel & Type Breakdown")
 
-        channel_cols = [
-            "seo_searchers","paid_search_engine_searchers","social_searchers",
-            "sharing_searchers","direct_searchers","other_channel_searchers"
-        ]
-        df_channels = (
-            df_search[channel_cols].sum()
-            .reset_index().rename(columns={"index":"channel",0:"count_of_searchers"})
-        )
+        df_channels = search_rollups["channels"]
         ch_bar = (
             alt.Chart(df_channels)
             .mark_bar()
@@ -1629,16 +1358,8 @@ def main():
         st.altair_chart(ch_bar, use_container_width=True)
 
         st.subheader("Search Type Breakdown (Tent, RV, etc.)")
-        type_cols = [
-            "tent_searchers","rv_searchers","glamping_searchers",
-            "family_friendly_searchers","pet_friendly_searchers","good_for_groups_searchers"
-        ]
-        counts = []
-        for c in type_cols:
-            if c in df_search.columns:
-                counts.append((c, df_search[c].sum()))
-        if counts:
-            type_df = pd.DataFrame(counts, columns=["search_type","count_of_searchers"])
+        type_df = search_rollups["search_types"]
+        if len(type_df):
             type_bar = (
                 alt.Chart(type_df)
                 .mark_bar()
@@ -1657,6 +1378,8 @@ def main():
     #  EXPANSION OPPORTUNITIES
     # ===========================
     elif page == "Expansion Opportunities":
+        df_2028_only = artifacts["transactions_2028"]
+
         st.markdown(
             """
             <div style="background-color:#EFF6EE; 
@@ -1671,6 +1394,15 @@ def main():
             unsafe_allow_html=True
         )
 
+        # Capacity and usage can be limited to weekends, holidays, etc.
+        night_label, day_type = select_day_type("Nights Counted:", key="expansion_nights")
+        if night_label == "All nights":
+            expansion_data = artifacts["expansion_data"]
+            lost_revenue = artifacts["lost_revenue"]
+        else:
+            expansion_data, lost_revenue = expansion_for_day_type(pipeline, generation, day_type)
+            st.caption(f"Capacity and used site-nights below count only: {night_label}.")
+
         # --------------------------------------------
         # 1) Partial-Year / Mismatch Summary Stats
         # --------------------------------------------
@@ -1820,7 +1552,7 @@ def main():
             initial_view_state=view_state,
             tooltip=tooltip
         )
-        st.pydeck_chart(deck_map)
+        show_deck(deck_map)
 
         # --------------------------------------------
         # 1B) Mismatch Ratios (Demand > Supply)
@@ -1837,7 +1569,7 @@ def main():
         chosen_mm = st.selectbox("Select mismatch metric:", mismatch_metrics, index=3)
 
         min_search = st.slider("Minimum total searchers to display:", 0, 5000, 100)
-        map_df_2 = expansion_data[ expansion_data["searchers"] >= min_search ].copy()
+        map_df_2 = expansion_data[ expansion_data["searchers"] >= min_search ]
 
         map_df_2["tent_searchers_adjusted"] = map_df_2["tent_searchers_adjusted"].round(0).astype(int)
         map_df_2["rv_searchers_adjusted"]   = map_df_2["rv_searchers_adjusted"].round(0).astype(int)
@@ -1916,7 +1648,7 @@ def main():
             initial_view_state=mismatch_view_state,
             tooltip=mismatch_tip
         )
-        st.pydeck_chart(mismatch_deck)
+        show_deck(mismatch_deck)
 
         with st.expander("Click for definitions & notes on mismatch ratio"):
             st.markdown("""
@@ -1949,74 +1681,10 @@ def main():
         # ===============================================
         st.subheader("Lost Revenue from Unmet Demand (Using Actual Conversion & Rate)")
 
-        # 1) Filter Southeastern Campgrounds
-        df_camp_se = df_camp[
-            (df_camp["campground_region"] == "Southeast") 
-            & (df_camp["went_live_date"].notnull())
-        ].copy()
-
-        # 2) Merge Southeastern Campgrounds with valid transactions
-        df_trans_se = df_trans_valid.merge(
-            df_camp_se[["campground_uuid","campground_h3_hexagon_id_l4"]],
-            on="campground_uuid",
-            how="inner"
-        )
-
-        # Keep only bookings with partial nights in 2028:
-        df_trans_se_2028 = df_trans_se[df_trans_se["partial_nights_2028"] > 0].copy()
-
-        # A) Actual Southeastern Bookings & Searches
-        total_bookings_se = df_trans_se_2028["booking_uuid"].nunique()
-
-        total_searchers_se = expansion_data["searchers"].sum()
-
-        # B) Compute Real Conversion Rate
-        if total_searchers_se > 0:
-            actual_conversion_rate = total_bookings_se / total_searchers_se
-        else:
-            actual_conversion_rate = 0
-
-        # C) Compute Actual Average Nightly Rate (Southeast, partial 2028)
-        total_nights_se_2028 = df_trans_se_2028["partial_nights_2028"].sum()
-        total_revenue_se_2028 = df_trans_se_2028["partial_revenue_2028"].sum()
-
-        if total_nights_se_2028 > 0:
-            average_nightly_rate_se = total_revenue_se_2028 / total_nights_se_2028
-        else:
-            average_nightly_rate_se = 0
-
-        # D) Calculate "Unfilled" site-nights using the mismatch approach
-        df_loss = expansion_data.copy() 
-
-        # For each category, unfilled = max(demand - supply, 0)
-        df_loss["rv_unfilled"] = np.maximum(
-            df_loss["rv_searchers_adjusted"] - df_loss["rv_capacity"], 0
-        )
-        df_loss["tent_unfilled"] = np.maximum(
-            df_loss["tent_searchers_adjusted"] - df_loss["tent_capacity"], 0
-        )
-        df_loss["structure_unfilled"] = np.maximum(
-            df_loss["structure_searchers_adjusted"] - df_loss["structure_capacity"], 0
-        )
-
-        # Sum across categories to get total unfilled site-nights per hex
-        df_loss["unfilled_site_nights"] = (
-            df_loss["rv_unfilled"] 
-            + df_loss["tent_unfilled"] 
-            + df_loss["structure_unfilled"]
-        )
-
-        # E) Multiply by real conversion rate & real nightly rate
-        df_loss["lost_revenue_per_hex"] = (
-            df_loss["unfilled_site_nights"] 
-            * actual_conversion_rate 
-            * average_nightly_rate_se
-        )
-
-        # F) Sum across all Southeastern hexes
-        total_unfilled = df_loss["unfilled_site_nights"].sum()
-        # Multiply by 2 for avg booking length
-        total_lost_revenue = df_loss["lost_revenue_per_hex"].sum() * 2
+        actual_conversion_rate = lost_revenue["actual_conversion_rate"]
+        average_nightly_rate_se = lost_revenue["average_nightly_rate"]
+        total_unfilled = lost_revenue["total_unfilled"]
+        total_lost_revenue = lost_revenue["total_lost_revenue"]
 
         # G) Display
         st.write(f"**Actual Conversion Rate (SE, 2028):** {actual_conversion_rate:.2%}")
@@ -2042,7 +1710,6 @@ def main():
         st.header("Simplified Benchmarking & Potential Gains")
 
         # ---  A) Basic average rate & nights (still from actual transaction data) ---
-        df_2028_only = df_trans_valid[df_trans_valid["partial_nights_2028"] > 0].copy()
         total_nights_2028 = df_2028_only["partial_nights_2028"].sum()
         total_revenue_2028 = df_2028_only["partial_revenue_2028"].sum()
         total_bookings_2028 = df_2028_only["booking_uuid"].nunique()
@@ -2109,6 +1776,51 @@ def main():
 
 
 
+# ==============================
+# 6. PERFORMANCE PANEL
+# ==============================
+# Opt-in from the sidebar; ALLCAMP_PROFILE=1 turns it on by default. Stage
+# records are also logged as JSON lines on the "allcamp.profile" logger.
+PROFILE_BY_DEFAULT = os.environ.get("ALLCAMP_PROFILE", "") not in ("", "0")
+
+profile_logger = logging.getLogger("allcamp.profile")
+if not profile_logger.handlers:
+    profile_logger.addHandler(logging.StreamHandler())
+    profile_logger.setLevel(logging.INFO)
+
+
+def show_profile_panel(profile):
+    history = st.session_state.setdefault("profile_history", [])
+    history.append({
+        "page": profile.label,
+        "seconds": round(profile.seconds, 3),
+        "stages": len(profile.records),
+    })
+    del history[:-20]
+
+    with st.sidebar.expander("Performance", expanded=True):
+        st.caption(f"This rerun: {profile.seconds:.2f}s on {profile.label}")
+        stages = profile.frame()
+        stages["stage"] = [
+            "\u00a0\u00a0" * depth + name for depth, name in zip(stages["depth"], stages["stage"])
+        ]
+        st.dataframe(stages.drop(columns="depth").round(3), hide_index=True)
+        st.caption("Recent reruns")
+        st.dataframe(pd.DataFrame(history[::-1]), hide_index=True)
+
+
+def run():
+    st.session_state.setdefault("profile_enabled", PROFILE_BY_DEFAULT)
+    if st.session_state["profile_enabled"]:
+        # The page radio's previous value; None only on a session's first run.
+        with profiling(st.session_state.get("page")) as profile:
+            main()
+        profile.label = st.session_state.get("page")
+        show_profile_panel(profile)
+    else:
+        main()
+    st.sidebar.checkbox("Performance panel", key="profile_enabled")
+
 
 if __name__=="__main__":
-    main()
+    run()
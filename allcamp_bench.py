@@ -0,0 +1,245 @@
+"""
+Time and memory-profile every compute stage on synthetic data at several
+scales, and write a JSON report that can be diffed between releases.
+
+    python allcamp_bench.py --scales 1 10 100 --out bench.json
+    python allcamp_bench.py --compare bench.json
+    python allcamp_bench.py --workers 32
+
+Scale 1 is --base-transactions bookings (campgrounds and searches scale with
+it, see allcamp_synth.py). Generated data is kept under --data-root and
+reused by later runs with the same size and seed. With --workers, the
+parallel booking fold (parallel_booking_partials) is also timed with one
+worker and with N, and their ratio is reported as its speedup.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import allcamp_synth
+from allcamp_profile import row_count
+from allcamp_pipeline import (
+    PIPELINE_VERSION,
+    aggregate_bookings_by_hex,
+    aggregate_campgrounds_by_hex,
+    build_site_night_cube,
+    compute_expansion_opportunities,
+    compute_lost_revenue,
+    compute_monthly_occupancy,
+    compute_occupancy_for_month_category_with_all,
+    compute_overview_stats,
+    encode_h3_columns,
+    parallel_booking_partials,
+    read_typed_csv,
+    summarize_searches,
+    valid_transactions,
+)
+
+
+# ==============================
+# 1. STAGES
+# ==============================
+# name -> (names of the stage results it takes, function). Stages run in this
+# order; "data_dir" is the folder holding the scale's CSVs.
+STAGES = {
+    "load_campgrounds":  (("data_dir",), lambda d: read_typed_csv(os.path.join(d, "campgrounds.csv"))),
+    "load_transactions": (("data_dir",), lambda d: read_typed_csv(os.path.join(d, "transactions.csv"))),
+    "load_searches":     (("data_dir",), lambda d: read_typed_csv(os.path.join(d, "searches.csv"))),
+    "encode_h3":         (
+        ("load_campgrounds", "load_transactions", "load_searches"),
+        lambda c, t, s: encode_h3_columns(
+            {"campgrounds.csv": c, "transactions.csv": t, "searches.csv": s}
+        ),
+    ),
+    "prorate":           (("load_transactions",), valid_transactions),
+    "agg_df_camp":       (("load_campgrounds", "encode_h3"), aggregate_campgrounds_by_hex),
+    "agg_df_trans":      (("prorate", "encode_h3"), aggregate_bookings_by_hex),
+    "overview_stats":    (("load_campgrounds", "prorate"), compute_overview_stats),
+    "site_night_cube":   (("load_campgrounds", "prorate", "encode_h3"), build_site_night_cube),
+    "occupancy_month":   (
+        ("site_night_cube",),
+        lambda cube: compute_occupancy_for_month_category_with_all(cube, 7, "All"),
+    ),
+    "occupancy_month_weekend": (
+        ("site_night_cube",),
+        lambda cube: compute_occupancy_for_month_category_with_all(cube, 7, "All", weekend_only=True),
+    ),
+    "monthly_occupancy": (("site_night_cube",), compute_monthly_occupancy),
+    "search_rollups":    (("load_searches", "encode_h3"), summarize_searches),
+    "expansion":         (
+        ("load_campgrounds", "prorate", "search_rollups", "encode_h3"),
+        compute_expansion_opportunities,
+    ),
+    "lost_revenue":      (("load_campgrounds", "prorate", "expansion"), compute_lost_revenue),
+}
+
+
+def run_stage(func, args, repeat):
+    """Wall times of `repeat` runs, then one traced run for peak memory."""
+    seconds = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        seconds.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def bench_scale(data_dir, repeat, log=None, workers=None):
+    """
+    Per-stage timings for the CSVs in `data_dir`, and bench_parallel's
+    report when `workers` is given (else None).
+    """
+    results = {"data_dir": data_dir}
+    report = {}
+    for name, (deps, func) in STAGES.items():
+        args = [results[dep] for dep in deps]
+        result, seconds, peak = run_stage(func, args, repeat)
+        results[name] = result
+        report[name] = {
+            "seconds": [round(s, 6) for s in seconds],
+            "min_s": round(min(seconds), 6),
+            "median_s": round(statistics.median(seconds), 6),
+            "peak_mb": round(peak / 2**20, 2),
+            "rows_in": sum(row_count(arg) or 0 for arg in args),
+            "rows_out": row_count(result),
+        }
+        if log is not None:
+            log(f"  {name:<24} {report[name]['median_s']:9.4f}s  {report[name]['peak_mb']:9.1f} MB")
+    parallel = None
+    if workers:
+        parallel = bench_parallel(
+            results["load_campgrounds"], results["prorate"], results["encode_h3"], workers, repeat
+        )
+        if log is not None:
+            log(f"  parallel_booking_partials  1 worker {parallel['serial_s']:.4f}s, "
+                f"{workers} workers {parallel['parallel_s']:.4f}s, speedup {parallel['speedup']}x")
+    return report, parallel
+
+
+def bench_parallel(df_camp, df_valid, h3_ids, workers, repeat):
+    """
+    Best wall time of parallel_booking_partials over `repeat` runs with one
+    worker (folding in this process, the serial baseline) and with
+    `workers`, and "speedup", the first over the second.
+    """
+    def best(n):
+        seconds = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            parallel_booking_partials(df_camp, df_valid, h3_ids, n)
+            seconds.append(time.perf_counter() - t0)
+        return min(seconds)
+
+    serial, parallel = best(1), best(workers)
+    return {
+        "workers": workers,
+        "serial_s": round(serial, 6),
+        "parallel_s": round(parallel, 6),
+        "speedup": round(serial / parallel, 2) if parallel > 0 else None,
+    }
+
+
+# ==============================
+# 2. REPORT
+# ==============================
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "pipeline_version": PIPELINE_VERSION,
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(old, new, threshold):
+    """
+    Lines describing stages whose best time or peak memory grew by more than
+    `threshold` (a fraction) between two reports, per shared scale.
+    """
+    regressions = []
+    for scale, stages in new["scales"].items():
+        for name, cur in stages["stages"].items():
+            prev = old["scales"].get(scale, {}).get("stages", {}).get(name)
+            if prev is None:
+                continue
+            for key in ("min_s", "peak_mb"):
+                if prev[key] > 0 and cur[key] > prev[key] * (1 + threshold):
+                    regressions.append(
+                        f"{scale} {name} {key}: {prev[key]} -> {cur[key]} "
+                        f"(+{cur[key] / prev[key] - 1:.0%})"
+                    )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark AllCamp compute stages.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100],
+                        help="data sizes as multiples of --base-transactions")
+    parser.add_argument("--base-transactions", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-root", default=".bench_data", help="where synthetic data is kept")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--compare", metavar="REPORT", help="report to check for regressions against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown flagged by --compare (default 0.2)")
+    parser.add_argument("--workers", type=int, metavar="N",
+                        help="also time the parallel booking fold on N workers against one")
+    args = parser.parse_args(argv)
+
+    report = {"environment": environment(), "repeat": args.repeat, "scales": {}}
+    for scale in args.scales:
+        n = args.base_transactions * scale
+        data_dir = os.path.join(args.data_root, f"tx{n}_seed{args.seed}")
+        if not os.path.exists(os.path.join(data_dir, "searches.csv")):
+            print(f"generating {n:,} bookings in {data_dir}")
+            allcamp_synth.generate(data_dir, n, seed=args.seed)
+        print(f"scale {scale}x ({n:,} bookings)")
+        stages, parallel = bench_scale(data_dir, args.repeat, log=print, workers=args.workers)
+        report["scales"][f"{scale}x"] = {"transactions": n, "stages": stages}
+        if parallel is not None:
+            report["scales"][f"{scale}x"]["parallel"] = parallel
+
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=1)
+        print(f"wrote {args.out}")
+
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(json.load(fh), report, args.threshold)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Precompute every dashboard artifact without starting Streamlit.
+
+    python allcamp_build.py --data-dir . --out artifacts
+
+Each run writes a new version folder under --out and points --out/LATEST at
+it once complete; the dashboard serves the latest build on its next start.
+With --incremental, a run after new bookings arrive in transactions.csv
+updates the latest build instead of recomputing everything:
+
+    python allcamp_build.py --data-dir . --out artifacts --incremental
+"""
+import argparse
+import time
+
+from allcamp_pipeline import (
+    BACKENDS,
+    BUILD_ARTIFACTS,
+    LEDGER_ARTIFACTS,
+    Pipeline,
+    updatable_build,
+    write_build,
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build AllCamp dashboard artifacts.")
+    parser.add_argument("--data-dir", default=".", help="folder holding the source CSVs")
+    parser.add_argument("--out", default="artifacts", help="folder builds are written to")
+    parser.add_argument("--keep", type=int, default=3, help="number of builds to keep")
+    parser.add_argument(
+        "--only", nargs="+", choices=BUILD_ARTIFACTS, metavar="ARTIFACT",
+        help="build only these artifacts (the dashboard computes the rest)",
+    )
+    parser.add_argument(
+        "--compact", action="store_true",
+        help="downcast counts and store low-cardinality strings as categoricals",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, metavar="ROWS",
+        help="stream transactions.csv this many rows at a time instead of loading it whole",
+    )
+    parser.add_argument(
+        "--backend", choices=sorted(BACKENDS), default="pandas",
+        help="engine that computes the derived tables",
+    )
+    parser.add_argument(
+        "--workers", type=int, metavar="N",
+        help="fold bookings on N processes, partitioned by region and check-in month",
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="update the latest build when only transactions.csv changed since, "
+             "and keep what the next update needs",
+    )
+    args = parser.parse_args(argv)
+    if args.incremental and args.chunk_size:
+        parser.error("--incremental cannot be combined with --chunk-size")
+
+    t0 = time.perf_counter()
+    base = None
+    names = list(args.only or BUILD_ARTIFACTS)
+    if args.incremental:
+        base = updatable_build(args.out, args.data_dir, compact=args.compact)
+        if base is None:
+            print("no build to update; building everything")
+        names += [name for name in LEDGER_ARTIFACTS if name not in names]
+    pipeline = Pipeline(
+        args.data_dir, compact=args.compact, chunk_size=args.chunk_size, backend=args.backend,
+        workers=args.workers or (1 if args.incremental else None), base=base,
+    )
+    path = write_build(pipeline, args.out, names=names, keep=args.keep, log=print)
+    print(f"wrote {path} in {time.perf_counter() - t0:.2f}s")
+    if pipeline.is_built("booking_partials"):
+        report = pipeline.get("build_report")
+        if base is not None:
+            print(
+                f"updated {report['base']}: {report['rows_added']} rows added, "
+                f"{report['rows_removed']} removed "
+                f"({'appended' if report['appended'] else 'compared row by row'}) "
+                f"in {report['seconds']:.2f}s"
+            )
+        else:
+            print(
+                f"{report['partitions']} partitions on {report['workers']} workers: "
+                f"{report['work_s']:.2f}s of CPU in {report['wall_s']:.2f}s "
+                f"(CPU/wall {report['cpu_over_wall']}x)"
+            )
+    if args.compact:
+        print(pipeline.get("memory_report").to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Night-of-stay calendars for day-type filters (weekends, holidays, peak
+season, custom weekday sets).
+
+A day type is a function from a DatetimeIndex of nights to a boolean mask.
+count_nights counts the matching nights in many intervals at once: one pass
+builds a prefix sum over the mask for the span involved, then each interval
+is two lookups.
+"""
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import USFederalHolidayCalendar, USLaborDay, USMemorialDay
+
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+# Fri, Sat, Sun (pd.Timestamp.weekday numbering)
+WEEKEND_DAYS = (4, 5, 6)
+
+
+def parse_weekdays(days):
+    """
+    Weekday numbers (Mon=0) from ints, names ("Fri Sat", ["Fri", "Sat"]) or
+    a numpy-style weekmask string ("0000111").
+    """
+    if isinstance(days, str):
+        if set(days) <= {"0", "1"} and len(days) == 7:
+            return tuple(i for i, flag in enumerate(days) if flag == "1")
+        days = days.replace(",", " ").split()
+    return tuple(sorted({
+        WEEKDAY_NAMES.index(d[:3].title()) if isinstance(d, str) else int(d) for d in days
+    }))
+
+
+def weekmask(days):
+    """Day type for a fixed set of weekdays (anything parse_weekdays takes)."""
+    weekdays = parse_weekdays(days)
+
+    def mask(nights):
+        return np.isin(nights.dayofweek, weekdays)
+
+    # Lets the occupancy cube answer weekday-only filters with its per-weekday
+    # prefix sums instead of a day-by-day mask.
+    mask.weekdays = weekdays
+    return mask
+
+
+def federal_holidays(start, end):
+    return USFederalHolidayCalendar().holidays(start, end)
+
+
+def holiday_nights(nights):
+    """The night before each US federal holiday and the holiday itself."""
+    if len(nights) == 0:
+        return np.zeros(0, dtype=bool)
+    holidays = federal_holidays(nights[0], nights[-1] + pd.Timedelta(days=1))
+    return nights.isin(holidays) | nights.isin(holidays - pd.Timedelta(days=1))
+
+
+def holiday_weekend_nights(nights):
+    """Fri/Sat/Sun nights within three days of a US federal holiday, plus holiday eves."""
+    if len(nights) == 0:
+        return np.zeros(0, dtype=bool)
+    holidays = federal_holidays(nights[0] - pd.Timedelta(days=3), nights[-1] + pd.Timedelta(days=3))
+    near = np.zeros(len(nights), dtype=bool)
+    for shift in range(-3, 4):
+        near |= nights.isin(holidays + pd.Timedelta(days=shift))
+    weekend = np.isin(nights.dayofweek, WEEKEND_DAYS)
+    return (near & weekend) | nights.isin(holidays - pd.Timedelta(days=1))
+
+
+def memorial_to_labor_day(year):
+    """(Memorial Day, Labor Day) of a year."""
+    memorial = USMemorialDay.dates(f"{year}-01-01", f"{year}-12-31")[0]
+    labor = USLaborDay.dates(f"{year}-01-01", f"{year}-12-31")[0]
+    return memorial, labor
+
+
+def peak_season_nights(nights):
+    """Friday of Memorial Day weekend through the night before Labor Day."""
+    mask = np.zeros(len(nights), dtype=bool)
+    for year in np.unique(nights.year):
+        memorial, labor = memorial_to_labor_day(year)
+        mask |= (nights >= memorial - pd.Timedelta(days=3)) & (nights < labor)
+    return mask
+
+
+# Filters offered on the occupancy and expansion pages. None counts every night.
+DAY_TYPES = {
+    "All nights": None,
+    "Weekends (Fri-Sun)": weekmask(WEEKEND_DAYS),
+    "Weeknights (Mon-Thu)": weekmask((0, 1, 2, 3)),
+    "Federal holidays": holiday_nights,
+    "Holiday weekends": holiday_weekend_nights,
+    "Peak season (Memorial Day-Labor Day)": peak_season_nights,
+}
+
+
+def resolve_day_type(day_type):
+    """
+    A mask function (or None for every night) from a DAY_TYPES name, a mask
+    function, or a weekday set accepted by parse_weekdays.
+    """
+    if day_type is None or callable(day_type):
+        return day_type
+    if isinstance(day_type, str) and day_type in DAY_TYPES:
+        return DAY_TYPES[day_type]
+    return weekmask(day_type)
+
+
+def night_mask(day_type, start, end):
+    """Boolean mask over the nights start..end (inclusive) for a day type."""
+    nights = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq="D")
+    day_type = resolve_day_type(day_type)
+    if day_type is None:
+        return np.ones(len(nights), dtype=bool)
+    return np.asarray(day_type(nights), dtype=bool)
+
+
+def count_nights(first, last, day_type=None):
+    """
+    Nights of `day_type` in each inclusive interval [first, last] (datetime
+    arrays or Series, normalized to days). Missing dates or last < first
+    count as zero. Returns float64.
+    """
+    first = np.asarray(pd.to_datetime(first), dtype="datetime64[D]")
+    last = np.asarray(pd.to_datetime(last), dtype="datetime64[D]")
+    valid = ~(np.isnat(first) | np.isnat(last)) & (last >= first)
+    counts = np.zeros(len(first))
+    if not valid.any():
+        return counts
+
+    day_type = resolve_day_type(day_type)
+    if day_type is None:
+        counts[valid] = (last[valid] - first[valid]).astype(np.int64) + 1
+        return counts
+
+    lo, hi = first[valid].min(), last[valid].max()
+    cum = np.concatenate([[0], np.cumsum(night_mask(day_type, lo, hi))])
+    f = (first[valid] - lo).astype(np.int64)
+    l = (last[valid] - lo).astype(np.int64)
+    counts[valid] = cum[l + 1] - cum[f]
+    return counts
@@ -0,0 +1,2907 @@
+"""
+Data loading and derived tables behind the AllCamp dashboard.
+
+Nothing in here imports Streamlit. Every derived table is a named artifact in
+ARTIFACTS, and a Pipeline builds only the artifacts asked for (plus their
+upstream dependencies), once, on first use.
+"""
+import functools
+import hashlib
+import importlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from allcamp_calendar import WEEKEND_DAYS, count_nights, night_mask, resolve_day_type
+from allcamp_profile import instrumented, stage
+
+logger = logging.getLogger("allcamp.pipeline")
+
+
+# ==============================
+# 1. DATA LOADING
+# ==============================
+# Typed columns per source CSV; everything else keeps read_csv's inference.
+CSV_SCHEMAS = {
+    "campgrounds.csv": {
+        "went_live_date": "date",
+        "first_booked_at_date": "utc_date",
+        "campground_h3_hexagon_id_l4": "h3",
+    },
+    "transactions.csv": {
+        "trip_checkin_date": "date",
+        "trip_checkout_date": "date",
+        "h3_hexagon_id_l4": "h3",
+    },
+    "searches.csv": {
+        "destination_h3_cell_id": "h3",
+        "destination_h3_parent_id": "h3",
+        "origin_h3_cell_id": "h3",
+        "origin_h3_parent_id": "h3",
+    },
+}
+
+# Parquet copies of the typed CSVs live in this folder next to the CSVs. Bump
+# the version whenever the parsing in read_typed_csv changes, so stale files
+# are rebuilt.
+DATA_CACHE_DIR = ".allcamp_cache"
+DATA_CACHE_VERSION = 1
+
+
+def type_columns(df, name):
+    """Convert a parsed frame of the CSV `name` in place per CSV_SCHEMAS."""
+    for col, kind in CSV_SCHEMAS[name].items():
+        if col not in df.columns:
+            continue
+        if kind == "date":
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif kind == "utc_date":
+            df[col] = pd.to_datetime(df[col], errors="coerce", utc=True, format='ISO8601')
+        elif kind == "h3":
+            df[col] = df[col].astype(str)
+    return df
+
+
+def read_typed_csv(path):
+    """Parse one source CSV according to CSV_SCHEMAS."""
+    return type_columns(pd.read_csv(path), os.path.basename(path))
+
+
+def iter_typed_csv(path, chunk_size, usecols=None):
+    """read_typed_csv `chunk_size` rows at a time; row labels run on across chunks."""
+    name = os.path.basename(path)
+    for chunk in pd.read_csv(path, chunksize=chunk_size, usecols=usecols):
+        yield type_columns(chunk, name)
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_csv_cached(path):
+    """
+    Read a source CSV via its typed Parquet copy, re-parsing only when the CSV
+    changed. A size or mtime change triggers a hash check, so a touched but
+    identical file is not re-parsed. Falls back to the CSV without pyarrow.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return read_typed_csv(path)
+
+    name = os.path.basename(path)
+    cache_dir = os.path.join(os.path.dirname(path), DATA_CACHE_DIR)
+    cache_path = os.path.join(cache_dir, name + ".parquet")
+    meta_path = os.path.join(cache_dir, name + ".json")
+    stat = os.stat(path)
+    schema = {"version": DATA_CACHE_VERSION, "columns": CSV_SCHEMAS[name]}
+
+    meta = None
+    if os.path.exists(meta_path) and os.path.exists(cache_path):
+        with open(meta_path) as fh:
+            meta = json.load(fh)
+        if meta.get("schema") != schema or meta.get("size") != stat.st_size:
+            meta = None
+        elif meta.get("mtime_ns") != stat.st_mtime_ns:
+            if meta.get("sha256") != file_sha256(path):
+                meta = None
+            else:
+                meta["mtime_ns"] = stat.st_mtime_ns
+                with open(meta_path, "w") as fh:
+                    json.dump(meta, fh)
+    if meta is not None:
+        try:
+            return pd.read_parquet(cache_path)
+        except Exception:
+            pass
+
+    df = read_typed_csv(path)
+    meta = {
+        "schema": schema,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": file_sha256(path),
+    }
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_parquet(cache_path + ".tmp", index=False)
+        os.replace(cache_path + ".tmp", cache_path)
+        with open(meta_path, "w") as fh:
+            json.dump(meta, fh)
+    except (OSError, ValueError, TypeError):
+        # Unwritable directory or a column Arrow can't type: serve the CSV.
+        pass
+    return df
+
+
+@instrumented
+def load_campgrounds_data(data_dir="."):
+    return load_csv_cached(os.path.join(data_dir, "campgrounds.csv"))
+
+@instrumented
+def load_transactions_data(data_dir="."):
+    return load_csv_cached(os.path.join(data_dir, "transactions.csv"))
+
+@instrumented
+def load_searches_data(data_dir="."):
+    return load_csv_cached(os.path.join(data_dir, "searches.csv"))
+
+
+# Source CSV -> its loader. load_data returns each frame under the CSV's name
+# without ".csv".
+SOURCE_LOADERS = {
+    "campgrounds.csv": load_campgrounds_data,
+    "transactions.csv": load_transactions_data,
+    "searches.csv": load_searches_data,
+}
+
+
+@instrumented
+def encode_h3_columns(frames, extra_ids=()):
+    """
+    Give every H3 id in the frames' H3 columns (per CSV_SCHEMAS) a code in one
+    shared, sorted index and store it in a `<column>_code` int32 column.
+    `frames` maps CSV name -> frame; `extra_ids` are added to the index
+    without a frame. Returns the index: h3 strings by code.
+    """
+    pairs = [
+        (df, col)
+        for name, df in frames.items()
+        for col, kind in CSV_SCHEMAS[name].items()
+        if kind == "h3" and col in df.columns
+    ]
+    values = np.concatenate(
+        [df[col].to_numpy(dtype=object) for df, col in pairs]
+        + [np.asarray(extra_ids, dtype=object)]
+    )
+    codes, h3_ids = pd.factorize(values, sort=True)
+    offset = 0
+    for df, col in pairs:
+        df[col + "_code"] = codes[offset:offset + len(df)].astype(np.int32)
+        offset += len(df)
+    return np.asarray(h3_ids, dtype=object)
+
+
+# In compact mode, string columns with at most this many distinct values per
+# row are stored as categoricals.
+COMPACT_CATEGORY_RATIO = 0.5
+
+
+@instrumented
+def compact_frame(df):
+    """
+    `df` with whole-number numeric columns (counts, site totals) downcast to
+    the smallest integer type that holds them and low-cardinality string
+    columns as categoricals. Columns with missing or fractional values keep
+    their type.
+    """
+    out = {}
+    for col in df.columns:
+        series = df[col]
+        dtype = series.dtype
+        if pd.api.types.is_bool_dtype(dtype):
+            pass
+        elif pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_float_dtype(dtype):
+            series = pd.to_numeric(series, downcast="integer")
+        elif dtype == object and series.nunique() <= len(series) * COMPACT_CATEGORY_RATIO:
+            series = series.astype("category")
+        out[col] = series
+    return pd.DataFrame(out, index=df.index)
+
+
+def frame_memory_mb(df):
+    """Deep in-memory size of a frame, in MB."""
+    return df.memory_usage(deep=True).sum() / 1e6
+
+
+def compact_frames(frames):
+    """
+    Replace each frame in `frames` (CSV name -> frame) by its compact_frame.
+    Returns each frame's footprint before and after.
+    """
+    rows = []
+    for name, df in frames.items():
+        frames[name] = compact_frame(df)
+        rows.append({
+            "frame": name,
+            "rows": len(df),
+            "before_mb": round(frame_memory_mb(df), 1),
+            "after_mb": round(frame_memory_mb(frames[name]), 1),
+        })
+    return pd.DataFrame(rows)
+
+
+def load_data(data_dir=".", compact=False):
+    """
+    The three source frames with coded H3 columns, plus the H3 index. With
+    `compact`, the frames go through compact_frame first and "memory_report"
+    holds each frame's footprint before and after; otherwise it is None.
+    """
+    frames = {name: load(data_dir) for name, load in SOURCE_LOADERS.items()}
+    memory_report = compact_frames(frames) if compact else None
+    h3_ids = encode_h3_columns(frames)
+    return {
+        "campgrounds": frames["campgrounds.csv"],
+        "transactions": frames["transactions.csv"],
+        "searches": frames["searches.csv"],
+        "h3_ids": h3_ids,
+        "memory_report": memory_report,
+    }
+
+
+def reload_sources(previous, changed, data_dir=".", compact=False):
+    """
+    load_data after the CSVs named in `changed` were replaced, given its
+    result from before (`previous`). Only those CSVs are read; the other
+    frames are reused, with their H3 codes renumbered for the new index (the
+    one load_data would build).
+    """
+    old_ids = previous["h3_ids"]
+    frames = {name: load(data_dir) for name, load in SOURCE_LOADERS.items() if name in changed}
+    kept = {
+        name: previous[name[:-len(".csv")]]
+        for name in SOURCE_LOADERS
+        if name not in changed
+    }
+    memory_report = None
+    if compact:
+        report = pd.concat([previous["memory_report"], compact_frames(frames)])
+        memory_report = (
+            report.drop_duplicates("frame", keep="last")
+            .set_index("frame").loc[list(SOURCE_LOADERS)].reset_index()
+        )
+
+    code_columns = {
+        name: [col + "_code" for col, kind in CSV_SCHEMAS[name].items() if kind == "h3" and col in df.columns]
+        for name, df in kept.items()
+    }
+    used = np.zeros(len(old_ids), dtype=bool)
+    for name, df in kept.items():
+        for col in code_columns[name]:
+            used[df[col].to_numpy()] = True
+    h3_ids = encode_h3_columns(frames, extra_ids=old_ids[used])
+    code_map = np.searchsorted(h3_ids, old_ids).astype(np.int32)
+    for name, df in kept.items():
+        # A shallow copy: the new code columns replace the old ones in the
+        # copy only, and the other columns are shared with `previous`.
+        df = df.copy(deep=False)
+        for col in code_columns[name]:
+            df[col] = code_map[df[col].to_numpy()]
+        frames[name] = df
+    return {
+        "campgrounds": frames["campgrounds.csv"],
+        "transactions": frames["transactions.csv"],
+        "searches": frames["searches.csv"],
+        "h3_ids": h3_ids,
+        "memory_report": memory_report,
+    }
+
+
+# ==============================
+# 2. PARTIAL REVENUE LOGIC
+# ==============================
+analysis_start = pd.to_datetime("2028-01-01")
+analysis_end   = pd.to_datetime("2028-12-31")
+
+def nights_in_overlap(checkin, checkout, window_start, window_end):
+    """Compute how many nights fall in [window_start, window_end]."""
+    if pd.isnull(checkin) or pd.isnull(checkout):
+        return 0
+    trip_start = max(checkin, window_start)
+    trip_end = min(checkout, window_end + pd.Timedelta(days=1))
+    return max((trip_end - trip_start).days, 0)
+
+def total_trip_nights(checkin, checkout):
+    """Total nights for the entire booking (checkout exclusive)."""
+    if pd.isnull(checkin) or pd.isnull(checkout):
+        return 0
+    return (checkout - checkin).days
+
+def period_window(year, quarter=None, month=None):
+    """(start, end) of a calendar year, quarter or month, both ends inclusive."""
+    if month is not None:
+        start = pd.Timestamp(year=year, month=month, day=1)
+        end = start + pd.offsets.MonthEnd(0)
+    elif quarter is not None:
+        start = pd.Timestamp(year=year, month=3 * (quarter - 1) + 1, day=1)
+        end = start + pd.offsets.QuarterEnd(0)
+    else:
+        start = pd.Timestamp(year=year, month=1, day=1)
+        end = pd.Timestamp(year=year, month=12, day=31)
+    return start, end
+
+@instrumented
+def prorate_bookings(df, window_start, window_end):
+    """
+    Vectorized nights_in_overlap / total_trip_nights over a whole frame.
+
+    Returns a frame aligned to df.index with partial_revenue, partial_nights
+    and total_trip_nights. Like the per-row logic, all three stay 0 unless the
+    trip has at least one night and at least one night inside the window.
+    """
+    one_day = np.timedelta64(1, "D")
+    window_start = np.datetime64(pd.Timestamp(window_start), "ns")
+    window_stop = np.datetime64(pd.Timestamp(window_end) + pd.Timedelta(days=1), "ns")
+
+    cin = df["trip_checkin_date"].to_numpy(dtype="datetime64[ns]")
+    cout = df["trip_checkout_date"].to_numpy(dtype="datetime64[ns]")
+    valid = ~(np.isnat(cin) | np.isnat(cout))
+    cin = np.where(valid, cin, window_start)
+    cout = np.where(valid, cout, window_start)
+
+    overlap = (np.minimum(cout, window_stop) - np.maximum(cin, window_start)) // one_day
+    full_nights = (cout - cin) // one_day
+    hit = valid & (full_nights > 0) & (overlap > 0)
+
+    cost = df["trip_total_cost"].to_numpy(dtype="float64")
+    fraction = overlap / np.where(hit, full_nights, 1)
+    return pd.DataFrame(
+        {
+            "partial_revenue": np.where(hit, fraction * cost, 0.0),
+            "partial_nights": np.where(hit, overlap, 0).astype("int64"),
+            "total_trip_nights": np.where(hit, full_nights, 0).astype("int64"),
+        },
+        index=df.index,
+    )
+
+
+@instrumented
+def valid_transactions(df_trans):
+    """Non-canceled bookings with their 2028 proration columns."""
+    # Filter out canceled only
+    df_trans_valid = df_trans[df_trans["is_booking_canceled"] == False].copy()
+    prorated = prorate_bookings(df_trans_valid, analysis_start, analysis_end)
+    df_trans_valid["partial_revenue_2028"] = prorated["partial_revenue"]
+    df_trans_valid["partial_nights_2028"]  = prorated["partial_nights"]
+    df_trans_valid["total_trip_nights"]    = prorated["total_trip_nights"]
+    return df_trans_valid
+
+
+def transactions_in_2028(df_trans_valid):
+    """Valid bookings with at least one night in 2028."""
+    return df_trans_valid[df_trans_valid["partial_nights_2028"] > 0]
+
+
+# ==============================
+# 3. HEX AGGREGATIONS
+# ==============================
+# Per-hex aggregates are bincounts over the H3 codes from encode_h3_columns;
+# h3 strings are only looked up for the hexes that end up in a result.
+def hex_count(codes, h3_ids):
+    return np.bincount(codes, minlength=len(h3_ids))
+
+def hex_sum(codes, values, h3_ids):
+    """groupby(hex).sum() as a dense array over all codes (NaN counts as 0)."""
+    values = pd.Series(values)
+    sums = np.bincount(
+        codes, weights=values.fillna(0).to_numpy(dtype="float64"), minlength=len(h3_ids)
+    )
+    if pd.api.types.is_integer_dtype(values.dtype) or pd.api.types.is_bool_dtype(values.dtype):
+        return sums.astype(np.int64)
+    return sums
+
+def hex_nunique(codes, keys, h3_ids):
+    """groupby(hex)[keys].nunique() as a dense array over all codes."""
+    keys = pd.Series(keys).reset_index(drop=True)
+    first = keys.notna().to_numpy() & ~pd.DataFrame({"code": codes, "key": keys}).duplicated().to_numpy()
+    return hex_count(codes[first], h3_ids)
+
+def hex_frame(columns, present, h3_ids, key="h3_id"):
+    """Frame of the dense per-code arrays in `columns` for codes where `present`."""
+    idx = np.flatnonzero(present)
+    out = pd.DataFrame({key: h3_ids[idx]})
+    for name, values in columns.items():
+        out[name] = values[idx]
+    return out
+
+@instrumented
+def aggregate_campgrounds_by_hex(df_camp, h3_ids):
+    df_live = df_camp[df_camp["went_live_date"].notnull()]
+    codes = df_live["campground_h3_hexagon_id_l4_code"].to_numpy()
+    return hex_frame(
+        {
+            "count_of_campgrounds": hex_nunique(codes, df_live["campground_uuid"], h3_ids),
+            "total_sites": hex_sum(codes, df_live["number_of_sites"], h3_ids),
+            "total_tent_sites": hex_sum(codes, df_live["tent_friendly_sites"], h3_ids),
+            "total_rv_sites": hex_sum(codes, df_live["rv_friendly_sites"], h3_ids),
+            "total_structure_sites": hex_sum(codes, df_live["structure_sites"], h3_ids),
+        },
+        present=hex_count(codes, h3_ids) > 0,
+        h3_ids=h3_ids,
+    )
+
+@instrumented
+def aggregate_bookings_by_hex(df, h3_ids):
+    codes = df["h3_hexagon_id_l4_code"].to_numpy()
+    return hex_frame(
+        {
+            "count_of_bookings": hex_nunique(codes, df["booking_uuid"], h3_ids),
+            "total_revenue": hex_sum(codes, df["partial_revenue_2028"], h3_ids),
+        },
+        present=hex_count(codes, h3_ids) > 0,
+        h3_ids=h3_ids,
+    )
+
+# Search rollups: every search table the Search Demand and Expansion pages
+# read, summed per hex in one pass so the raw rows are not grouped again.
+# H3 column -> searcher columns summed per hex of that column.
+SEARCH_HEX_COLUMNS = {
+    "destination_h3_cell_id": ["searchers", "rv_searchers", "tent_searchers", "glamping_searchers"],
+    "destination_h3_parent_id": ["searchers", "rv_searchers", "tent_searchers"],
+    "origin_h3_cell_id": ["searchers"],
+    "origin_h3_parent_id": ["searchers", "rv_searchers", "tent_searchers"],
+}
+SEARCH_CHANNEL_COLUMNS = [
+    "seo_searchers", "paid_search_engine_searchers", "social_searchers",
+    "sharing_searchers", "direct_searchers", "other_channel_searchers",
+]
+SEARCH_TYPE_COLUMNS = [
+    "tent_searchers", "rv_searchers", "glamping_searchers",
+    "family_friendly_searchers", "pet_friendly_searchers", "good_for_groups_searchers",
+]
+
+
+def search_hex_totals(df, h3_ids):
+    """
+    Dense per-code sums over search rows with H3 codes: (h3 column, "rows")
+    and (h3 column, searcher column) for SEARCH_HEX_COLUMNS, plus ("all",
+    column) totals of searchers and the channel and type columns. Columns
+    missing from `df` are left out. Totals of separate batches of rows add up
+    entry by entry.
+    """
+    totals = {}
+    for key, columns in SEARCH_HEX_COLUMNS.items():
+        codes = df[key + "_code"].to_numpy()
+        totals[key, "rows"] = hex_count(codes, h3_ids)
+        for col in columns:
+            if col in df.columns:
+                totals[key, col] = hex_sum(codes, df[col], h3_ids)
+    for col in dict.fromkeys(["searchers"] + SEARCH_CHANNEL_COLUMNS + SEARCH_TYPE_COLUMNS):
+        if col in df.columns:
+            totals["all", col] = df[col].sum()
+    return totals
+
+
+@instrumented
+def search_rollups_from_totals(totals, h3_ids):
+    """The search_rollups artifact from search_hex_totals."""
+    def by_hex(key, columns):
+        return hex_frame(
+            {name: totals[key, col] for name, col in columns.items()},
+            present=totals[key, "rows"] > 0,
+            h3_ids=h3_ids,
+            key=key,
+        )
+
+    def breakdown(columns, label):
+        present = [col for col in columns if ("all", col) in totals]
+        return pd.DataFrame({
+            label: present,
+            "count_of_searchers": [totals["all", col] for col in present],
+        })
+
+    dest, orig = "destination_h3_cell_id", "origin_h3_cell_id"
+    parent_columns = {col: col for col in ["searchers", "rv_searchers", "tent_searchers"]}
+    demand_codes = np.flatnonzero(totals[dest, "rows"] > 0)
+    return {
+        "total_searchers": totals["all", "searchers"],
+        "distinct_destinations": len(demand_codes),
+        "distinct_origins": int((totals[orig, "rows"] > 0).sum()),
+        "by_destination": by_hex(dest, {"total_searchers": "searchers"}),
+        "by_origin": by_hex(orig, {"total_searchers": "searchers"}),
+        "by_destination_parent": by_hex("destination_h3_parent_id", parent_columns),
+        "by_origin_parent": by_hex("origin_h3_parent_id", parent_columns),
+        # Searchers per destination code, for compute_expansion_opportunities.
+        "destination_demand": pd.DataFrame({
+            "code": demand_codes,
+            **{
+                col: totals[dest, col][demand_codes]
+                for col in SEARCH_HEX_COLUMNS[dest] if (dest, col) in totals
+            },
+        }),
+        "channels": breakdown(SEARCH_CHANNEL_COLUMNS, "channel"),
+        "search_types": breakdown(SEARCH_TYPE_COLUMNS, "search_type"),
+    }
+
+
+def summarize_searches(df_search, h3_ids):
+    """search_rollups for a searches frame with coded H3 columns."""
+    return search_rollups_from_totals(search_hex_totals(df_search, h3_ids), h3_ids)
+
+
+# ==============================
+# 4. OVERVIEW STATS
+# ==============================
+@instrumented
+def compute_overview_stats(df_camp, df_trans_valid):
+    df_valid_2028 = df_trans_valid[df_trans_valid["partial_nights_2028"] > 0].copy()
+
+    total_revenue_2028 = df_valid_2028["partial_revenue_2028"].sum()
+    total_bookings_2028 = df_valid_2028["booking_uuid"].nunique()
+
+    merged = df_valid_2028.merge(
+        df_camp[["campground_uuid","campground_state"]],
+        on="campground_uuid",
+        how="left"
+    )
+    revenue_by_state = (
+        merged.groupby("campground_state", observed=True)["partial_revenue_2028"].sum()
+        .reset_index()
+        .rename(columns={"partial_revenue_2028":"state_revenue_2028"})
+        .sort_values("state_revenue_2028", ascending=False)
+    )
+
+    cat_counts = (
+        df_valid_2028.groupby("campsite_category", observed=True)["booking_uuid"]
+        .nunique()
+        .reset_index()
+        .rename(columns={"booking_uuid":"count_of_bookings"})
+    )
+
+    return {
+        **campground_counts(df_camp),
+        "total_revenue_2028": total_revenue_2028,
+        "total_bookings_2028": total_bookings_2028,
+        "revenue_by_state_df": revenue_by_state,
+        "campsite_category_df": cat_counts,
+    }
+
+
+def campground_counts(df_camp):
+    """The campground counts of compute_overview_stats."""
+    df_live = df_camp[df_camp["went_live_date"].notnull()]
+    df_active = df_camp[df_camp["first_booked_at_date"].notnull()]
+    return {
+        "total_camp_count_all": df_camp["campground_uuid"].nunique(),
+        "live_camp_count": df_live["campground_uuid"].nunique(),
+        "active_camp_count": df_active["campground_uuid"].nunique(),
+    }
+
+
+# ==============================
+# 5. OCCUPANCY LOGIC
+# ==============================
+
+# Category axis of the site-night cube. Capacity columns per category match
+# the campsite_category values bookings are filtered on.
+CUBE_CATEGORIES = ["All", "tent-or-rv", "rv-only", "structure"]
+
+# Campground columns whose sites count as capacity for each category.
+CAPACITY_COLUMNS = {
+    "All": ["number_of_sites"],
+    "tent-or-rv": ["tent_friendly_sites", "rv_friendly_sites"],
+    "rv-only": ["rv_friendly_sites"],
+    "structure": ["structure_sites"],
+}
+
+
+def category_capacity_sites(df, category):
+    """Sites per campground that count as capacity for a campsite category."""
+    sites = lambda col: df[col].fillna(0).astype("float64") if col in df.columns else 0
+    return sum(sites(col) for col in CAPACITY_COLUMNS.get(category, CAPACITY_COLUMNS["All"]))
+
+
+def _weekday_prefix_sums(daily):
+    """
+    Cumulative sums along the day axis taken separately for each weekday, i.e.
+    out[:, k] = daily[:, k] + out[:, k - 7]. One array serves both plain and
+    weekday-subset range sums (see _range_sum).
+    """
+    n_hex, n_days, n_cat = daily.shape
+    n_weeks = -(-n_days // 7)
+    padded = np.zeros((n_hex, n_weeks * 7, n_cat), dtype=np.int64)
+    padded[:, :n_days] = daily
+    folded = padded.reshape(n_hex, n_weeks, 7, n_cat).cumsum(axis=1)
+    return folded.reshape(n_hex, n_weeks * 7, n_cat)[:, :n_days]
+
+
+@instrumented
+def build_site_night_cube(df_cg, df_bookings, h3_ids, start=None, end=None):
+    """
+    Daily capacity and usage site-nights per (h3 hex, day, category).
+
+    Capacity starts on each campground's went_live_date and never ends; usage
+    covers every night from check-in up to (not including) check-out. Both are
+    built from difference arrays and stored as per-weekday prefix sums, so
+    occupancy_for_range answers any window with a handful of lookups.
+    The day axis defaults to the span of the booking dates (see cube_span).
+    """
+    df_cg = df_cg[df_cg["went_live_date"].notnull()]
+    df_bookings = df_bookings[
+        df_bookings["trip_checkout_date"] > df_bookings["trip_checkin_date"]
+    ]
+    hex_codes, start, n_days = cube_axes(df_cg, df_bookings, start, end)
+    return site_night_cube_from_diffs(
+        h3_ids, hex_codes, start, n_days,
+        capacity_diff(df_cg, hex_codes, start, n_days),
+        usage_diff(df_bookings, hex_codes, start, n_days),
+    )
+
+
+def cube_axes(df_cg, df_bookings, start=None, end=None):
+    """
+    Row codes, first day and number of days of build_site_night_cube for
+    live campgrounds `df_cg` and bookings with at least one night.
+    """
+    checkin = df_bookings["trip_checkin_date"].dt.normalize()
+    checkout = df_bookings["trip_checkout_date"].dt.normalize()
+    if start is None or end is None:
+        span_start, span_end = cube_span(
+            checkin.min() if len(checkin) else None,
+            checkout.max() if len(checkout) else None,
+            outside=lambda lo, hi: int(((checkin < lo) | (checkout > hi)).sum()),
+        )
+        start = span_start if start is None else start
+        end = span_end if end is None else end
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    n_days = (end - start).days + 1
+
+    # Cube rows are the H3 codes that have campgrounds or bookings.
+    hex_codes = np.unique(np.concatenate([
+        df_cg["campground_h3_hexagon_id_l4_code"].to_numpy(),
+        df_bookings["h3_hexagon_id_l4_code"].to_numpy(),
+    ]))
+    return hex_codes, start, n_days
+
+
+# The cube's day axis follows the booking dates, but reaches at most this many
+# days before and after the analysis year. One mistyped date (2208 for 2028)
+# would otherwise stretch it over centuries. Nights outside the span are left
+# out of the cube.
+CUBE_MARGIN_DAYS = 2 * 366
+
+
+def cube_span(first, last, outside=None):
+    """
+    First and last day of the site-night cube for stays from check-in
+    `first` to check-out `last` (None without stays): the analysis year,
+    widened to cover the stays but by no more than CUBE_MARGIN_DAYS. When
+    stays run past that, a warning is logged; `outside(start, end)`, if
+    given, counts the bookings affected.
+    """
+    margin = pd.Timedelta(days=CUBE_MARGIN_DAYS)
+    start, end = analysis_start, analysis_end
+    if first is not None:
+        start = max(min(first, start), analysis_start - margin)
+    if last is not None:
+        end = min(max(last, end), analysis_end + margin)
+    if (first is not None and first < start) or (last is not None and last > end):
+        count = "" if outside is None else f"{outside(start, end)} "
+        logger.warning(
+            "%sbookings run from %s to %s; the site-night cube covers %s to %s "
+            "and leaves their nights outside it out",
+            count, f"{first:%Y-%m-%d}", f"{last:%Y-%m-%d}",
+            f"{start:%Y-%m-%d}", f"{end:%Y-%m-%d}",
+        )
+    return start, end
+
+
+def _day_index(dates, start, n_days):
+    return np.clip((dates.dt.normalize() - start).dt.days.to_numpy(), 0, n_days)
+
+
+def capacity_diff(df_cg, hex_codes, start, n_days):
+    """
+    Capacity difference array for build_site_night_cube: +sites on each live
+    campground's went-live day, carried forward by the cumsum. Flattened
+    (row of hex_codes, day, category).
+    """
+    n_cat = len(CUBE_CATEGORIES)
+    size = len(hex_codes) * (n_days + 1) * n_cat
+    rows = np.searchsorted(hex_codes, df_cg["campground_h3_hexagon_id_l4_code"].to_numpy())
+    live_day = _day_index(df_cg["went_live_date"], start, n_days)
+    diff = np.zeros(size)
+    for c, category in enumerate(CUBE_CATEGORIES):
+        flat = (rows * (n_days + 1) + live_day) * n_cat + c
+        weights = np.asarray(category_capacity_sites(df_cg, category), dtype="float64")
+        diff += np.bincount(flat, weights=weights, minlength=size)
+    return diff
+
+
+def usage_diff(df_bookings, hex_codes, start, n_days):
+    """
+    Usage difference array for build_site_night_cube: +1 on check-in, -1 on
+    check-out; "All" takes every booking. Bookings must have at least one
+    night. Arrays from several batches of bookings can be added together.
+    """
+    n_cat = len(CUBE_CATEGORIES)
+    size = len(hex_codes) * (n_days + 1) * n_cat
+    rows = np.searchsorted(hex_codes, df_bookings["h3_hexagon_id_l4_code"].to_numpy())
+    in_day = _day_index(df_bookings["trip_checkin_date"], start, n_days)
+    out_day = _day_index(df_bookings["trip_checkout_date"], start, n_days)
+    diff = np.zeros(size)
+    booking_cat = df_bookings["campsite_category"].to_numpy()
+    for c, category in enumerate(CUBE_CATEGORIES):
+        mask = slice(None) if category == "All" else (booking_cat == category)
+        base = rows[mask] * (n_days + 1)
+        diff += np.bincount((base + in_day[mask]) * n_cat + c, minlength=size)
+        diff -= np.bincount((base + out_day[mask]) * n_cat + c, minlength=size)
+    return diff
+
+
+def site_night_cube_from_diffs(h3_ids, hex_codes, start, n_days, cap_diff, use_diff):
+    """The site-night cube for rows `hex_codes` from its two difference arrays."""
+    n_hex, n_cat = len(hex_codes), len(CUBE_CATEGORIES)
+
+    def to_prefix(diff):
+        daily = diff.reshape(n_hex, n_days + 1, n_cat).cumsum(axis=1)[:, :n_days]
+        return _weekday_prefix_sums(np.rint(daily).astype(np.int64))
+
+    return {
+        "h3_ids": h3_ids[hex_codes],
+        "start": start,
+        "n_days": n_days,
+        "capacity": to_prefix(cap_diff),
+        "usage": to_prefix(use_diff),
+    }
+
+
+def _range_sum(prefix, cube, start_date, end_date, weekdays):
+    """
+    Sum prefix's daily values over the inclusive window and weekdays; the day
+    axis is prefix's second axis and any trailing axes are kept.
+    """
+    first = max((pd.Timestamp(start_date).normalize() - cube["start"]).days, 0)
+    last = min((pd.Timestamp(end_date).normalize() - cube["start"]).days, cube["n_days"] - 1)
+    start_weekday = cube["start"].weekday()
+    total = np.zeros((prefix.shape[0],) + prefix.shape[2:], dtype=np.int64)
+    if last < first:
+        return total
+    for offset in range(7):
+        if weekdays is not None and (start_weekday + offset) % 7 not in weekdays:
+            continue
+        hi = last - (last - offset) % 7
+        lo = (first - 1) - (first - 1 - offset) % 7
+        if hi >= 0:
+            total += prefix[:, hi]
+        if lo >= 0:
+            total -= prefix[:, lo]
+    return total
+
+
+def _day_type_range_sum(prefix, cube, start_date, end_date, day_type):
+    """_range_sum over the nights of a day type (see allcamp_calendar)."""
+    first = max((pd.Timestamp(start_date).normalize() - cube["start"]).days, 0)
+    last = min((pd.Timestamp(end_date).normalize() - cube["start"]).days, cube["n_days"] - 1)
+    if last < first:
+        return np.zeros((prefix.shape[0],) + prefix.shape[2:], dtype=np.int64)
+    window_start = cube["start"] + pd.Timedelta(days=first)
+    window_end = window_start + pd.Timedelta(days=last - first)
+    days = first + np.flatnonzero(night_mask(day_type, window_start, window_end))
+    # prefix[d] - prefix[d - 7] is day d's own value.
+    earlier = days[days >= 7] - 7
+    return prefix[:, days].sum(axis=1) - prefix[:, earlier].sum(axis=1)
+
+
+def _with_occupancy_rate(merged):
+    """Drop rows with no capacity and no usage, then add occupancy_rate."""
+    merged = merged[(merged["capacity_site_nights"] > 0) | (merged["used_site_nights"] > 0)]
+    merged = merged.reset_index(drop=True)
+    merged["occupancy_rate"] = 0.0
+    valid_mask = merged["capacity_site_nights"] > 0
+    merged.loc[valid_mask, "occupancy_rate"] = (
+        merged.loc[valid_mask,"used_site_nights"] / merged.loc[valid_mask,"capacity_site_nights"]
+    )
+    return merged
+
+
+@instrumented
+def occupancy_for_range(cube, start_date, end_date, category="All", weekdays=None, day_type=None):
+    """
+    Hex occupancy over the inclusive window [start_date, end_date].
+
+    weekdays optionally restricts the count to nights on those weekdays
+    (e.g. WEEKEND_DAYS); day_type to the nights of any allcamp_calendar day
+    type. Days outside the cube's span count as zero.
+    """
+    day_type = resolve_day_type(day_type)
+    if day_type is not None and hasattr(day_type, "weekdays"):
+        weekdays, day_type = day_type.weekdays, None
+    if day_type is None:
+        range_sum = lambda prefix: _range_sum(prefix, cube, start_date, end_date, weekdays)
+    else:
+        range_sum = lambda prefix: _day_type_range_sum(prefix, cube, start_date, end_date, day_type)
+    c = CUBE_CATEGORIES.index(category)
+    return _with_occupancy_rate(pd.DataFrame({
+        "h3_id": cube["h3_ids"],
+        "capacity_site_nights": range_sum(cube["capacity"][:, :, c]),
+        "used_site_nights": range_sum(cube["usage"][:, :, c]),
+    }))
+
+
+@instrumented
+def compute_occupancy_for_month_category_with_all(cube, month, category, weekend_only=False):
+    start_date_2028, end_date_2028 = period_window(2028, month=month)
+    merged = occupancy_for_range(
+        cube, start_date_2028, end_date_2028, category,
+        weekdays=WEEKEND_DAYS if weekend_only else None,
+    )
+    return merged, start_date_2028, end_date_2028
+
+
+@instrumented
+def compute_monthly_occupancy(cube, year=2028):
+    """
+    Every (month, category, weekend_only) combination of a year in one sweep
+    over the site-night cube, as a tidy frame keyed by h3_id, month, category
+    and weekend_only. Rows match compute_occupancy_for_month_category_with_all.
+    """
+    n_hex, n_cat = len(cube["h3_ids"]), len(CUBE_CATEGORIES)
+    frames = []
+    for weekend_only in (False, True):
+        weekdays = WEEKEND_DAYS if weekend_only else None
+        for month in range(1, 13):
+            start_date, end_date = period_window(year, month=month)
+            frames.append(pd.DataFrame({
+                "h3_id": np.repeat(cube["h3_ids"], n_cat),
+                "month": month,
+                "category": np.tile(CUBE_CATEGORIES, n_hex),
+                "weekend_only": weekend_only,
+                "capacity_site_nights": _range_sum(cube["capacity"], cube, start_date, end_date, weekdays).ravel(),
+                "used_site_nights": _range_sum(cube["usage"], cube, start_date, end_date, weekdays).ravel(),
+            }))
+    return _with_occupancy_rate(pd.concat(frames, ignore_index=True))
+
+
+@instrumented
+def slice_monthly_occupancy(monthly, month, category, weekend_only):
+    """One month/category/weekend view of compute_monthly_occupancy's frame."""
+    mask = (
+        (monthly["month"] == month)
+        & (monthly["category"] == category)
+        & (monthly["weekend_only"] == weekend_only)
+    )
+    return monthly.loc[mask, ["h3_id", "capacity_site_nights", "used_site_nights", "occupancy_rate"]].reset_index(drop=True)
+
+
+# ==============================
+# 6. EXPANSION OPPORTUNITIES
+# ==============================
+def days_in_overlap(start_date, end_date, window_start, window_end):
+    actual_start = max(start_date, window_start)
+    actual_end   = min(end_date, window_end)
+    diff = (actual_end - actual_start).days + 1
+    return max(diff, 0)
+
+@instrumented
+def compute_expansion_opportunities(
+    df_camp, df_trans_valid, search_rollups, h3_ids,
+    regions=("Southeast",), window_start=None, window_end=None, day_type=None,
+):
+    """
+    Capacity, usage, search demand and mismatch ratios per H3 hex for the
+    campgrounds in `regions` (a name, a list of names, or None for all)
+    over the inclusive window, which defaults to the 2028 analysis window.
+    day_type (see allcamp_calendar) limits capacity and usage to those nights.
+    Search demand comes from search_rollups (see summarize_searches).
+    """
+    window_start = analysis_start if window_start is None else pd.Timestamp(window_start)
+    window_end = analysis_end if window_end is None else pd.Timestamp(window_end)
+    day_type = resolve_day_type(day_type)
+    df_camp_se = expansion_campgrounds(df_camp, regions)
+    capacity, cap_count = expansion_capacity_columns(
+        df_camp_se, h3_ids, window_start, window_end, day_type
+    )
+    usage, use_count = expansion_usage_columns(
+        df_trans_valid, df_camp_se, h3_ids, window_start, window_end, day_type
+    )
+    return expansion_from_hex_columns(
+        dict(capacity, **usage), (cap_count + use_count) > 0, search_rollups, h3_ids
+    )
+
+
+def expansion_campgrounds(df_camp, regions=("Southeast",)):
+    """Live campgrounds in `regions` (a name, a list of names, or None for all)."""
+    if isinstance(regions, str):
+        regions = [regions]
+    df_camp_se = df_camp[df_camp["went_live_date"].notnull()]
+    if regions is not None:
+        df_camp_se = df_camp_se[df_camp_se["campground_region"].isin(regions)]
+    return df_camp_se
+
+
+def expansion_capacity_columns(df_camp_se, h3_ids, window_start, window_end, day_type=None):
+    """
+    Dense per-code capacity columns of compute_expansion_opportunities, and
+    the number of campgrounds per code.
+    """
+    # Same as days_in_overlap(went_live_date, 2099-12-31, window_start, window_end)
+    live_end = min(pd.Timestamp("2099-12-31"), window_end)
+    live_start = df_camp_se["went_live_date"].clip(lower=window_start)
+    if day_type is None:
+        days_live = ((live_end - live_start).dt.days + 1).clip(lower=0)
+    else:
+        days_live = pd.Series(
+            count_nights(live_start, pd.Series(live_end, index=live_start.index), day_type),
+            index=df_camp_se.index,
+        )
+
+    cap_codes = df_camp_se["campground_h3_hexagon_id_l4_code"].to_numpy()
+    columns = {
+        "partial_capacity":   hex_sum(cap_codes, days_live * df_camp_se["number_of_sites"], h3_ids),
+        "rv_capacity":        hex_sum(cap_codes, days_live * df_camp_se["rv_friendly_sites"], h3_ids),
+        "tent_capacity":      hex_sum(cap_codes, days_live * df_camp_se["tent_friendly_sites"], h3_ids),
+        "structure_capacity": hex_sum(cap_codes, days_live * df_camp_se["structure_sites"], h3_ids),
+    }
+    return columns, hex_count(cap_codes, h3_ids)
+
+
+def expansion_usage_columns(df_trans_valid, df_camp_se, h3_ids, window_start, window_end, day_type=None):
+    """
+    Dense per-code usage columns of compute_expansion_opportunities for the
+    bookings at `df_camp_se` campgrounds, and the number of those bookings
+    per code. Both add up across disjoint sets of bookings.
+    """
+    df_trans_se = df_trans_valid.merge(
+        df_camp_se[["campground_uuid","campground_h3_hexagon_id_l4_code"]],
+        on="campground_uuid",
+        how="inner"
+    )
+
+    # Same as days_in_overlap(checkin, checkout - 1 day, window_start, window_end)
+    stay_start = df_trans_se["trip_checkin_date"].clip(lower=window_start)
+    stay_end = (df_trans_se["trip_checkout_date"] - pd.Timedelta(days=1)).clip(upper=window_end)
+    if day_type is None:
+        days_booked = ((stay_end - stay_start).dt.days + 1).clip(lower=0).fillna(0)
+    else:
+        days_booked = pd.Series(count_nights(stay_start, stay_end, day_type), index=df_trans_se.index)
+
+    # rv-only -> RV, tent-or-rv -> split evenly, structure -> structure,
+    # anything else -> tent.
+    cat = df_trans_se["campsite_category"]
+    rv_share = np.select([cat == "rv-only", cat == "tent-or-rv"], [1.0, 0.5], 0.0)
+    struct_share = np.where(cat == "structure", 1.0, 0.0)
+    tent_share = 1.0 - rv_share - struct_share
+
+    use_codes = df_trans_se["campground_h3_hexagon_id_l4_code"].to_numpy()
+    columns = {
+        "used_site_nights":      hex_sum(use_codes, days_booked, h3_ids),
+        "used_rv_nights":        hex_sum(use_codes, days_booked * rv_share, h3_ids),
+        "used_tent_nights":      hex_sum(use_codes, days_booked * tent_share, h3_ids),
+        "used_structure_nights": hex_sum(use_codes, days_booked * struct_share, h3_ids),
+    }
+    return columns, hex_count(use_codes, h3_ids)
+
+
+def expansion_from_hex_columns(columns, present, search_rollups, h3_ids):
+    """
+    The rest of compute_expansion_opportunities from its dense per-code
+    capacity and usage `columns`: occupancy rate, search demand and mismatch
+    ratios. `present` marks codes with a campground or booking.
+    """
+    capacity = columns["partial_capacity"]
+    columns["occupancy_rate"] = np.divide(
+        columns["used_site_nights"], capacity,
+        out=np.zeros(len(capacity)), where=capacity > 0,
+    )
+
+    # Summarize search demand
+    demand = search_rollups["destination_demand"]
+    if "glamping_searchers" in demand.columns:
+        srch_cols = ["searchers","rv_searchers","tent_searchers","glamping_searchers"]
+    else:
+        srch_cols = ["searchers","rv_searchers","tent_searchers"]
+
+    dest_codes = demand["code"].to_numpy()
+    for col in srch_cols:
+        columns[col] = hex_sum(dest_codes, demand[col], h3_ids)
+    if "glamping_searchers" not in columns:
+        columns["glamping_searchers"] = np.zeros(len(h3_ids))
+
+    # Hexes with any campground, booking or search, like the outer merges did
+    present = present | (hex_count(dest_codes, h3_ids) > 0)
+    final_df = hex_frame(columns, present, h3_ids).astype({col: "float64" for col in columns})
+    final_df["priority_score"] = final_df["occupancy_rate"] * final_df["searchers"]
+
+    final_df["general_searchers"] = (
+        final_df["searchers"]
+        - final_df["rv_searchers"]
+        - final_df["tent_searchers"]
+        - final_df["glamping_searchers"]
+    )
+    final_df["sum_of_specified"] = (
+        final_df["rv_searchers"]
+        + final_df["tent_searchers"]
+        + final_df["glamping_searchers"]
+    )
+    final_df["rv_searchers_adjusted"] = final_df["rv_searchers"]
+    final_df["tent_searchers_adjusted"] = final_df["tent_searchers"]
+    final_df["structure_searchers_adjusted"] = final_df["glamping_searchers"]
+
+    has_spec = final_df["sum_of_specified"] > 0
+    final_df.loc[has_spec,"rv_searchers_adjusted"] += (
+        final_df.loc[has_spec,"general_searchers"]
+        * (final_df.loc[has_spec,"rv_searchers"]/final_df.loc[has_spec,"sum_of_specified"])
+    )
+    final_df.loc[has_spec,"tent_searchers_adjusted"] += (
+        final_df.loc[has_spec,"general_searchers"]
+        * (final_df.loc[has_spec,"tent_searchers"]/final_df.loc[has_spec,"sum_of_specified"])
+    )
+    final_df.loc[has_spec,"structure_searchers_adjusted"] += (
+        final_df.loc[has_spec,"general_searchers"]
+        * (final_df.loc[has_spec,"glamping_searchers"]/final_df.loc[has_spec,"sum_of_specified"])
+    )
+
+    # Mismatch ratio
+    # Shortfall-based approach: mismatch = 0 if demand <= supply,
+    # else (demand - supply)/ supply, and 10 if supply=0 but demand>0.
+
+    # Example for RV:
+    final_df["rv_mismatch_ratio"] = 0.0
+
+    rv_demand = final_df["rv_searchers_adjusted"]
+    rv_supply = final_df["rv_capacity"]
+
+    # Where supply > 0 and demand > supply => ratio = (demand - supply)/supply
+    short_mask = (rv_supply > 0) & (rv_demand > rv_supply)
+    final_df.loc[short_mask,"rv_mismatch_ratio"] = (
+        (rv_demand[short_mask] - rv_supply[short_mask]) / rv_supply[short_mask]
+    )
+
+    # If supply=0 but there's demand => ratio=10
+    inf_mask = (rv_supply==0) & (rv_demand>0)
+    final_df.loc[inf_mask,"rv_mismatch_ratio"] = 10
+
+    # Repeat for tent:
+    final_df["tent_mismatch_ratio"] = 0.0
+    tent_demand = final_df["tent_searchers_adjusted"]
+    tent_supply = final_df["tent_capacity"]
+    short_mask_tent = (tent_supply>0) & (tent_demand>tent_supply)
+    final_df.loc[short_mask_tent,"tent_mismatch_ratio"] = (
+        (tent_demand[short_mask_tent] - tent_supply[short_mask_tent]) / tent_supply[short_mask_tent]
+    )
+    inf_mask_tent = (tent_supply==0) & (tent_demand>0)
+    final_df.loc[inf_mask_tent,"tent_mismatch_ratio"] = 10
+
+    # And for structure:
+    final_df["structure_mismatch_ratio"] = 0.0
+    str_demand = final_df["structure_searchers_adjusted"]
+    str_supply = final_df["structure_capacity"]
+    short_mask_str = (str_supply>0) & (str_demand>str_supply)
+    final_df.loc[short_mask_str,"structure_mismatch_ratio"] = (
+        (str_demand[short_mask_str] - str_supply[short_mask_str]) / str_supply[short_mask_str]
+    )
+    inf_mask_str = (str_supply==0) & (str_demand>0)
+    final_df.loc[inf_mask_str,"structure_mismatch_ratio"] = 10
+
+    # Finally set max mismatch
+    final_df["max_mismatch_ratio"] = final_df[[
+        "rv_mismatch_ratio","tent_mismatch_ratio","structure_mismatch_ratio"
+    ]].max(axis=1)
+
+
+    return final_df
+
+
+@instrumented
+def compute_lost_revenue(df_camp, df_trans_valid, expansion_data):
+    """
+    Revenue missed on unmet Southeast demand in 2028, using the actual
+    conversion rate and average nightly rate. Returns the headline numbers
+    and the per-hex breakdown (`loss_by_hex`).
+    """
+    # 1) Filter Southeastern Campgrounds
+    df_camp_se = df_camp[
+        (df_camp["campground_region"] == "Southeast") 
+        & (df_camp["went_live_date"].notnull())
+    ].copy()
+
+    # 2) Merge Southeastern Campgrounds with valid transactions
+    df_trans_se = df_trans_valid.merge(
+        df_camp_se[["campground_uuid","campground_h3_hexagon_id_l4"]],
+        on="campground_uuid",
+        how="inner"
+    )
+
+    # Keep only bookings with partial nights in 2028:
+    df_trans_se_2028 = df_trans_se[df_trans_se["partial_nights_2028"] > 0].copy()
+
+    # A) Actual Southeastern Bookings, plus the nights and revenue for C)
+    total_bookings_se = df_trans_se_2028["booking_uuid"].nunique()
+    total_nights_se_2028 = df_trans_se_2028["partial_nights_2028"].sum()
+    total_revenue_se_2028 = df_trans_se_2028["partial_revenue_2028"].sum()
+    return lost_revenue_from_totals(
+        expansion_data, total_bookings_se, total_nights_se_2028, total_revenue_se_2028
+    )
+
+
+def lost_revenue_from_totals(expansion_data, total_bookings_se, total_nights_se_2028, total_revenue_se_2028):
+    """
+    The rest of compute_lost_revenue from the Southeast 2028 booking count,
+    partial nights and partial revenue.
+    """
+    # A) Southeastern Searches
+    total_searchers_se = expansion_data["searchers"].sum()
+
+    # B) Compute Real Conversion Rate
+    if total_searchers_se > 0:
+        actual_conversion_rate = total_bookings_se / total_searchers_se
+    else:
+        actual_conversion_rate = 0
+
+    # C) Compute Actual Average Nightly Rate (Southeast, partial 2028)
+    if total_nights_se_2028 > 0:
+        average_nightly_rate_se = total_revenue_se_2028 / total_nights_se_2028
+    else:
+        average_nightly_rate_se = 0
+
+    # D) Calculate "Unfilled" site-nights using the mismatch approach
+    df_loss = expansion_data.copy() 
+
+    # For each category, unfilled = max(demand - supply, 0)
+    df_loss["rv_unfilled"] = np.maximum(
+        df_loss["rv_searchers_adjusted"] - df_loss["rv_capacity"], 0
+    )
+    df_loss["tent_unfilled"] = np.maximum(
+        df_loss["tent_searchers_adjusted"] - df_loss["tent_capacity"], 0
+    )
+    df_loss["structure_unfilled"] = np.maximum(
+        df_loss["structure_searchers_adjusted"] - df_loss["structure_capacity"], 0
+    )
+
+    # Sum across categories to get total unfilled site-nights per hex
+    df_loss["unfilled_site_nights"] = (
+        df_loss["rv_unfilled"] 
+        + df_loss["tent_unfilled"] 
+        + df_loss["structure_unfilled"]
+    )
+
+    # E) Multiply by real conversion rate & real nightly rate
+    df_loss["lost_revenue_per_hex"] = (
+        df_loss["unfilled_site_nights"] 
+        * actual_conversion_rate 
+        * average_nightly_rate_se
+    )
+
+    # F) Sum across all Southeastern hexes
+    total_unfilled = df_loss["unfilled_site_nights"].sum()
+    # Multiply by 2 for avg booking length
+    total_lost_revenue = df_loss["lost_revenue_per_hex"].sum() * 2
+
+    return {
+        "actual_conversion_rate": actual_conversion_rate,
+        "average_nightly_rate": average_nightly_rate_se,
+        "total_unfilled": total_unfilled,
+        "total_lost_revenue": total_lost_revenue,
+        "loss_by_hex": df_loss[[
+            "h3_id","rv_unfilled","tent_unfilled","structure_unfilled",
+            "unfilled_site_nights","lost_revenue_per_hex",
+        ]],
+    }
+
+
+# ==============================
+# 7. STREAMING TRANSACTIONS
+# ==============================
+# For a transactions.csv larger than memory: the file is read in chunks, each
+# chunk is filtered and prorated like valid_transactions, and the tables the
+# dashboard needs are folded together chunk by chunk. Only the bookings with
+# nights in 2028 are kept whole. searches.csv is read once, in chunks, straight
+# into the search rollups. campgrounds.csv is loaded as usual.
+TRANSACTION_SCAN_COLUMNS = [
+    "h3_hexagon_id_l4", "trip_checkin_date", "trip_checkout_date", "is_booking_canceled",
+]
+
+
+@instrumented
+def scan_transactions(path, chunk_size):
+    """
+    First pass over transactions.csv, reading only TRANSACTION_SCAN_COLUMNS.
+    Returns every H3 id in it ("h3_ids"), the H3 ids of valid bookings with at
+    least one night ("stay_h3_ids") and the site-night cube's first and last
+    day, matching what build_site_night_cube derives from the full frame.
+    """
+    h3_ids, stay_h3_ids = set(), set()
+    first = last = None
+    for chunk in iter_typed_csv(path, chunk_size, usecols=TRANSACTION_SCAN_COLUMNS):
+        h3_ids.update(chunk["h3_hexagon_id_l4"].unique())
+        stays = chunk[
+            (chunk["is_booking_canceled"] == False)
+            & (chunk["trip_checkout_date"] > chunk["trip_checkin_date"])
+        ]
+        if len(stays) == 0:
+            continue
+        stay_h3_ids.update(stays["h3_hexagon_id_l4"].unique())
+        lo = stays["trip_checkin_date"].min().normalize()
+        hi = stays["trip_checkout_date"].max().normalize()
+        first = lo if first is None else min(first, lo)
+        last = hi if last is None else max(last, hi)
+    start, end = cube_span(first, last)
+    return {
+        "h3_ids": sorted(h3_ids),
+        "stay_h3_ids": sorted(stay_h3_ids),
+        "start": start,
+        "end": end,
+    }
+
+
+@instrumented
+def scan_searches(path, chunk_size):
+    """
+    The one pass over searches.csv in streaming mode. Each chunk is grouped
+    by its H3 columns and the sums are folded together, keyed by h3 string
+    since the H3 index is not known yet. Returns, per column in
+    SEARCH_HEX_COLUMNS, a frame of "rows" and searcher sums indexed by h3
+    id, plus ("all", column) totals as in search_hex_totals.
+    """
+    by_key = {key: [] for key in SEARCH_HEX_COLUMNS}
+    totals = {}
+    for chunk in iter_typed_csv(path, chunk_size):
+        for key, columns in SEARCH_HEX_COLUMNS.items():
+            grouped = chunk.groupby(key)[[col for col in columns if col in chunk.columns]]
+            partial = grouped.sum().assign(rows=grouped.size())
+            by_key[key] = [pd.concat(by_key[key] + [partial]).groupby(level=0).sum()]
+        for col in dict.fromkeys(["searchers"] + SEARCH_CHANNEL_COLUMNS + SEARCH_TYPE_COLUMNS):
+            if col in chunk.columns:
+                totals["all", col] = totals.get(("all", col), 0) + chunk[col].sum()
+    return {
+        "by_key": {key: parts[0] if parts else pd.DataFrame({"rows": []}) for key, parts in by_key.items()},
+        "totals": totals,
+    }
+
+
+def search_totals_from_scan(scan, h3_ids):
+    """search_hex_totals from a scan_searches result, once the H3 index is known."""
+    totals = dict(scan["totals"])
+    for key, frame in scan["by_key"].items():
+        codes = np.searchsorted(h3_ids, frame.index.to_numpy(dtype=object))
+        for col in frame.columns:
+            totals[key, col] = hex_sum(codes, frame[col], h3_ids)
+    return totals
+
+
+def load_data_streaming(data_dir=".", compact=False, chunk_size=1_000_000):
+    """
+    load_data for streaming mode: campgrounds in full, a scan_transactions
+    summary ("transactions_scan") in place of the transactions frame and the
+    search rollups in place of the searches frame. H3 codes cover all three
+    files.
+    """
+    frames = {"campgrounds.csv": load_campgrounds_data(data_dir)}
+    memory_report = compact_frames(frames) if compact else None
+    scan = scan_transactions(os.path.join(data_dir, "transactions.csv"), chunk_size)
+    searches = scan_searches(os.path.join(data_dir, "searches.csv"), chunk_size)
+    search_ids = [frame.index.to_numpy(dtype=object) for frame in searches["by_key"].values()]
+    h3_ids = encode_h3_columns(
+        frames, extra_ids=np.concatenate([np.asarray(scan["h3_ids"], dtype=object)] + search_ids)
+    )
+    return {
+        "campgrounds": frames["campgrounds.csv"],
+        "h3_ids": h3_ids,
+        "memory_report": memory_report,
+        "transactions_scan": scan,
+        "search_rollups": search_rollups_from_totals(search_totals_from_scan(searches, h3_ids), h3_ids),
+    }
+
+
+@instrumented
+def fold_transactions(data_dir, df_camp, h3_ids, scan, compact=False, chunk_size=1_000_000):
+    """
+    Second pass over transactions.csv. Each chunk gets its H3 codes, goes
+    through valid_transactions, and is folded into agg_df_trans and the
+    site-night cube; its 2028 bookings are kept. Returns those three
+    artifacts. Bookings per hex are summed across chunks, so they match
+    aggregate_bookings_by_hex as long as each booking_uuid appears on one row.
+    """
+    df_cg = df_camp[df_camp["went_live_date"].notnull()]
+    start, end = scan["start"], scan["end"]
+    n_days = (end - start).days + 1
+    hex_codes = np.union1d(
+        df_cg["campground_h3_hexagon_id_l4_code"].to_numpy(),
+        np.searchsorted(h3_ids, np.asarray(scan["stay_h3_ids"], dtype=object)),
+    )
+    totals = {
+        "bookings": np.zeros(len(h3_ids), dtype=np.int64),
+        "revenue": np.zeros(len(h3_ids)),
+        "rows": np.zeros(len(h3_ids), dtype=np.int64),
+        "use_diff": np.zeros(len(hex_codes) * (n_days + 1) * len(CUBE_CATEGORIES)),
+    }
+    kept = []
+
+    path = os.path.join(data_dir, "transactions.csv")
+    source_columns = None
+    for chunk in iter_typed_csv(path, chunk_size):
+        source_columns = list(chunk.columns)
+        chunk["h3_hexagon_id_l4_code"] = np.searchsorted(
+            h3_ids, chunk["h3_hexagon_id_l4"].to_numpy(dtype=object)
+        ).astype(np.int32)
+        valid = valid_transactions(chunk)
+        for key, value in fold_bookings(valid, h3_ids, hex_codes, start, n_days).items():
+            totals[key] += value
+        kept.append(transactions_in_2028(valid))
+
+    df_2028 = pd.concat(kept) if kept else pd.DataFrame()
+    if compact and source_columns is not None:
+        compacted = compact_frame(df_2028[source_columns])
+        df_2028 = df_2028.assign(**{col: compacted[col] for col in source_columns})
+    return {
+        "transactions_2028": df_2028,
+        "agg_df_trans": hex_frame(
+            {"count_of_bookings": totals["bookings"], "total_revenue": totals["revenue"]},
+            present=totals["rows"] > 0,
+            h3_ids=h3_ids,
+        ),
+        "site_night_cube": site_night_cube_from_diffs(
+            h3_ids, hex_codes, start, n_days,
+            capacity_diff(df_cg, hex_codes, start, n_days),
+            totals["use_diff"],
+        ),
+    }
+
+
+def fold_bookings(valid, h3_ids, hex_codes, start, n_days):
+    """
+    Bookings, revenue and rows per hex (dense over h3_ids) and the usage
+    difference array of one batch of valid bookings. They add up across
+    batches, bookings per hex as long as a booking_uuid sits in one batch.
+    """
+    codes = valid["h3_hexagon_id_l4_code"].to_numpy()
+    return {
+        "bookings": hex_nunique(codes, valid["booking_uuid"], h3_ids),
+        "revenue": hex_sum(codes, valid["partial_revenue_2028"], h3_ids),
+        "rows": hex_count(codes, h3_ids),
+        "use_diff": usage_diff(
+            valid[valid["trip_checkout_date"] > valid["trip_checkin_date"]],
+            hex_codes, start, n_days,
+        ),
+    }
+
+
+def _not_streamed(*_):
+    raise ValueError(
+        "raw transactions and searches are not loaded when they are streamed in chunks"
+    )
+
+
+# ==============================
+# 8. PARALLEL BUILD
+# ==============================
+# With Pipeline(workers=N) the per-booking work behind agg_df_trans, the
+# site-night cube, the overview stats, expansion usage and lost revenue runs
+# in N processes. Valid bookings are split by (campground region, check-in
+# month); each partition is folded into partial aggregates that add up, and
+# the parent sums them in partition order, so the result does not depend on
+# which worker finishes first. Campground capacity is small and stays in the
+# parent. Workers are forked where the platform allows, so they read the
+# parent's frames without copying them.
+
+# Columns of the valid bookings that partition_partials reads.
+PARTITION_COLUMNS = [
+    "booking_uuid", "campground_uuid", "h3_hexagon_id_l4_code", "trip_checkin_date",
+    "trip_checkout_date", "campsite_category", "partial_revenue_2028", "partial_nights_2028",
+]
+
+# State of the pool's workers, set by _init_partition_worker.
+_partition_state = None
+
+
+def _init_partition_worker(state):
+    global _partition_state
+    _partition_state = state
+
+
+def _pool_context():
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+def booking_partitions(df_camp, df_trans_valid, h3_ids):
+    """
+    Row positions of df_trans_valid per (region, check-in month) partition,
+    as (key, positions) pairs in key order. A booking's region is that of
+    the campgrounds in its hex; hexes without campgrounds form one more region.
+    """
+    regions, _ = pd.factorize(df_camp["campground_region"])
+    hex_region = np.full(len(h3_ids), -1)
+    hex_region[df_camp["campground_h3_hexagon_id_l4_code"].to_numpy()] = regions
+    region = hex_region[df_trans_valid["h3_hexagon_id_l4_code"].to_numpy()]
+    checkin = df_trans_valid["trip_checkin_date"].to_numpy(dtype="datetime64[M]")
+    month = np.where(np.isnat(checkin), 12, checkin.astype(np.int64) % 12)
+    key = (region + 1) * 13 + month
+
+    order = np.argsort(key, kind="stable")
+    keys, starts = np.unique(key[order], return_index=True)
+    stops = np.append(starts[1:], len(order))
+    return [(int(k), order[lo:hi]) for k, lo, hi in zip(keys, starts, stops)]
+
+
+def partition_state(df_camp, h3_ids, hex_codes, start, n_days):
+    """What partition_partials needs besides the bookings: codes, cube axes and campgrounds."""
+    return {
+        "h3_ids": h3_ids,
+        "hex_codes": hex_codes,
+        "start": start,
+        "n_days": n_days,
+        "camp_states": df_camp[["campground_uuid", "campground_state"]],
+        "camp_se": expansion_campgrounds(df_camp),
+    }
+
+
+def partition_partials(df_valid, state):
+    """
+    Partial aggregates of one partition of valid bookings: fold_bookings
+    (with the usage difference array as sparse indices and values into the
+    cube's), the overview sums, expansion usage and the Southeast
+    lost-revenue totals. Counts of distinct bookings add up as long as a
+    booking_uuid sits in one partition.
+    """
+    h3_ids, n_days = state["h3_ids"], state["n_days"]
+    # The usage diff covers only this partition's hexes, then moves to the
+    # cube's rows, so no partition allocates a whole cube.
+    hex_codes = np.unique(df_valid["h3_hexagon_id_l4_code"].to_numpy())
+    partials = fold_bookings(df_valid, h3_ids, hex_codes, state["start"], n_days)
+    use_diff = partials.pop("use_diff")
+    row_size = (n_days + 1) * len(CUBE_CATEGORIES)
+    local = np.flatnonzero(use_diff)
+    rows = np.searchsorted(state["hex_codes"], hex_codes)
+    partials["use_index"] = rows[local // row_size] * row_size + local % row_size
+    partials["use_value"] = use_diff[local]
+
+    df_2028 = transactions_in_2028(df_valid)
+    merged = df_2028.merge(state["camp_states"], on="campground_uuid", how="left")
+    partials["total_revenue_2028"] = df_2028["partial_revenue_2028"].sum()
+    partials["total_bookings_2028"] = df_2028["booking_uuid"].nunique()
+    # "rows" lets combine_partials drop states and categories that lose
+    # all their bookings.
+    partials["state_revenue"] = (
+        merged.groupby("campground_state", observed=True)["partial_revenue_2028"]
+        .agg(state_revenue_2028="sum", rows="size")
+        .reset_index()
+    )
+    partials["category_bookings"] = (
+        df_2028.groupby("campsite_category", observed=True)["booking_uuid"]
+        .agg(count_of_bookings="nunique", rows="size")
+        .reset_index()
+    )
+
+    df_camp_se = state["camp_se"]
+    usage, partials["expansion_count"] = expansion_usage_columns(
+        df_2028, df_camp_se, h3_ids, analysis_start, analysis_end
+    )
+    partials["expansion_usage"] = pd.DataFrame(usage)
+    df_se = df_2028.merge(df_camp_se[["campground_uuid"]], on="campground_uuid", how="inner")
+    partials["bookings_se"] = df_se["booking_uuid"].nunique()
+    partials["nights_se_2028"] = df_se["partial_nights_2028"].sum()
+    partials["revenue_se_2028"] = df_se["partial_revenue_2028"].sum()
+    return partials
+
+
+def combine_partials(parts, hex_codes, start, n_days, signs=None):
+    """
+    The sum of partition_partials results, in list order, each times its
+    sign in `signs` (default +1; -1 takes a set of bookings back out). The
+    usage diff comes out dense over the cube axes given.
+    """
+    signs = [1] * len(parts) if signs is None else signs
+    weighted = list(zip(parts, signs))
+
+    def total(key):
+        return sum(sign * part[key] for part, sign in weighted)
+
+    def total_table(key, by):
+        table = (
+            pd.concat([part[key].set_index(by) * sign for part, sign in weighted])
+            .groupby(level=0, observed=True)
+            .sum()
+        )
+        return table[table["rows"] != 0].reset_index()
+
+    use_diff = np.zeros(len(hex_codes) * (n_days + 1) * len(CUBE_CATEGORIES))
+    for part, sign in weighted:
+        use_diff[part["use_index"]] += sign * part["use_value"]
+    return {
+        "hex_codes": hex_codes,
+        "start": start,
+        "n_days": n_days,
+        "bookings": total("bookings"),
+        "revenue": total("revenue"),
+        "rows": total("rows"),
+        "use_diff": use_diff,
+        "total_revenue_2028": total("total_revenue_2028"),
+        "total_bookings_2028": total("total_bookings_2028"),
+        "state_revenue": total_table("state_revenue", "campground_state"),
+        "category_bookings": total_table("category_bookings", "campsite_category"),
+        "expansion_usage": total("expansion_usage"),
+        "expansion_count": total("expansion_count"),
+        "bookings_se": total("bookings_se"),
+        "nights_se_2028": total("nights_se_2028"),
+        "revenue_se_2028": total("revenue_se_2028"),
+    }
+
+
+def _partition_task(positions):
+    # CPU time, so workers sharing a core do not count the same second twice.
+    t0 = time.process_time()
+    state = _partition_state
+    partials = partition_partials(state["transactions"].iloc[positions], state)
+    partials["seconds"] = time.process_time() - t0
+    return partials
+
+
+@instrumented
+def parallel_booking_partials(df_camp, df_trans_valid, h3_ids, workers):
+    """
+    booking_partitions folded by partition_partials on a pool of `workers`
+    processes (in this process for one worker) and summed in partition
+    order. Returns combine_partials' sums plus a "report": partitions,
+    workers, the CPU seconds spent folding the partitions, the wall time of
+    the whole call (partitioning, pool start-up and copying the state to the
+    workers included) and their ratio, "cpu_over_wall". That ratio is how
+    many workers were busy on average; allcamp_bench.py --workers measures
+    the speedup over workers=1.
+    """
+    t0 = time.perf_counter()
+    df_cg = df_camp[df_camp["went_live_date"].notnull()]
+    hex_codes, start, n_days = cube_axes(
+        df_cg, df_trans_valid[df_trans_valid["trip_checkout_date"] > df_trans_valid["trip_checkin_date"]]
+    )
+    state = partition_state(df_camp, h3_ids, hex_codes, start, n_days)
+    state["transactions"] = df_trans_valid[PARTITION_COLUMNS]
+    partitions = booking_partitions(df_camp, df_trans_valid, h3_ids)
+    if not partitions:
+        partitions = [(0, np.array([], dtype=np.int64))]
+
+    if workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=_pool_context(),
+            initializer=_init_partition_worker,
+            initargs=(state,),
+        ) as pool:
+            # Largest partitions first to balance the workers; merged by key below.
+            futures = {
+                key: pool.submit(_partition_task, positions)
+                for key, positions in sorted(partitions, key=lambda part: -len(part[1]))
+            }
+            results = [futures[key].result() for key, _ in partitions]
+    else:
+        _init_partition_worker(state)
+        try:
+            results = [_partition_task(positions) for _, positions in partitions]
+        finally:
+            _init_partition_worker(None)
+    wall = time.perf_counter() - t0
+
+    partials = combine_partials(results, hex_codes, start, n_days)
+    work = sum(part["seconds"] for part in results)
+    partials["report"] = {
+        "partitions": len(partitions),
+        "workers": workers,
+        "work_s": round(work, 3),
+        "wall_s": round(wall, 3),
+        "cpu_over_wall": round(work / wall, 2) if wall > 0 else None,
+    }
+    return partials
+
+
+def agg_df_trans_from_partials(partials, h3_ids):
+    return hex_frame(
+        {"count_of_bookings": partials["bookings"], "total_revenue": partials["revenue"]},
+        present=partials["rows"] > 0,
+        h3_ids=h3_ids,
+    )
+
+
+def site_night_cube_from_partials(df_camp, partials, h3_ids):
+    df_cg = df_camp[df_camp["went_live_date"].notnull()]
+    hex_codes, start, n_days = partials["hex_codes"], partials["start"], partials["n_days"]
+    return site_night_cube_from_diffs(
+        h3_ids, hex_codes, start, n_days,
+        capacity_diff(df_cg, hex_codes, start, n_days),
+        partials["use_diff"],
+    )
+
+
+def overview_stats_from_partials(df_camp, partials):
+    return {
+        **campground_counts(df_camp),
+        "total_revenue_2028": partials["total_revenue_2028"],
+        "total_bookings_2028": partials["total_bookings_2028"],
+        "revenue_by_state_df": partials["state_revenue"]
+            .drop(columns="rows")
+            .sort_values("state_revenue_2028", ascending=False),
+        "campsite_category_df": partials["category_bookings"].drop(columns="rows"),
+    }
+
+
+def expansion_from_partials(df_camp, partials, search_rollups, h3_ids):
+    capacity, cap_count = expansion_capacity_columns(
+        expansion_campgrounds(df_camp), h3_ids, analysis_start, analysis_end
+    )
+    usage = partials["expansion_usage"]
+    return expansion_from_hex_columns(
+        dict(capacity, **{col: usage[col].to_numpy() for col in usage.columns}),
+        (cap_count + partials["expansion_count"]) > 0,
+        search_rollups,
+        h3_ids,
+    )
+
+
+def lost_revenue_from_partials(partials, expansion_data):
+    return lost_revenue_from_totals(
+        expansion_data,
+        partials["bookings_se"],
+        partials["nights_se_2028"],
+        partials["revenue_se_2028"],
+    )
+
+
+# ==============================
+# 9. INCREMENTAL UPDATES
+# ==============================
+# Pipeline(base=store) brings the booking artifacts of an earlier build up to
+# date instead of recomputing them, when only transactions.csv changed since
+# (see updatable_build). Builds that allow this also keep LEDGER_ARTIFACTS: a
+# hash of every transactions.csv row, the valid bookings' PARTITION_COLUMNS
+# and the booking partials of section 8. Rows are matched by content, so a
+# booking whose row changed counts as its old row removed and its new row
+# added. Only added rows are prorated (and, when the file was only appended
+# to, only they are read); the partials gain the added rows' partials and
+# lose the removed rows', and the booking artifacts are derived from them.
+
+LEDGER_ARTIFACTS = ["row_hashes", "booking_ledger", "booking_partials"]
+
+
+def row_hashes(df):
+    """
+    A uint64 hash of each row's values in the source CSV's columns (the
+    `_code` columns of encode_h3_columns are left out). Numbers hash as
+    float64 and categoricals as their values, so a row hashes the same
+    however its frame was typed or compacted.
+    """
+    canonical = {}
+    for col in df.columns:
+        if col.endswith("_code"):
+            continue
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            series = series.astype("float64")
+        canonical[col] = series
+    return pd.util.hash_pandas_object(pd.DataFrame(canonical), index=False).to_numpy()
+
+
+def _row_keys(hashes):
+    """(hash, occurrence) per row, so identical rows pair up one to one."""
+    hashes = pd.Series(hashes)
+    return pd.MultiIndex.from_arrays([hashes, hashes.groupby(hashes).cumcount()])
+
+
+def appended_rows(path, recorded):
+    """
+    The typed rows added to the end of a source CSV since it matched the
+    `recorded` fingerprint (see source_fingerprints), or None if it changed
+    in any other way.
+    """
+    size = recorded["size"]
+    if os.path.getsize(path) < size:
+        return None
+    digest = hashlib.sha256()
+    last = b""
+    with open(path, "rb") as fh:
+        header = fh.readline()
+        fh.seek(0)
+        remaining = size
+        while remaining:
+            block = fh.read(min(1 << 20, remaining))
+            if not block:
+                return None
+            digest.update(block)
+            remaining -= len(block)
+            last = block[-1:]
+        if digest.hexdigest() != recorded["sha256"] or last != b"\n":
+            return None
+        tail = fh.read()
+    return type_columns(pd.read_csv(io.BytesIO(header + tail)), os.path.basename(path))
+
+
+@instrumented
+def read_transactions_delta(data_dir, base):
+    """
+    How transactions.csv changed since the build `base`: the typed "added"
+    rows (labeled with their row numbers in the file), "old_to_new" (each old
+    row's number in the new file, -1 if it is gone), the "row_hashes" of the
+    whole file, its "columns", and whether it was only "appended" to.
+    """
+    path = os.path.join(data_dir, "transactions.csv")
+    old_hashes = base.load("row_hashes")
+    added = appended_rows(path, base.manifest["sources"]["transactions.csv"])
+    if added is not None:
+        added.index = pd.RangeIndex(len(old_hashes), len(old_hashes) + len(added))
+        return {
+            "added": added,
+            "old_to_new": np.arange(len(old_hashes)),
+            "row_hashes": np.concatenate([old_hashes, row_hashes(added)]),
+            "columns": list(added.columns),
+            "appended": True,
+        }
+
+    df = load_transactions_data(data_dir)
+    hashes = row_hashes(df)
+    old_to_new = _row_keys(hashes).get_indexer(_row_keys(old_hashes))
+    is_added = np.ones(len(df), dtype=bool)
+    is_added[old_to_new[old_to_new >= 0]] = False
+    return {
+        "added": df[is_added].copy(),
+        "old_to_new": old_to_new,
+        "row_hashes": hashes,
+        "columns": list(df.columns),
+        "appended": False,
+    }
+
+
+def load_data_incremental(data_dir, compact, base):
+    """
+    load_data for updating the build `base`: campgrounds and searches in
+    full, read_transactions_delta in place of the transactions frame
+    ("transactions_delta"). H3 codes cover the new rows and every id `base`
+    knew, so codes from `base` can be mapped onto them.
+    """
+    frames = {
+        "campgrounds.csv": load_campgrounds_data(data_dir),
+        "searches.csv": load_searches_data(data_dir),
+    }
+    memory_report = compact_frames(frames) if compact else None
+    delta = read_transactions_delta(data_dir, base)
+    frames["transactions.csv"] = delta["added"]
+    h3_ids = encode_h3_columns(frames, extra_ids=base.load("h3_ids"))
+    return {
+        "campgrounds": frames["campgrounds.csv"],
+        "searches": frames["searches.csv"],
+        "h3_ids": h3_ids,
+        "memory_report": memory_report,
+        "transactions_delta": delta,
+    }
+
+
+def rebase_partials(partials, code_map, h3_ids, hex_codes, start, n_days):
+    """
+    Stored booking partials moved onto a larger H3 index (`code_map` takes
+    their codes to `h3_ids`; -1 for hexes no longer indexed, which must
+    hold nothing) and wider cube axes, as one part for combine_partials.
+    """
+    known = code_map >= 0
+
+    def dense(values):
+        out = np.zeros(len(h3_ids), dtype=values.dtype)
+        out[code_map[known]] = values[known]
+        return out
+
+    part = {
+        key: partials[key]
+        for key in (
+            "total_revenue_2028", "total_bookings_2028", "state_revenue", "category_bookings",
+            "bookings_se", "nights_se_2028", "revenue_se_2028",
+        )
+    }
+    for key in ("bookings", "revenue", "rows", "expansion_count"):
+        part[key] = dense(partials[key])
+    usage = partials["expansion_usage"]
+    part["expansion_usage"] = pd.DataFrame({col: dense(usage[col].to_numpy()) for col in usage.columns})
+
+    n_cat = len(CUBE_CATEGORIES)
+    rows = np.searchsorted(hex_codes, code_map[partials["hex_codes"]])
+    offset = (partials["start"] - start).days
+    use_diff = np.asarray(partials["use_diff"]).reshape(len(rows), partials["n_days"] + 1, n_cat)
+    row, day, cat = np.nonzero(use_diff)
+    part["use_index"] = (rows[row] * (n_days + 1) + day + offset) * n_cat + cat
+    part["use_value"] = use_diff[row, day, cat]
+    return part
+
+
+@instrumented
+def update_bookings(base, df_camp, h3_ids, delta, compact=False):
+    """
+    transactions_2028 and the LEDGER_ARTIFACTS of the build `base`, brought
+    up to date with read_transactions_delta's `delta`. The cube keeps the
+    hexes and days of `base` and grows to cover the added bookings. The
+    partials' "report" names the base build and counts the rows added and
+    removed.
+    """
+    t0 = time.perf_counter()
+    code_map = np.searchsorted(h3_ids, base.load("h3_ids"))
+    old_to_new = delta["old_to_new"]
+
+    def carried(df):
+        """The rows of a frame from `base` that are still in the file, renumbered and recoded."""
+        new = old_to_new[df.index.to_numpy()]
+        kept = new >= 0
+        df = df[kept].set_axis(new[kept])
+        return df.assign(
+            h3_hexagon_id_l4_code=code_map[df["h3_hexagon_id_l4_code"].to_numpy()].astype(np.int32)
+        )
+
+    ledger = base.load("booking_ledger")
+    removed = ledger[old_to_new[ledger.index.to_numpy()] < 0]
+    removed = removed.assign(
+        h3_hexagon_id_l4_code=code_map[removed["h3_hexagon_id_l4_code"].to_numpy()].astype(np.int32)
+    )
+    added = valid_transactions(delta["added"])
+
+    stored = base.load("booking_partials")
+    df_cg = df_camp[df_camp["went_live_date"].notnull()]
+    new_codes, new_start, new_days = cube_axes(
+        df_cg, added[added["trip_checkout_date"] > added["trip_checkin_date"]]
+    )
+    hex_codes = np.union1d(code_map[stored["hex_codes"]], new_codes)
+    start = min(stored["start"], new_start)
+    end = max(
+        stored["start"] + pd.Timedelta(days=stored["n_days"] - 1),
+        new_start + pd.Timedelta(days=new_days - 1),
+    )
+    n_days = (end - start).days + 1
+    state = partition_state(df_camp, h3_ids, hex_codes, start, n_days)
+    partials = combine_partials(
+        [
+            rebase_partials(stored, code_map, h3_ids, hex_codes, start, n_days),
+            partition_partials(added[PARTITION_COLUMNS], state),
+            partition_partials(removed, state),
+        ],
+        hex_codes, start, n_days, signs=[1, 1, -1],
+    )
+
+    df_2028 = pd.concat([carried(base.load("transactions_2028")), transactions_in_2028(added)])
+    df_2028 = df_2028.sort_index()
+    if compact:
+        columns = delta["columns"]
+        compacted = compact_frame(df_2028[columns])
+        df_2028 = df_2028.assign(**{col: compacted[col] for col in columns})
+    partials["report"] = {
+        "base": base.version,
+        "appended": delta["appended"],
+        "rows_added": len(delta["added"]),
+        "rows_removed": int((old_to_new < 0).sum()),
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+    return {
+        "transactions_2028": df_2028,
+        "row_hashes": delta["row_hashes"],
+        "booking_ledger": pd.concat([carried(ledger), added[PARTITION_COLUMNS]]).sort_index(),
+        "booking_partials": partials,
+    }
+
+
+def updatable_build(root, data_dir=".", compact=False):
+    """
+    The latest build under `root` if Pipeline(base=...) can bring it up to
+    date with the CSVs in `data_dir`: it was made by this PIPELINE_VERSION
+    with the same `compact` setting, holds the LEDGER_ARTIFACTS, and
+    campgrounds.csv has not changed since. Otherwise None.
+    """
+    store = latest_build(root)
+    if store is None or store.manifest.get("compact") != compact:
+        return None
+    needed = LEDGER_ARTIFACTS + ["h3_ids", "transactions_2028"]
+    if not all(store.has(name) for name in needed):
+        return None
+    sources = store.manifest["sources"]
+    if "transactions.csv" not in sources:
+        return None
+    camp_path = os.path.join(data_dir, "campgrounds.csv")
+    recorded = sources.get("campgrounds.csv")
+    if recorded is None or not _source_matches(camp_path, recorded):
+        return None
+    return store
+
+
+def _not_in_update(*_):
+    raise ValueError("the raw transactions are not loaded when an earlier build is updated")
+
+
+# ==============================
+# 10. ARTIFACT GRAPH
+# ==============================
+# name -> (names of the artifacts it is built from, build function).
+# "data_dir", "compact", "chunk_size", "workers" and "base" are not built: they
+# are the settings a Pipeline was created with.
+ARTIFACTS = {
+    "sources":            (("data_dir", "compact"), load_data),
+    "campgrounds":        (("sources",), lambda sources: sources["campgrounds"]),
+    "transactions":       (("sources",), lambda sources: sources["transactions"]),
+    "searches":           (("sources",), lambda sources: sources["searches"]),
+    "h3_ids":             (("sources",), lambda sources: sources["h3_ids"]),
+    "memory_report":      (("sources",), lambda sources: sources["memory_report"]),
+    "search_rollups":     (("searches", "h3_ids"), summarize_searches),
+    "transactions_valid": (("transactions",), valid_transactions),
+    "transactions_2028":  (("transactions_valid",), transactions_in_2028),
+    "agg_df_camp":        (("campgrounds", "h3_ids"), aggregate_campgrounds_by_hex),
+    "agg_df_trans":       (("transactions_valid", "h3_ids"), aggregate_bookings_by_hex),
+    "overview_stats":     (("campgrounds", "transactions_2028"), compute_overview_stats),
+    "site_night_cube":    (("campgrounds", "transactions_valid", "h3_ids"), build_site_night_cube),
+    "monthly_occupancy":  (("site_night_cube",), compute_monthly_occupancy),
+    # Bookings without 2028 nights add nothing to the 2028 expansion and
+    # lost-revenue figures, so these read the smaller 2028 table.
+    "expansion_data":     (
+        ("campgrounds", "transactions_2028", "search_rollups", "h3_ids"),
+        compute_expansion_opportunities,
+    ),
+    "lost_revenue":       (
+        ("campgrounds", "transactions_2028", "expansion_data"),
+        compute_lost_revenue,
+    ),
+    # What a later build needs to update this one (see section 9).
+    "row_hashes":         (("transactions",), row_hashes),
+    "booking_ledger":     (("transactions_valid",), lambda df: df[PARTITION_COLUMNS]),
+}
+
+# Recipes that replace ARTIFACTS entries when a Pipeline streams
+# transactions.csv in chunks (see section 7).
+STREAMING_ARTIFACTS = {
+    "sources":            (("data_dir", "compact", "chunk_size"), load_data_streaming),
+    "transactions":       ((), _not_streamed),
+    "transactions_valid": ((), _not_streamed),
+    "searches":           ((), _not_streamed),
+    "search_rollups":     (("sources",), lambda sources: sources["search_rollups"]),
+    "transactions_fold":  (
+        ("data_dir", "campgrounds", "h3_ids", "transactions_scan", "compact", "chunk_size"),
+        fold_transactions,
+    ),
+    "transactions_scan":  (("sources",), lambda sources: sources["transactions_scan"]),
+    "transactions_2028":  (("transactions_fold",), lambda fold: fold["transactions_2028"]),
+    "agg_df_trans":       (("transactions_fold",), lambda fold: fold["agg_df_trans"]),
+    "site_night_cube":    (("transactions_fold",), lambda fold: fold["site_night_cube"]),
+}
+
+# Recipes that replace ARTIFACTS entries when a Pipeline folds bookings on a
+# process pool (see section 8).
+PARALLEL_ARTIFACTS = {
+    "booking_partials":   (
+        ("campgrounds", "transactions_valid", "h3_ids", "workers"),
+        parallel_booking_partials,
+    ),
+    "build_report":       (("booking_partials",), lambda partials: partials["report"]),
+    "agg_df_trans":       (("booking_partials", "h3_ids"), agg_df_trans_from_partials),
+    "overview_stats":     (("campgrounds", "booking_partials"), overview_stats_from_partials),
+    "site_night_cube":    (
+        ("campgrounds", "booking_partials", "h3_ids"),
+        site_night_cube_from_partials,
+    ),
+    "expansion_data":     (
+        ("campgrounds", "booking_partials", "search_rollups", "h3_ids"),
+        expansion_from_partials,
+    ),
+    "lost_revenue":       (("booking_partials", "expansion_data"), lost_revenue_from_partials),
+}
+
+# Recipes that replace ARTIFACTS (and PARALLEL_ARTIFACTS) entries when a
+# Pipeline updates an earlier build (see section 9).
+INCREMENTAL_ARTIFACTS = {
+    "sources":            (("data_dir", "compact", "base"), load_data_incremental),
+    "transactions":       ((), _not_in_update),
+    "transactions_valid": ((), _not_in_update),
+    "transactions_delta": (("sources",), lambda sources: sources["transactions_delta"]),
+    "booking_update":     (
+        ("base", "campgrounds", "h3_ids", "transactions_delta", "compact"),
+        update_bookings,
+    ),
+    "transactions_2028":  (("booking_update",), lambda update: update["transactions_2028"]),
+    "row_hashes":         (("booking_update",), lambda update: update["row_hashes"]),
+    "booking_ledger":     (("booking_update",), lambda update: update["booking_ledger"]),
+    "booking_partials":   (("booking_update",), lambda update: update["booking_partials"]),
+}
+
+# Execution backends: name -> module whose ARTIFACTS replace the recipes of the
+# same name above with equivalent ones (None: the pandas recipes as they are).
+BACKENDS = {
+    "pandas": None,
+    "duckdb": "allcamp_sql",
+    "polars": "allcamp_polars",
+}
+
+
+def backend_artifacts(backend):
+    """The recipe overrides of a BACKENDS entry; imports its module."""
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend!r}; choose from {sorted(BACKENDS)}")
+    module = BACKENDS[backend]
+    return {} if module is None else importlib.import_module(module).ARTIFACTS
+
+
+def freeze(value):
+    """
+    Mark an artifact's NumPy arrays read-only (recursing into dicts), so a
+    stray in-place write raises instead of changing what every caller sees.
+    Frames are protected by pandas Copy-on-Write where the caller enables it.
+    """
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, dict):
+        for item in value.values():
+            freeze(item)
+    return value
+
+
+class Pipeline:
+    """
+    Builds artifacts from ARTIFACTS on first request and keeps them. One
+    instance of each artifact is shared by every caller without copying, so
+    treat them as read-only (see freeze). With a `store` (an ArtifactStore),
+    artifacts it holds are loaded instead of built. `compact` loads the
+    source frames through compact_frame. With a `chunk_size`, transactions.csv
+    and searches.csv are streamed that many rows at a time (see
+    STREAMING_ARTIFACTS) and their raw tables are not available. `backend`
+    names a BACKENDS entry to compute with. With `workers`, bookings are
+    folded on a pool of that many processes (see PARALLEL_ARTIFACTS); this
+    does not apply when streaming. With a `base` (an ArtifactStore from
+    updatable_build), the booking artifacts are that build's, updated for
+    the rows of transactions.csv added or removed since (see
+    INCREMENTAL_ARTIFACTS). Streaming, parallel and incremental recipes take
+    precedence over the backend's overrides. With a `cache` (a ResultCache),
+    CACHED_ARTIFACTS the store does not hold are loaded from it when an
+    earlier process computed them from the same CSVs and code, and saved to
+    it otherwise. After source CSVs change, refreshed gives the Pipeline to
+    switch to.
+    """
+
+    def __init__(
+        self, data_dir=".", store=None, compact=False, chunk_size=None, backend="pandas",
+        workers=None, base=None, cache=None,
+    ):
+        if chunk_size and base is not None:
+            raise ValueError("an earlier build cannot be updated while streaming transactions")
+        self.data_dir = data_dir
+        self.store = store
+        self.compact = compact
+        self.chunk_size = chunk_size
+        self.backend = backend
+        self.workers = workers
+        self.base = base
+        self.cache = cache
+        self.recipes = dict(ARTIFACTS, **backend_artifacts(backend))
+        if chunk_size:
+            self.recipes.update(STREAMING_ARTIFACTS)
+        elif workers or base is not None:
+            self.recipes.update(PARALLEL_ARTIFACTS)
+        if base is not None:
+            self.recipes.update(INCREMENTAL_ARTIFACTS)
+        self._built = {
+            "data_dir": data_dir, "compact": compact, "chunk_size": chunk_size,
+            "workers": workers, "base": base,
+        }
+        self._lock = threading.RLock()
+        # Source CSV -> its sha256, for result cache keys.
+        self._source_hashes = {}
+
+    def get(self, name):
+        # Artifacts are only ever added, so one already built is returned
+        # without waiting for a build in progress on another thread.
+        if name in self._built:
+            return self._built[name]
+        with self._lock:
+            if name not in self._built:
+                if self.store is not None and self.store.has(name):
+                    with stage(f"load_artifact:{name}"):
+                        self._built[name] = freeze(self.store.load(name))
+                elif name in CACHED_ARTIFACTS:
+                    self._built[name] = freeze(self.cached(name, lambda: self._build(name)))
+                else:
+                    self._built[name] = freeze(self._build(name))
+            return self._built[name]
+
+    def _build(self, name):
+        deps, build = self.recipes[name]
+        return build(*[self.get(dep) for dep in deps])
+
+    def cached(self, name, build, like=None, **params):
+        """
+        build(), through the result cache when there is one. The entry is
+        keyed by `name`, `params`, this Pipeline's settings, the code version
+        and the sha256 of the source CSVs artifact `like` (default `name`) is
+        built from.
+        """
+        if self.cache is None:
+            return build()
+        files = sorted(source_files(self.recipes, like or name))
+        with self._lock:
+            for source in files:
+                if source not in self._source_hashes:
+                    self._source_hashes[source] = source_sha256(os.path.join(self.data_dir, source))
+            sources = {source: self._source_hashes[source] for source in files}
+        key = self.cache.key(name, {
+            "sources": sources,
+            "params": params,
+            "code": code_version(self.backend),
+            "compact": self.compact,
+            "backend": self.backend,
+            "streaming": bool(self.chunk_size),
+            "parallel": bool(self.workers or self.base is not None),
+            "store": None if self.store is None else self.store.version,
+        })
+        value = self.cache.load(key)
+        if value is None:
+            value = build()
+            self.cache.save(key, value)
+        return value
+
+    def is_built(self, name):
+        """Whether `name` has already been built or loaded."""
+        return name in self._built
+
+    def get_many(self, names):
+        return {name: self.get(name) for name in names}
+
+    def refreshed(self, changed):
+        """
+        A Pipeline with these settings (but no store) for the source CSVs
+        after the ones named in `changed` were replaced. Artifacts built here
+        that do not depend on them (see source_files) are carried over, with
+        their H3 codes renumbered if the H3 index changed (see RECODERS); the
+        rest are built on request. The changed CSVs are read here when a
+        carried artifact needs renumbering, so call this off the serving
+        thread.
+        """
+        changed = set(changed)
+        with self._lock:
+            built = dict(self._built)
+        # The base build's partials were made with the old campgrounds.
+        base = None if "campgrounds.csv" in changed else self.base
+        new = Pipeline(
+            self.data_dir, compact=self.compact, chunk_size=self.chunk_size, backend=self.backend,
+            workers=self.workers, base=base, cache=self.cache,
+        )
+        if "sources" in built and self.recipes["sources"] is ARTIFACTS["sources"]:
+            new.recipes["sources"] = (
+                ("data_dir", "compact"), functools.partial(reload_sources, built["sources"], changed),
+            )
+        # Artifacts read straight off "sources" are cheap to take again from
+        # the new one, and hold its H3 codes.
+        carried = [
+            name for name in built
+            if name not in new._built and name in new.recipes
+            and "sources" not in self.recipes[name][0]
+            and not source_files(self.recipes, name) & changed
+        ]
+        recoded = [name for name in carried if name in RECODERS]
+        if recoded:
+            old_ids, new_ids = self.get("h3_ids"), new.get("h3_ids")
+            if not np.array_equal(old_ids, new_ids):
+                code_map = h3_code_map(old_ids, new_ids)
+                for name in recoded:
+                    new._built[name] = freeze(RECODERS[name](built[name], code_map, new_ids))
+        for name in carried:
+            new._built.setdefault(name, built[name])
+        return new
+
+
+# ==============================
+# 11. ARTIFACT STORE
+# ==============================
+# A build is a folder <root>/<version>/ holding one sub-folder per artifact
+# plus build.json; <root>/LATEST names the newest complete build. Bump
+# PIPELINE_VERSION whenever an artifact's contents or file layout change so
+# older builds are ignored.
+#
+# Builds are laid out so loading is an mmap, not a parse: numeric, boolean
+# and datetime columns (and arrays) are .npy files opened with mmap_mode="r"
+# and wrapped without copying, and mostly-unique string columns (booking and
+# campground ids) stay Arrow strings backed by the mapped file. Every worker
+# process serving the same build shares those pages through the OS page
+# cache. Other string columns are rebuilt as Python objects, deduplicated,
+# so they cost one pointer per row.
+PIPELINE_VERSION = 3
+
+# What allcamp_build.py writes: every artifact a page reads. "sources", the raw
+# "transactions" and "searches" and "transactions_valid" only feed these.
+BUILD_ARTIFACTS = [
+    "campgrounds",
+    "search_rollups",
+    "h3_ids",
+    "transactions_2028",
+    "agg_df_camp",
+    "agg_df_trans",
+    "overview_stats",
+    "site_night_cube",
+    "monthly_occupancy",
+    "expansion_data",
+    "lost_revenue",
+]
+
+SOURCE_FILES = ["campgrounds.csv", "transactions.csv", "searches.csv"]
+
+
+def _write_arrow(df, path):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read_arrow(path):
+    """The first column of an Arrow IPC file, read through a memory map."""
+    import pyarrow as pa
+
+    return pa.ipc.open_file(pa.memory_map(path)).read_all().column(0)
+
+
+def _save_column(series, folder, name):
+    """Write one frame column (or index) under `folder`; returns its entry."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        utc = series.dt.tz_convert("UTC").dt.tz_localize(None)
+        np.save(os.path.join(folder, name + ".npy"), utc.to_numpy())
+        return {"kind": "datetimetz", "file": name + ".npy", "tz": str(dtype.tz)}
+    if isinstance(dtype, np.dtype) and dtype != object:
+        np.save(os.path.join(folder, name + ".npy"), series.to_numpy())
+        return {"kind": "array", "file": name + ".npy"}
+    _write_arrow(pd.DataFrame({"value": series.array}), os.path.join(folder, name + ".arrow"))
+    # Columns carried over from a stored build come back as Arrow strings.
+    text = dtype == object or isinstance(dtype, pd.StringDtype)
+    unique_ids = text and series.nunique() > len(series) // 2
+    return {"kind": "strings" if unique_ids else "arrow", "file": name + ".arrow"}
+
+
+def _load_column(entry, folder):
+    path = os.path.join(folder, entry["file"])
+    kind = entry["kind"]
+    if kind == "array":
+        return np.load(path, mmap_mode="r").view(np.ndarray)
+    if kind == "datetimetz":
+        utc = pd.Series(np.load(path), copy=False).dt.tz_localize("UTC")
+        return utc.dt.tz_convert(entry["tz"]).array
+    if kind == "strings":
+        import pyarrow as pa
+
+        return pd.arrays.ArrowStringArray(_read_arrow(path).cast(pa.large_string()))
+    return _read_arrow(path).to_pandas().array
+
+
+def _save_frame(df, folder, key):
+    if isinstance(df.index, pd.RangeIndex):
+        index = {"kind": "range", "start": df.index.start, "stop": df.index.stop, "step": df.index.step}
+    else:
+        index = _save_column(df.index.to_series(), folder, f"{key}.index")
+    columns = [
+        dict(_save_column(df.iloc[:, i], folder, f"{key}.{i}"), name=name)
+        for i, name in enumerate(df.columns)
+    ]
+    return {"kind": "frame", "index": index, "columns": columns}
+
+
+def _load_frame(entry, folder):
+    index = entry["index"]
+    if index["kind"] == "range":
+        index = pd.RangeIndex(index["start"], index["stop"], index["step"])
+    else:
+        index = pd.Index(_load_column(index, folder), copy=False)
+    # copy=False keeps one block per column, so mapped arrays are not copied
+    # into a consolidated 2-D block.
+    return pd.DataFrame(
+        {col["name"]: _load_column(col, folder) for col in entry["columns"]},
+        index=index,
+        copy=False,
+    )
+
+
+def _save_value(value, folder, key):
+    """Write one value under `folder`; returns its manifest entry."""
+    if isinstance(value, pd.DataFrame):
+        return _save_frame(value, folder, key)
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        np.save(os.path.join(folder, key + ".npy"), value)
+        return {"kind": "array", "file": key + ".npy"}
+    if isinstance(value, np.ndarray):
+        _write_arrow(pd.DataFrame({"value": value}), os.path.join(folder, key + ".arrow"))
+        return {"kind": "objects", "file": key + ".arrow"}
+    if isinstance(value, pd.Timestamp):
+        return {"kind": "timestamp", "value": value.isoformat()}
+    if isinstance(value, np.generic):
+        value = value.item()
+    return {"kind": "scalar", "value": value}
+
+
+def _load_value(entry, folder):
+    kind = entry["kind"]
+    if kind == "frame":
+        return _load_frame(entry, folder)
+    if kind == "array":
+        return np.load(os.path.join(folder, entry["file"]), mmap_mode="r")
+    if kind == "objects":
+        return _read_arrow(os.path.join(folder, entry["file"])).to_numpy(zero_copy_only=False).astype(object)
+    if kind == "timestamp":
+        return pd.Timestamp(entry["value"])
+    return entry["value"]
+
+
+def save_artifact(value, folder):
+    """Write a frame, array or dict of those to `folder` with a manifest."""
+    os.makedirs(folder, exist_ok=True)
+    if isinstance(value, dict):
+        manifest = {
+            "kind": "dict",
+            "entries": {key: _save_value(v, folder, key) for key, v in value.items()},
+        }
+    else:
+        manifest = _save_value(value, folder, "value")
+    with open(os.path.join(folder, "manifest.json"), "w") as fh:
+        json.dump(manifest, fh, indent=1)
+
+
+def load_artifact(folder):
+    with open(os.path.join(folder, "manifest.json")) as fh:
+        manifest = json.load(fh)
+    if manifest["kind"] == "dict":
+        return {
+            key: _load_value(entry, folder)
+            for key, entry in manifest["entries"].items()
+        }
+    return _load_value(manifest, folder)
+
+
+def source_fingerprints(data_dir):
+    """size / mtime / sha256 of each source CSV present in `data_dir`."""
+    prints = {}
+    for name in SOURCE_FILES:
+        path = os.path.join(data_dir, name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            prints[name] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": file_sha256(path),
+            }
+    return prints
+
+
+def _source_matches(path, recorded):
+    stat = os.stat(path)
+    if stat.st_size != recorded["size"]:
+        return False
+    if stat.st_mtime_ns == recorded["mtime_ns"]:
+        return True
+    return file_sha256(path) == recorded["sha256"]
+
+
+class ArtifactStore:
+    """One build folder written by write_build."""
+
+    def __init__(self, path):
+        self.path = path
+        self.version = os.path.basename(os.path.normpath(path))
+        with open(os.path.join(path, "build.json")) as fh:
+            self.manifest = json.load(fh)
+
+    def has(self, name):
+        return name in self.manifest["artifacts"]
+
+    def load(self, name):
+        return load_artifact(os.path.join(self.path, name))
+
+    def matches_sources(self, data_dir):
+        """
+        False if a source CSV in `data_dir` differs from the one this build
+        was made from. CSVs that are absent are not checked, so a build can be
+        served without the raw data next to it.
+        """
+        for name, recorded in self.manifest["sources"].items():
+            path = os.path.join(data_dir, name)
+            if os.path.exists(path) and not _source_matches(path, recorded):
+                return False
+        return True
+
+
+def latest_build(root, data_dir=None):
+    """
+    The build LATEST points at, or None when there is none, it was written by
+    another PIPELINE_VERSION, or (given `data_dir`) its source CSVs changed.
+    """
+    try:
+        with open(os.path.join(root, "LATEST")) as fh:
+            store = ArtifactStore(os.path.join(root, fh.read().strip()))
+    except (OSError, ValueError):
+        return None
+    if store.manifest.get("pipeline_version") != PIPELINE_VERSION:
+        return None
+    if data_dir is not None and not store.matches_sources(data_dir):
+        return None
+    return store
+
+
+def write_build(pipeline, root, names=BUILD_ARTIFACTS, keep=3, log=None):
+    """
+    Build `names` with `pipeline` into a new version folder under `root`,
+    then point LATEST at it and drop all but the newest `keep` builds.
+    Returns the new build's path. `log`, if given, is called with a line per
+    artifact.
+    """
+    os.makedirs(root, exist_ok=True)
+    version = time.strftime("%Y%m%dT%H%M%S")
+    suffix = 1
+    while os.path.exists(os.path.join(root, version)):
+        version = f"{time.strftime('%Y%m%dT%H%M%S')}-{suffix}"
+        suffix += 1
+    staging = os.path.join(root, version + ".tmp")
+    os.makedirs(staging)
+
+    timings = {}
+    for name in names:
+        t0 = time.perf_counter()
+        value = pipeline.get(name)
+        t1 = time.perf_counter()
+        save_artifact(value, os.path.join(staging, name))
+        t2 = time.perf_counter()
+        timings[name] = {"build_s": round(t1 - t0, 3), "write_s": round(t2 - t1, 3)}
+        if log is not None:
+            log(f"{name:<20} build {t1 - t0:7.2f}s  write {t2 - t1:6.2f}s")
+
+    manifest = {
+        "pipeline_version": PIPELINE_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "sources": source_fingerprints(pipeline.data_dir),
+        "compact": pipeline.compact,
+        "backend": pipeline.backend,
+        "workers": pipeline.workers,
+        "artifacts": timings,
+    }
+    if pipeline.is_built("booking_partials"):
+        manifest["report"] = pipeline.get("build_report")
+    with open(os.path.join(staging, "build.json"), "w") as fh:
+        json.dump(manifest, fh, indent=1)
+
+    path = os.path.join(root, version)
+    os.replace(staging, path)
+    with open(os.path.join(root, "LATEST.tmp"), "w") as fh:
+        fh.write(version)
+    os.replace(os.path.join(root, "LATEST.tmp"), os.path.join(root, "LATEST"))
+
+    builds = sorted(
+        entry for entry in os.listdir(root)
+        if os.path.isfile(os.path.join(root, entry, "build.json"))
+    )
+    for old in builds[:-keep] if keep > 0 else []:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return path
+
+
+# ==============================
+# 12. AUTO-REFRESH
+# ==============================
+# A SourceWatcher polls a Pipeline's source CSVs and, when some are replaced,
+# builds the next Pipeline in a background thread while the current one keeps
+# serving. Only the artifacts that depend on the replaced files are rebuilt;
+# the rest are carried over (see Pipeline.refreshed). Most artifacts name
+# hexes by their h3 strings; the ones in RECODERS hold H3 codes and are
+# renumbered when a new file changes the H3 index.
+
+# Artifacts taken straight from the source frames -> the CSVs they reflect.
+# "h3_ids" only numbers the hexes, so depending on it alone ties an artifact
+# to no file.
+SOURCE_ARTIFACT_FILES = {
+    "sources": SOURCE_FILES,
+    "campgrounds": ["campgrounds.csv"],
+    "transactions": ["transactions.csv"],
+    "searches": ["searches.csv"],
+    "h3_ids": [],
+}
+
+
+def source_files(recipes, name):
+    """The source CSVs artifact `name` is built from under `recipes`."""
+    if name in SOURCE_ARTIFACT_FILES:
+        return set(SOURCE_ARTIFACT_FILES[name])
+    if name not in recipes:
+        # A Pipeline setting.
+        return set()
+    files = set()
+    for dep in recipes[name][0]:
+        files |= source_files(recipes, dep)
+    return files
+
+
+def h3_code_map(old_ids, new_ids):
+    """For each of the sorted `old_ids`, its code in the sorted `new_ids`, or -1 if absent."""
+    positions = np.searchsorted(new_ids, old_ids)
+    found = positions < len(new_ids)
+    found[found] = new_ids[positions[found]] == old_ids[found]
+    return np.where(found, positions, -1).astype(np.int32)
+
+
+def recode_frame(df, code_map):
+    """`df` with its H3 code columns ("code" and "*_code") mapped through `code_map`."""
+    columns = [col for col in df.columns if col == "code" or col.endswith("_code")]
+    return df.assign(**{
+        col: code_map[df[col].to_numpy()].astype(df[col].dtype) for col in columns
+    })
+
+
+def recode_partials(partials, code_map, h3_ids):
+    """Booking partials (section 8) with their H3 codes mapped through `code_map`."""
+    hex_codes = code_map[partials["hex_codes"]]
+    part = rebase_partials(
+        partials, code_map, h3_ids, hex_codes, partials["start"], partials["n_days"]
+    )
+    combined = combine_partials([part], hex_codes, partials["start"], partials["n_days"])
+    return dict(combined, report=partials["report"])
+
+
+# Artifacts that hold H3 codes -> function(value, code_map, h3_ids) giving the
+# value for the H3 index `h3_ids`, where `code_map` takes old codes to new.
+# Everything else Pipeline.refreshed carries over holds none.
+RECODERS = {
+    "transactions_valid": lambda df, code_map, h3_ids: recode_frame(df, code_map),
+    "transactions_2028":  lambda df, code_map, h3_ids: recode_frame(df, code_map),
+    "booking_ledger":     lambda df, code_map, h3_ids: recode_frame(df, code_map),
+    "search_rollups":     lambda rollups, code_map, h3_ids: dict(
+        rollups, destination_demand=recode_frame(rollups["destination_demand"], code_map)
+    ),
+    "booking_partials":   recode_partials,
+}
+
+
+class SourceWatcher:
+    """
+    Keeps `pipeline` in step with its source CSVs. Once started, a daemon
+    thread checks them every `interval` seconds. When some were replaced, it
+    builds Pipeline.refreshed for them plus every artifact the current
+    Pipeline had built, and only then swaps the result in as `pipeline`.
+    Until the swap, `pipeline` stays the current one. A file counts as
+    replaced once its size and mtime have held still for one check, so a copy
+    still in progress is not read. If the refresh fails, the current Pipeline
+    stays, the error is kept in `last_refresh`, and the files are tried again
+    once one of them changes again. `log`, if given, is called with a line
+    per refresh.
+    """
+
+    def __init__(self, pipeline, interval=5.0, log=None):
+        self.pipeline = pipeline
+        self.interval = interval
+        self.log = log
+        # Swaps so far; callers can key caches of derived values on it.
+        self.generation = 0
+        # The CSVs being refreshed for, while a refresh runs.
+        self.refreshing = None
+        self.last_refresh = None
+        self._prints = None
+        self._pending = {}
+        # Fingerprints of replaced CSVs whose refresh failed.
+        self._failed = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="allcamp-source-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        self.check()
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except OSError:
+                # A file moved away mid-check; look again next time.
+                pass
+
+    def check(self):
+        """
+        Look at the source CSVs once and refresh for the ones replaced since
+        the last check. The first check only records them. A replaced CSV is
+        recorded only once its refresh succeeds. One whose refresh failed is
+        not read again until it changes, and is refreshed for again along
+        with the next CSV replaced (or put back). Returns the names refreshed
+        for.
+        """
+        data_dir = self.pipeline.data_dir
+        if self._prints is None:
+            self._prints = source_fingerprints(data_dir)
+            return []
+        changed, prints, waiting = [], {}, {}
+        # Set when a CSV whose refresh failed is back to its recorded content.
+        restored = False
+        for name in SOURCE_FILES:
+            path = os.path.join(data_dir, name)
+            if not os.path.exists(path):
+                continue
+            stat = os.stat(path)
+            now = (stat.st_size, stat.st_mtime_ns)
+            recorded = self._prints.get(name)
+            if recorded is not None and now == (recorded["size"], recorded["mtime_ns"]):
+                self._pending.pop(name, None)
+                restored |= self._failed.pop(name, None) is not None
+                continue
+            failed = self._failed.get(name)
+            if failed is not None and now == (failed["size"], failed["mtime_ns"]):
+                waiting[name] = failed
+                continue
+            if self._pending.get(name) != now:
+                self._pending[name] = now
+                continue
+            del self._pending[name]
+            sha256 = file_sha256(path)
+            fingerprint = {"size": now[0], "mtime_ns": now[1], "sha256": sha256}
+            if recorded is None or sha256 != recorded["sha256"]:
+                changed.append(name)
+                prints[name] = fingerprint
+            else:
+                # Touched but identical.
+                self._prints[name] = fingerprint
+                restored |= self._failed.pop(name, None) is not None
+        if changed or (restored and waiting):
+            changed += sorted(waiting)
+            prints.update(waiting)
+            if self.refresh(changed) is not None:
+                self._prints.update(prints)
+                for name in prints:
+                    self._failed.pop(name, None)
+            else:
+                self._failed.update(prints)
+        return changed
+
+    def refresh(self, changed):
+        """Build the Pipeline for the replaced CSVs `changed` and swap it in."""
+        t0 = time.perf_counter()
+        current = self.pipeline
+        with current._lock:
+            built = {name: value for name, value in current._built.items() if name in current.recipes}
+        self.refreshing = sorted(changed)
+        try:
+            successor = current.refreshed(changed)
+            kept = [name for name in built if successor._built.get(name) is built[name]]
+            # Carried over with their H3 codes renumbered.
+            recoded = [
+                name for name in built
+                if name in RECODERS and name not in kept and name in successor._built
+            ]
+            # Without the base build, its update's artifacts have no recipe.
+            rebuilt = [
+                name for name in built
+                if name not in kept and name not in recoded and name in successor.recipes
+            ]
+            for name in rebuilt:
+                successor.get(name)
+        except Exception as exc:
+            self.last_refresh = {
+                "changed": sorted(changed), "at": time.strftime("%H:%M:%S"), "error": repr(exc),
+            }
+            if self.log is not None:
+                self.log(f"refresh for {', '.join(sorted(changed))} failed: {exc!r}")
+            return None
+        finally:
+            self.refreshing = None
+        self.pipeline = successor
+        self.generation += 1
+        self.last_refresh = {
+            "changed": sorted(changed),
+            "at": time.strftime("%H:%M:%S"),
+            "kept": kept,
+            "recoded": recoded,
+            "rebuilt": rebuilt,
+            "seconds": round(time.perf_counter() - t0, 3),
+            "error": None,
+        }
+        if self.log is not None:
+            self.log(
+                f"refreshed for {', '.join(sorted(changed))}: rebuilt {len(rebuilt)}, "
+                f"recoded {len(recoded)}, kept {len(kept)} in {time.perf_counter() - t0:.2f}s"
+            )
+        return successor
+
+
+# ==============================
+# 13. RESULT CACHE
+# ==============================
+# A ResultCache keeps the dashboard's expensive results on disk, so a
+# restarted server loads them instead of recomputing. Each entry is a
+# save_artifact folder named after a hash of everything the result depends
+# on: the sha256 of the source CSVs it is built from, the Pipeline settings,
+# any parameters, and code_version. Editing the code or replacing a CSV
+# changes the key, and the stale entries are left to age out. When the
+# entries pass `max_mb`, the least recently used are deleted.
+RESULT_CACHE_DIR = os.path.join(DATA_CACHE_DIR, "results")
+
+# Artifacts a Pipeline with a cache keeps in it.
+CACHED_ARTIFACTS = [
+    "overview_stats",
+    "agg_df_camp",
+    "agg_df_trans",
+    "site_night_cube",
+    "monthly_occupancy",
+    "expansion_data",
+    "lost_revenue",
+]
+
+
+def source_sha256(path):
+    """
+    file_sha256 of a source CSV, taken from its load_csv_cached metadata when
+    that still matches the file's size and mtime. None if the file is absent.
+    """
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    meta_path = os.path.join(os.path.dirname(path), DATA_CACHE_DIR, os.path.basename(path) + ".json")
+    try:
+        with open(meta_path) as fh:
+            meta = json.load(fh)
+        if meta["size"] == stat.st_size and meta["mtime_ns"] == stat.st_mtime_ns:
+            return meta["sha256"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return file_sha256(path)
+
+
+@functools.lru_cache(maxsize=None)
+def code_version(backend="pandas"):
+    """A hash of the modules that compute the artifacts with `backend`."""
+    modules = ["allcamp_calendar"] + [BACKENDS[backend]] * (BACKENDS[backend] is not None)
+    digest = hashlib.sha256(str(PIPELINE_VERSION).encode())
+    for path in [__file__] + [importlib.import_module(module).__file__ for module in modules]:
+        with open(path, "rb") as fh:
+            digest.update(fh.read())
+    return digest.hexdigest()
+
+
+def _folder_bytes(path):
+    return sum(
+        os.path.getsize(os.path.join(folder, name))
+        for folder, _, names in os.walk(path)
+        for name in names
+    )
+
+
+class ResultCache:
+    """Results saved under `root` by key, at most about `max_mb` MB of them."""
+
+    def __init__(self, root, max_mb=1024):
+        self.root = root
+        self.max_mb = max_mb
+        self._lock = threading.Lock()
+
+    def key(self, name, inputs):
+        """The entry name for result `name` computed from `inputs` (a JSON-able dict)."""
+        text = json.dumps(inputs, sort_keys=True, default=list)
+        return f"{name}-{hashlib.sha256(text.encode()).hexdigest()[:24]}"
+
+    def load(self, key):
+        """The result saved under `key`, or None if there is none."""
+        path = os.path.join(self.root, key)
+        if not os.path.exists(os.path.join(path, "manifest.json")):
+            return None
+        try:
+            with stage(f"load_result:{key}"):
+                value = load_artifact(path)
+            # The folder's mtime marks when it was last used.
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        return value
+
+    def save(self, key, value):
+        """
+        Save `value` under `key`, then evict. A result that cannot be saved
+        (unwritable folder, a type save_artifact does not handle) is skipped.
+        """
+        path = os.path.join(self.root, key)
+        staging = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            save_artifact(value, staging)
+            os.replace(staging, path)
+        except (OSError, ValueError, TypeError):
+            # Includes another process having saved the same key first.
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        self.evict()
+
+    def entries(self):
+        """(last used, bytes, key) of every entry, least recently used first."""
+        if not os.path.isdir(self.root):
+            return []
+        found = []
+        for key in os.listdir(self.root):
+            path = os.path.join(self.root, key)
+            if key.endswith(".tmp") or not os.path.isdir(path):
+                continue
+            try:
+                found.append((os.stat(path).st_mtime, _folder_bytes(path), key))
+            except OSError:
+                # Evicted by another process meanwhile.
+                pass
+        return sorted(found)
+
+    def evict(self):
+        """Delete the least recently used entries until they fit in max_mb."""
+        with self._lock:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, key in entries:
+                if total <= self.max_mb * 1e6:
+                    break
+                shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+                total -= size
+
+
+# ==============================
+# 14. WARM-UP
+# ==============================
+class WarmUp:
+    """
+    Builds the artifacts `names` of `pipeline` in a daemon thread, then runs
+    `tasks` ((label, callable) pairs for results kept outside the Pipeline),
+    so the first requests find them ready. `current` is the step running
+    (None once finished) and `done` counts the steps finished of `total`. A
+    step that raises is recorded in `errors` (label -> repr) and the rest
+    still run. prefer moves steps to the front of the queue.
+    """
+
+    def __init__(self, pipeline, names, tasks=()):
+        self.pipeline = pipeline
+        self._queue = [(name, functools.partial(pipeline.get, name)) for name in names]
+        self._queue += list(tasks)
+        self.total = len(self._queue)
+        self.done = 0
+        self.current = None
+        self.errors = {}
+        self.seconds = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="allcamp-warm-up", daemon=True)
+            self._thread.start()
+        return self
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def prefer(self, labels):
+        """Run the queued steps named in `labels` next, in that order."""
+        with self._lock:
+            ahead = [step for label in labels for step in self._queue if step[0] == label]
+            self._queue = ahead + [step for step in self._queue if step not in ahead]
+
+    def _run(self):
+        t0 = time.perf_counter()
+        while True:
+            with self._lock:
+                if not self._queue:
+                    break
+                label, step = self._queue.pop(0)
+                self.current = label
+            try:
+                step()
+            except Exception as exc:
+                self.errors[label] = repr(exc)
+            self.done += 1
+        self.current = None
+        self.seconds = time.perf_counter() - t0
@@ -0,0 +1,314 @@
+"""
+Polars execution backend: overview stats, monthly occupancy, expansion
+opportunities and lost revenue as lazy Polars queries.
+
+Select it with Pipeline(backend="polars"). Its ARTIFACTS replace the pandas
+recipes of the same name and produce the same frames. Each function hands
+only the columns it needs to Polars, builds one lazy query (so Polars can
+prune and reorder it) and collects it on all cores; the small per-hex
+tails (mismatch ratios, lost revenue per hex) reuse the pandas code.
+Requires the `polars` package.
+"""
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from allcamp_calendar import WEEKEND_DAYS
+from allcamp_pipeline import (
+    CAPACITY_COLUMNS,
+    CUBE_CATEGORIES,
+    _with_occupancy_rate,
+    analysis_end,
+    analysis_start,
+    expansion_from_hex_columns,
+    lost_revenue_from_totals,
+)
+from allcamp_profile import instrumented
+
+
+def _lazy(df, columns):
+    """
+    The `columns` of a pandas frame as a LazyFrame, categoricals as strings
+    and integers widened to Int64 (compact frames downcast them, and Polars
+    sums in the column's own type).
+    """
+    frame = pl.from_pandas(df[[col for col in columns if col in df.columns]])
+    return frame.lazy().with_columns(
+        pl.col(pl.Categorical).cast(pl.String),
+        pl.selectors.integer().cast(pl.Int64),
+    )
+
+
+def _dense(grouped, columns, n):
+    """Per-code values of a collected frame with a "code" column as dense arrays."""
+    codes = grouped["code"].to_numpy()
+    out = {}
+    for col in columns:
+        values = grouped[col].to_numpy()
+        out[col] = np.zeros(n, dtype=values.dtype)
+        out[col][codes] = values
+    return out
+
+
+def _nunique(col):
+    # pandas' nunique: missing values are not counted.
+    return pl.col(col).drop_nulls().n_unique().cast(pl.Int64)
+
+
+def _days(later, earlier):
+    return (later - earlier).dt.total_days()
+
+
+# ==============================
+# 1. OVERVIEW STATS
+# ==============================
+@instrumented
+def compute_overview_stats_polars(df_camp, df_trans_valid):
+    camp = _lazy(df_camp, [
+        "campground_uuid", "went_live_date", "first_booked_at_date", "campground_state",
+    ])
+    bookings = _lazy(
+        df_trans_valid[df_trans_valid["partial_nights_2028"] > 0],
+        ["booking_uuid", "campground_uuid", "campsite_category", "partial_revenue_2028"],
+    )
+    uuid = pl.col("campground_uuid")
+    counts, totals, revenue_by_state, cat_counts = pl.collect_all([
+        camp.select(
+            total_camp_count_all=_nunique("campground_uuid"),
+            live_camp_count=uuid.filter(pl.col("went_live_date").is_not_null())
+                .drop_nulls().n_unique().cast(pl.Int64),
+            active_camp_count=uuid.filter(pl.col("first_booked_at_date").is_not_null())
+                .drop_nulls().n_unique().cast(pl.Int64),
+        ),
+        bookings.select(
+            total_revenue_2028=pl.col("partial_revenue_2028").sum(),
+            total_bookings_2028=_nunique("booking_uuid"),
+        ),
+        # Grouped in state order, then sorted by revenue in pandas, so ties and
+        # the row labels come out as in compute_overview_stats.
+        bookings.join(camp.select("campground_uuid", "campground_state"), on="campground_uuid")
+            .drop_nulls("campground_state")
+            .group_by("campground_state")
+            .agg(state_revenue_2028=pl.col("partial_revenue_2028").sum())
+            .sort("campground_state"),
+        bookings.drop_nulls("campsite_category")
+            .group_by("campsite_category")
+            .agg(count_of_bookings=_nunique("booking_uuid"))
+            .sort("campsite_category"),
+    ])
+    return {
+        "total_camp_count_all": counts["total_camp_count_all"][0],
+        "live_camp_count": counts["live_camp_count"][0],
+        "active_camp_count": counts["active_camp_count"][0],
+        "total_revenue_2028": totals["total_revenue_2028"][0],
+        "total_bookings_2028": totals["total_bookings_2028"][0],
+        "revenue_by_state_df": revenue_by_state.to_pandas()
+            .sort_values("state_revenue_2028", ascending=False),
+        "campsite_category_df": cat_counts.to_pandas(),
+    }
+
+
+# ==============================
+# 2. OCCUPANCY
+# ==============================
+@instrumented
+def compute_monthly_occupancy_polars(df_camp, df_bookings, year=2028):
+    """
+    compute_monthly_occupancy without the site-night cube, the same way as
+    compute_monthly_occupancy_sql: campgrounds summed per (hex, went-live
+    day) and bookings counted per (hex, check-in, check-out) are expanded to
+    their nights in `year`, then summed by hex, month and weekend.
+    """
+    first = pd.Timestamp(year=year, month=1, day=1).date()
+    last = pd.Timestamp(year=year, month=12, day=31).date()
+    cats = range(len(CUBE_CATEGORIES))
+
+    def sites(columns):
+        present = [pl.col(col).fill_null(0) for col in columns if col in df_camp.columns]
+        return pl.sum_horizontal(present) if present else pl.lit(0)
+
+    live = (
+        _lazy(df_camp, ["campground_h3_hexagon_id_l4", "went_live_date"]
+              + sorted({col for columns in CAPACITY_COLUMNS.values() for col in columns}))
+        .drop_nulls("went_live_date")
+        .group_by(
+            h3_id=pl.col("campground_h3_hexagon_id_l4").cast(pl.String),
+            start=pl.max_horizontal(pl.col("went_live_date").dt.date(), pl.lit(first)),
+        )
+        .agg(**{
+            f"cap_{c}": sites(CAPACITY_COLUMNS[category]).sum()
+            for c, category in enumerate(CUBE_CATEGORIES)
+        })
+        .with_columns(end=pl.lit(last), **{f"use_{c}": pl.lit(0) for c in cats})
+    )
+    category = pl.col("campsite_category")
+    stays = (
+        _lazy(df_bookings, [
+            "h3_hexagon_id_l4", "trip_checkin_date", "trip_checkout_date", "campsite_category",
+        ])
+        .filter(pl.col("trip_checkout_date") > pl.col("trip_checkin_date"))
+        .group_by(
+            h3_id=pl.col("h3_hexagon_id_l4").cast(pl.String),
+            start=pl.max_horizontal(pl.col("trip_checkin_date").dt.date(), pl.lit(first)),
+            end=pl.min_horizontal(
+                pl.col("trip_checkout_date").dt.date() - pl.duration(days=1), pl.lit(last)
+            ),
+        )
+        .agg(**{
+            f"use_{c}": pl.len() if name == "All" else (category == name).sum()
+            for c, name in enumerate(CUBE_CATEGORIES)
+        })
+        .with_columns(**{f"cap_{c}": pl.lit(0.0) for c in cats})
+    )
+    value_columns = [f"{kind}_{c}" for kind in ("cap", "use") for c in cats]
+    monthly = (
+        pl.concat([live, stays], how="diagonal_relaxed")
+        .filter(pl.col("start") <= pl.col("end"))
+        .with_columns(day=pl.date_ranges("start", "end"))
+        .explode("day")
+        .group_by(
+            "h3_id",
+            month=pl.col("day").dt.month().cast(pl.Int64),
+            weekend=(pl.col("day").dt.weekday() - 1).is_in(list(WEEKEND_DAYS)),
+        )
+        .agg(pl.col(value_columns).sum())
+    )
+    by_category = pl.concat([
+        monthly.select(
+            "h3_id", "month", "weekend",
+            category=pl.lit(name),
+            category_order=pl.lit(c),
+            capacity_site_nights=pl.col(f"cap_{c}").cast(pl.Float64),
+            used_site_nights=pl.col(f"use_{c}").cast(pl.Int64),
+        )
+        for c, name in enumerate(CUBE_CATEGORIES)
+    ])
+    result = (
+        pl.concat([
+            by_category.with_columns(weekend_only=pl.lit(False)),
+            by_category.filter("weekend").with_columns(weekend_only=pl.lit(True)),
+        ])
+        .group_by("h3_id", "month", "category", "weekend_only", "category_order")
+        .agg(
+            capacity_site_nights=pl.col("capacity_site_nights").sum().round().cast(pl.Int64),
+            used_site_nights=pl.col("used_site_nights").sum(),
+        )
+        .sort("weekend_only", "month", "h3_id", "category_order")
+        .select(
+            "h3_id", "month", "category", "weekend_only",
+            "capacity_site_nights", "used_site_nights",
+        )
+        .collect()
+    )
+    return _with_occupancy_rate(result.to_pandas())
+
+
+# ==============================
+# 3. EXPANSION OPPORTUNITIES
+# ==============================
+@instrumented
+def compute_expansion_opportunities_polars(
+    df_camp, df_trans_valid, search_rollups, h3_ids,
+    regions=("Southeast",), window_start=None, window_end=None,
+):
+    """compute_expansion_opportunities (without day types) as Polars queries."""
+    window_start = analysis_start if window_start is None else pd.Timestamp(window_start)
+    window_end = analysis_end if window_end is None else pd.Timestamp(window_end)
+    if isinstance(regions, str):
+        regions = [regions]
+
+    camp = _lazy(df_camp, [
+        "campground_uuid", "went_live_date", "campground_region",
+        "campground_h3_hexagon_id_l4_code", "number_of_sites",
+        "rv_friendly_sites", "tent_friendly_sites", "structure_sites",
+    ]).drop_nulls("went_live_date")
+    if regions is not None:
+        camp = camp.filter(pl.col("campground_region").is_in(list(regions)))
+    camp = camp.rename({"campground_h3_hexagon_id_l4_code": "code"})
+
+    # Same as days_in_overlap(went_live_date, 2099-12-31, window_start, window_end)
+    live_end = min(pd.Timestamp("2099-12-31"), window_end)
+    days_live = (
+        _days(pl.lit(live_end), pl.max_horizontal(pl.col("went_live_date"), pl.lit(window_start))) + 1
+    ).clip(lower_bound=0)
+    capacity = camp.group_by("code").agg(
+        partial_capacity=(days_live * pl.col("number_of_sites")).sum(),
+        rv_capacity=(days_live * pl.col("rv_friendly_sites")).sum(),
+        tent_capacity=(days_live * pl.col("tent_friendly_sites")).sum(),
+        structure_capacity=(days_live * pl.col("structure_sites")).sum(),
+    )
+
+    # Same as days_in_overlap(checkin, checkout - 1 day, window_start, window_end)
+    stay_start = pl.max_horizontal(pl.col("trip_checkin_date"), pl.lit(window_start))
+    stay_end = pl.min_horizontal(
+        pl.col("trip_checkout_date") - pl.duration(days=1), pl.lit(window_end)
+    )
+    days_booked = (_days(stay_end, stay_start) + 1).clip(lower_bound=0).fill_null(0)
+    cat = pl.col("campsite_category")
+    rv_share = pl.when(cat == "rv-only").then(1.0).when(cat == "tent-or-rv").then(0.5).otherwise(0.0)
+    struct_share = pl.when(cat == "structure").then(1.0).otherwise(0.0)
+    tent_share = 1.0 - rv_share - struct_share
+    usage = (
+        _lazy(df_trans_valid, [
+            "campground_uuid", "trip_checkin_date", "trip_checkout_date", "campsite_category",
+        ])
+        .join(camp.select("campground_uuid", "code"), on="campground_uuid")
+        .group_by("code")
+        .agg(
+            used_site_nights=days_booked.sum(),
+            used_rv_nights=(days_booked * rv_share.fill_null(0.0)).sum(),
+            used_tent_nights=(days_booked * tent_share.fill_null(1.0)).sum(),
+            used_structure_nights=(days_booked * struct_share.fill_null(0.0)).sum(),
+        )
+    )
+    capacity, usage = pl.collect_all([capacity, usage])
+
+    n = len(h3_ids)
+    columns = {
+        **_dense(capacity, ["partial_capacity", "rv_capacity", "tent_capacity", "structure_capacity"], n),
+        **_dense(usage, [
+            "used_site_nights", "used_rv_nights", "used_tent_nights", "used_structure_nights",
+        ], n),
+    }
+    present = np.zeros(n, dtype=bool)
+    present[capacity["code"].to_numpy()] = True
+    present[usage["code"].to_numpy()] = True
+    return expansion_from_hex_columns(columns, present, search_rollups, h3_ids)
+
+
+@instrumented
+def compute_lost_revenue_polars(df_camp, df_trans_valid, expansion_data):
+    camp_se = _lazy(df_camp, ["campground_uuid", "campground_region", "went_live_date"]).filter(
+        (pl.col("campground_region") == "Southeast") & pl.col("went_live_date").is_not_null()
+    )
+    totals = (
+        _lazy(df_trans_valid, [
+            "booking_uuid", "campground_uuid", "partial_nights_2028", "partial_revenue_2028",
+        ])
+        .join(camp_se.select("campground_uuid"), on="campground_uuid")
+        .filter(pl.col("partial_nights_2028") > 0)
+        .select(
+            bookings=_nunique("booking_uuid"),
+            nights=pl.col("partial_nights_2028").sum(),
+            revenue=pl.col("partial_revenue_2028").sum(),
+        )
+        .collect()
+    )
+    return lost_revenue_from_totals(
+        expansion_data, totals["bookings"][0], totals["nights"][0], totals["revenue"][0]
+    )
+
+
+# name -> (dependencies, build function), overriding allcamp_pipeline.ARTIFACTS.
+ARTIFACTS = {
+    "overview_stats":    (("campgrounds", "transactions_2028"), compute_overview_stats_polars),
+    "monthly_occupancy": (("campgrounds", "transactions_2028"), compute_monthly_occupancy_polars),
+    "expansion_data":    (
+        ("campgrounds", "transactions_2028", "search_rollups", "h3_ids"),
+        compute_expansion_opportunities_polars,
+    ),
+    "lost_revenue":      (
+        ("campgrounds", "transactions_2028", "expansion_data"),
+        compute_lost_revenue_polars,
+    ),
+}
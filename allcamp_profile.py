@@ -0,0 +1,128 @@
+"""
+Opt-in per-stage instrumentation: wall time, rows in/out and peak memory.
+
+Functions wrapped with @instrumented (or code inside `with stage(...)`)
+record themselves only while a profiling() block is active in the current
+thread, so they cost one context-variable lookup otherwise. Every finished
+stage is also logged as one JSON line on the "allcamp.profile" logger.
+
+Peak memory comes from tracemalloc, which is process-wide: stages that run
+while another session is busy include that session's allocations too.
+"""
+import contextvars
+import functools
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("allcamp.profile")
+
+_active = contextvars.ContextVar("allcamp_profile", default=None)
+
+
+class Profile:
+    """Stage records collected during one profiling() block."""
+
+    def __init__(self, label=None, memory=True):
+        self.label = label
+        self.memory = memory
+        self.records = []
+        self.started = time.perf_counter()
+        self.seconds = None
+        self._stack = []
+
+    def frame(self):
+        """The records as a frame, in the order stages started."""
+        columns = ["stage", "depth", "seconds", "rows_in", "rows_out", "peak_mb", "payload_kb"]
+        return pd.DataFrame(self.records, columns=columns)
+
+
+def row_count(value):
+    """Rows in a frame/array, the first frame of a tuple, else None."""
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(value)
+    if isinstance(value, tuple) and value and isinstance(value[0], pd.DataFrame):
+        return len(value[0])
+    return None
+
+
+@contextmanager
+def profiling(label=None, memory=True):
+    """Collect stage records from this thread into the yielded Profile."""
+    profile = Profile(label, memory)
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    token = _active.set(profile)
+    try:
+        yield profile
+    finally:
+        _active.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+        profile.seconds = time.perf_counter() - profile.started
+        logger.info(json.dumps({
+            "event": "profile", "label": label,
+            "seconds": round(profile.seconds, 6), "stages": len(profile.records),
+        }))
+
+
+def is_profiling():
+    return _active.get() is not None
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """
+    Time the block as stage `name`. Yields the stage's record (a dict the
+    block may add fields to, e.g. rows_out) or None when not profiling.
+    """
+    profile = _active.get()
+    if profile is None:
+        yield None
+        return
+
+    tracing = profile.memory and tracemalloc.is_tracing()
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        # Nested stages reset the peak, so hand the parent what it saw so far.
+        if profile._stack:
+            profile._stack[-1]["child_peak"] = max(profile._stack[-1]["child_peak"], peak)
+        tracemalloc.reset_peak()
+    record = {"stage": name, "depth": len(profile._stack), "rows_in": rows_in}
+    profile.records.append(record)
+    frame = {"start": current if tracing else 0, "child_peak": 0}
+    profile._stack.append(frame)
+    t0 = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = time.perf_counter() - t0
+        profile._stack.pop()
+        if tracing:
+            peak = max(tracemalloc.get_traced_memory()[1], frame["child_peak"])
+            record["peak_mb"] = (peak - frame["start"]) / 2**20
+            if profile._stack:
+                profile._stack[-1]["child_peak"] = max(profile._stack[-1]["child_peak"], peak)
+        fields = {k: round(v, 6) if isinstance(v, float) else v for k, v in record.items()}
+        logger.info(json.dumps({"event": "stage", "label": profile.label, **fields}, default=str))
+
+
+def instrumented(func):
+    """Record each call of `func` as a stage named after it."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _active.get() is None:
+            return func(*args, **kwargs)
+        counts = [c for c in map(row_count, args) if c is not None]
+        rows_in = sum(counts) if counts else None
+        with stage(func.__name__, rows_in=rows_in) as record:
+            result = func(*args, **kwargs)
+            record["rows_out"] = row_count(result)
+        return result
+    return wrapper
@@ -0,0 +1,223 @@
+"""
+DuckDB execution backend: hex aggregates, overview stats and monthly
+occupancy as SQL over the pipeline's frames.
+
+Select it with Pipeline(backend="duckdb"). Its ARTIFACTS replace the pandas
+recipes of the same name and produce the same frames. Requires the `duckdb`
+package.
+
+The frames are registered with an in-process DuckDB connection, which scans
+them in place and runs each query columnar and on all cores. DuckDB never
+holds the data itself: the queries need the validated, prorated frames that
+only the pandas stages produce, so loading and proration stay in pandas,
+with no database file (it would duplicate the tables and go stale whenever
+a CSV changes) and no predicate pushdown (the queries aggregate whole
+tables anyway).
+"""
+import duckdb
+import pandas as pd
+
+from allcamp_calendar import WEEKEND_DAYS
+from allcamp_pipeline import CAPACITY_COLUMNS, CUBE_CATEGORIES, _with_occupancy_rate
+from allcamp_profile import instrumented
+
+
+def run_sql(sql, **tables):
+    """Run `sql` with each frame in `tables` visible under its keyword; returns a frame."""
+    con = duckdb.connect()
+    try:
+        for name, df in tables.items():
+            con.register(name, df)
+        return con.execute(sql).df()
+    finally:
+        con.close()
+
+
+def _text(col):
+    # Categorical columns arrive as ENUMs; compare, group and sort them as text.
+    return f'CAST("{col}" AS VARCHAR)'
+
+
+def _sum(df, col):
+    """SUM(col) with NULLs as 0, typed like hex_sum: integers stay integers."""
+    dtype = df[col].dtype
+    kind = "BIGINT" if pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype) else "DOUBLE"
+    return f'CAST(coalesce(sum("{col}"), 0) AS {kind})'
+
+
+# ==============================
+# 1. HEX AGGREGATIONS
+# ==============================
+@instrumented
+def aggregate_campgrounds_by_hex_sql(df_camp, h3_ids):
+    h3 = "campground_h3_hexagon_id_l4"
+    return run_sql(f"""
+        SELECT {_text(h3)} AS h3_id,
+               count(DISTINCT campground_uuid) AS count_of_campgrounds,
+               {_sum(df_camp, "number_of_sites")} AS total_sites,
+               {_sum(df_camp, "tent_friendly_sites")} AS total_tent_sites,
+               {_sum(df_camp, "rv_friendly_sites")} AS total_rv_sites,
+               {_sum(df_camp, "structure_sites")} AS total_structure_sites
+        FROM campgrounds
+        WHERE went_live_date IS NOT NULL
+        GROUP BY 1
+        ORDER BY 1
+    """, campgrounds=df_camp)
+
+
+@instrumented
+def aggregate_bookings_by_hex_sql(df, h3_ids):
+    return run_sql(f"""
+        SELECT {_text("h3_hexagon_id_l4")} AS h3_id,
+               count(DISTINCT booking_uuid) AS count_of_bookings,
+               {_sum(df, "partial_revenue_2028")} AS total_revenue
+        FROM bookings
+        GROUP BY 1
+        ORDER BY 1
+    """, bookings=df)
+
+
+# ==============================
+# 2. OVERVIEW STATS
+# ==============================
+@instrumented
+def compute_overview_stats_sql(df_camp, df_trans_valid):
+    tables = {
+        "campgrounds": df_camp,
+        "bookings": df_trans_valid[df_trans_valid["partial_nights_2028"] > 0],
+    }
+    counts = run_sql("""
+        SELECT count(DISTINCT campground_uuid) AS total_camp_count_all,
+               count(DISTINCT campground_uuid) FILTER (WHERE went_live_date IS NOT NULL)
+                   AS live_camp_count,
+               count(DISTINCT campground_uuid) FILTER (WHERE first_booked_at_date IS NOT NULL)
+                   AS active_camp_count
+        FROM campgrounds
+    """, **tables).iloc[0]
+    totals = run_sql("""
+        SELECT coalesce(sum(partial_revenue_2028), 0) AS total_revenue_2028,
+               count(DISTINCT booking_uuid) AS total_bookings_2028
+        FROM bookings
+    """, **tables).iloc[0]
+
+    # Grouped in state order, then sorted by revenue in pandas, so ties and
+    # the row labels come out as in compute_overview_stats.
+    revenue_by_state = run_sql(f"""
+        SELECT {_text("campground_state")} AS campground_state,
+               coalesce(sum(b.partial_revenue_2028), 0) AS state_revenue_2028
+        FROM bookings b
+        JOIN campgrounds c
+          ON CAST(b.campground_uuid AS VARCHAR) = CAST(c.campground_uuid AS VARCHAR)
+        WHERE c.campground_state IS NOT NULL
+        GROUP BY 1
+        ORDER BY 1
+    """, **tables).sort_values("state_revenue_2028", ascending=False)
+
+    cat_counts = run_sql(f"""
+        SELECT {_text("campsite_category")} AS campsite_category,
+               count(DISTINCT booking_uuid) AS count_of_bookings
+        FROM bookings
+        WHERE campsite_category IS NOT NULL
+        GROUP BY 1
+        ORDER BY 1
+    """, **tables)
+
+    return {
+        "total_camp_count_all": int(counts["total_camp_count_all"]),
+        "live_camp_count": int(counts["live_camp_count"]),
+        "active_camp_count": int(counts["active_camp_count"]),
+        "total_revenue_2028": totals["total_revenue_2028"],
+        "total_bookings_2028": int(totals["total_bookings_2028"]),
+        "revenue_by_state_df": revenue_by_state,
+        "campsite_category_df": cat_counts,
+    }
+
+
+# ==============================
+# 3. OCCUPANCY
+# ==============================
+@instrumented
+def compute_monthly_occupancy_sql(df_camp, df_bookings, year=2028):
+    """
+    compute_monthly_occupancy without the site-night cube. Campgrounds are
+    summed per (hex, went-live day) and bookings counted per (hex, check-in,
+    check-out), then each group is expanded to its nights in `year` and
+    summed by hex, month and weekend. `df_bookings` needs every valid booking
+    with a night in `year`.
+    """
+    first, stop = f"DATE '{year}-01-01'", f"DATE '{year + 1}-01-01'"
+    weekend = "(isodow(day) - 1) IN ({})".format(", ".join(str(d) for d in WEEKEND_DAYS))
+    cats = range(len(CUBE_CATEGORIES))
+    # Widened before adding: compact frames store site counts as TINYINT.
+    capacity = ", ".join(
+        "sum({}) AS cap_{}".format(
+            " + ".join(
+                f'coalesce(CAST("{col}" AS DOUBLE), 0)' for col in columns if col in df_camp.columns
+            ) or "0",
+            c,
+        )
+        for c, columns in enumerate(CAPACITY_COLUMNS[category] for category in CUBE_CATEGORIES)
+    )
+    usage = ", ".join(
+        f"count(*) AS use_{c}" if category == "All"
+        else f"count(*) FILTER (WHERE {_text('campsite_category')} = '{category}') AS use_{c}"
+        for c, category in enumerate(CUBE_CATEGORIES)
+    )
+    zeros = lambda prefix: ", ".join(f"0 AS {prefix}_{c}" for c in cats)
+    own = lambda prefix: ", ".join(f"{prefix}_{c}" for c in cats)
+    sums = ", ".join(f"sum(cap_{c}) AS cap_{c}, sum(use_{c}) AS use_{c}" for c in cats)
+    by_category = " UNION ALL ".join(
+        f"""SELECT h3_id, month, '{category}' AS category, weekend,
+                   cap_{c} AS capacity_site_nights, use_{c} AS used_site_nights, {c} AS category_order
+            FROM monthly"""
+        for c, category in enumerate(CUBE_CATEGORIES)
+    )
+    monthly = run_sql(f"""
+        WITH live AS (
+            SELECT {_text("campground_h3_hexagon_id_l4")} AS h3_id,
+                   CAST(went_live_date AS DATE) AS live_day, {capacity}
+            FROM campgrounds
+            WHERE went_live_date IS NOT NULL
+            GROUP BY 1, 2
+        ),
+        stays AS (
+            SELECT {_text("h3_hexagon_id_l4")} AS h3_id,
+                   CAST(trip_checkin_date AS DATE) AS checkin,
+                   CAST(trip_checkout_date AS DATE) AS checkout, {usage}
+            FROM bookings
+            WHERE trip_checkout_date > trip_checkin_date
+            GROUP BY 1, 2, 3
+        ),
+        nights AS (
+            SELECT h3_id, CAST(d AS DATE) AS day, {own("cap")}, {zeros("use")}
+            FROM live, range(greatest(live_day, {first}), {stop}, INTERVAL 1 DAY) AS t(d)
+            UNION ALL
+            SELECT h3_id, CAST(d AS DATE) AS day, {zeros("cap")}, {own("use")}
+            FROM stays, range(greatest(checkin, {first}), least(checkout, {stop}), INTERVAL 1 DAY) AS t(d)
+        ),
+        monthly AS (
+            SELECT h3_id, month(day) AS month, {weekend} AS weekend, {sums}
+            FROM nights
+            GROUP BY 1, 2, 3
+        )
+        SELECT h3_id, month, category, weekend_only,
+               CAST(round(sum(capacity_site_nights)) AS BIGINT) AS capacity_site_nights,
+               CAST(sum(used_site_nights) AS BIGINT) AS used_site_nights
+        FROM (
+            SELECT *, false AS weekend_only FROM ({by_category})
+            UNION ALL
+            SELECT *, true AS weekend_only FROM ({by_category}) WHERE weekend
+        )
+        GROUP BY h3_id, month, category, weekend_only, category_order
+        ORDER BY weekend_only, month, h3_id, category_order
+    """, campgrounds=df_camp, bookings=df_bookings)
+    return _with_occupancy_rate(monthly)
+
+
+# name -> (dependencies, build function), overriding allcamp_pipeline.ARTIFACTS.
+ARTIFACTS = {
+    "agg_df_camp":       (("campgrounds", "h3_ids"), aggregate_campgrounds_by_hex_sql),
+    "agg_df_trans":      (("transactions_valid", "h3_ids"), aggregate_bookings_by_hex_sql),
+    "overview_stats":    (("campgrounds", "transactions_2028"), compute_overview_stats_sql),
+    "monthly_occupancy": (("campgrounds", "transactions_2028"), compute_monthly_occupancy_sql),
+}
@@ -0,0 +1,323 @@
+"""
+Write synthetic campgrounds.csv, transactions.csv and searches.csv with the
+columns the dashboard reads, for benchmarks and demos without real data.
+
+    python allcamp_synth.py --transactions 1000000 --out synthetic
+
+Bookings and searches are written in chunks, so row counts in the tens of
+millions fit in memory. Activity is skewed across hexes (a few busy hexes, a
+long quiet tail), and some searched hexes have no campgrounds at all.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# ==============================
+# 1. H3 IDS
+# ==============================
+# Resolution-0 base cells over North America, with the states (and region)
+# hexes in each are labelled with. Base cell 34 covers the Southeast.
+BASE_CELLS = {
+    34: ("Southeast", ["GA", "FL", "NC", "SC", "TN", "AL", "MS", "LA"]),
+    19: ("Midwest", ["TX", "CO", "IL", "MN", "KY", "MO"]),
+    20: ("West", ["CA", "OR", "WA"]),
+    21: ("Northeast", ["NY", "ME", "VA", "PA"]),
+    36: ("Southwest", ["AZ", "NM", "UT"]),
+}
+
+H3_RESOLUTION = 4
+
+
+def h3_cells(base_cells, digits, resolution=H3_RESOLUTION):
+    """
+    H3 cell ids (hex strings) from base cell numbers and per-resolution
+    child digits (shape (n, resolution), values 0-6). Unused digits are 7.
+    """
+    h = (np.uint64(1) << np.uint64(59)) | (np.uint64(resolution) << np.uint64(52))
+    h = h | (np.asarray(base_cells, dtype=np.uint64) << np.uint64(45))
+    for level in range(1, 16):
+        digit = digits[:, level - 1].astype(np.uint64) if level <= resolution else np.uint64(7)
+        h = h | (digit << np.uint64((15 - level) * 3))
+    return np.array([f"{v:x}" for v in h], dtype=object), h
+
+
+def h3_parent(cells, resolution=H3_RESOLUTION - 1):
+    """Ids of the `resolution` parents of the integer cell ids from h3_cells."""
+    h = cells & ~(np.uint64(15) << np.uint64(52))
+    h = h | (np.uint64(resolution) << np.uint64(52))
+    for level in range(resolution + 1, 16):
+        h = h | (np.uint64(7) << np.uint64((15 - level) * 3))
+    return np.array([f"{v:x}" for v in h], dtype=object)
+
+
+def make_hexes(rng, n_hexes):
+    """
+    `n_hexes` distinct L4 cells with state, region and a Zipf-like activity
+    weight. Returns a frame with h3_id, h3_parent_id, state, region, weight.
+    """
+    bases = np.array(list(BASE_CELLS))
+    per_base = 7 ** H3_RESOLUTION
+    n_hexes = min(n_hexes, len(bases) * per_base)
+    picks = rng.choice(len(bases) * per_base, size=n_hexes, replace=False)
+    base = bases[picks // per_base]
+    digits = np.stack(
+        [(picks % per_base) // 7 ** (H3_RESOLUTION - 1 - i) % 7 for i in range(H3_RESOLUTION)],
+        axis=1,
+    )
+    ids, ints = h3_cells(base, digits)
+
+    states = np.empty(n_hexes, dtype=object)
+    regions = np.empty(n_hexes, dtype=object)
+    for b, (region, names) in BASE_CELLS.items():
+        mask = base == b
+        states[mask] = rng.choice(names, size=mask.sum())
+        regions[mask] = region
+
+    weight = 1.0 / np.arange(1, n_hexes + 1) ** 1.1
+    rng.shuffle(weight)
+    return pd.DataFrame({
+        "h3_id": ids,
+        "h3_parent_id": h3_parent(ints),
+        "state": states,
+        "region": regions,
+        "weight": weight / weight.sum(),
+    })
+
+
+def random_uuids(rng, n):
+    """`n` random version-4-style UUID strings."""
+    hex_digits = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+    out = np.full((n, 36), ord("-"), dtype=np.uint8)
+    cols = [i for i in range(36) if i not in (8, 13, 18, 23)]
+    out[:, cols] = hex_digits[rng.integers(0, 16, size=(n, 32))]
+    out[:, 14] = ord("4")
+    return out.view("S36").ravel().astype(str).astype(object)
+
+
+# ==============================
+# 2. TABLES
+# ==============================
+CATEGORY_NIGHTLY_RATE = {
+    "tent-or-rv": 45.0,
+    "rv-only": 60.0,
+    "structure": 120.0,
+    "tent-only": 35.0,
+}
+
+SEARCH_TYPES = [
+    "rv_searchers", "tent_searchers", "glamping_searchers",
+    "family_friendly_searchers", "pet_friendly_searchers", "good_for_groups_searchers",
+]
+SEARCH_TYPE_SHARE = [0.25, 0.35, 0.12, 0.15, 0.10, 0.05]
+
+SEARCH_CHANNELS = [
+    "seo_searchers", "paid_search_engine_searchers", "social_searchers",
+    "sharing_searchers", "direct_searchers", "other_channel_searchers",
+]
+SEARCH_CHANNEL_SHARE = [0.35, 0.20, 0.12, 0.08, 0.20, 0.05]
+
+
+def make_campgrounds(rng, hexes, n):
+    hex_idx = rng.choice(len(hexes), size=n, p=hexes["weight"].to_numpy())
+    total = np.maximum(1, rng.lognormal(2.5, 0.9, size=n).astype(int))
+    structure = rng.binomial(total, rng.beta(1, 6, size=n))
+    flexible = total - structure
+    rv = rng.binomial(flexible, rng.beta(2, 2, size=n))
+    tent = flexible - rng.binomial(rv, 0.3)
+
+    went_live = pd.Timestamp("2019-01-01") + pd.to_timedelta(
+        rng.integers(0, 365 * 10, size=n), unit="D"
+    )
+    first_booked = went_live + pd.to_timedelta(
+        rng.exponential(60, size=n).astype(int) * 86400 + rng.integers(0, 86400, size=n),
+        unit="s",
+    )
+    went_live = pd.Series(went_live.strftime("%Y-%m-%d"), dtype=object)
+    first_booked = pd.Series(first_booked.strftime("%Y-%m-%dT%H:%M:%S.000Z"), dtype=object)
+    went_live[rng.random(n) < 0.03] = None
+    first_booked[rng.random(n) < 0.15] = None
+
+    sites = pd.Series(total, dtype="float64")
+    sites[rng.random(n) < 0.01] = np.nan
+    return pd.DataFrame({
+        "campground_uuid": random_uuids(rng, n),
+        "went_live_date": went_live,
+        "first_booked_at_date": first_booked,
+        "campground_h3_hexagon_id_l4": hexes["h3_id"].to_numpy()[hex_idx],
+        "number_of_sites": sites,
+        "tent_friendly_sites": tent,
+        "rv_friendly_sites": rv,
+        "structure_sites": structure,
+        "campground_state": hexes["state"].to_numpy()[hex_idx],
+        "campground_region": hexes["region"].to_numpy()[hex_idx],
+    })
+
+
+def checkin_day_weights(start, end):
+    """Summer-peaked, Friday/Saturday-heavy check-in probabilities per day."""
+    days = pd.date_range(start, end, freq="D")
+    season = 1.0 + 0.8 * np.cos(2 * np.pi * (days.dayofyear.to_numpy() - 196) / 365.25)
+    weekend = np.where(np.isin(days.dayofweek, [4, 5]), 1.8, 1.0)
+    weight = season * weekend
+    return days, weight / weight.sum()
+
+
+def make_transactions(rng, df_camp, n, start="2027-07-01", end="2029-06-30"):
+    sites = df_camp["number_of_sites"].fillna(1).to_numpy()
+    popularity = sites * rng.lognormal(0, 1.0, size=len(df_camp))
+    cg_idx = rng.choice(len(df_camp), size=n, p=popularity / popularity.sum())
+
+    # Booking category follows the campground's site mix.
+    mix = df_camp[["tent_friendly_sites", "rv_friendly_sites", "structure_sites"]].to_numpy(float)[cg_idx]
+    mix = mix + 1e-9
+    u = rng.random(n) * mix.sum(axis=1)
+    category = np.where(
+        u < mix[:, 2], "structure",
+        np.where(u < mix[:, 2] + mix[:, 1], "rv-only",
+                 np.where(rng.random(n) < 0.7, "tent-or-rv", "tent-only")),
+    ).astype(object)
+
+    days, p = checkin_day_weights(start, end)
+    checkin = days[rng.choice(len(days), size=n, p=p)]
+    nights = np.minimum(rng.geometric(0.45, size=n), 21)
+    checkout = checkin + pd.to_timedelta(nights, unit="D")
+
+    rate = pd.Series(category).map(CATEGORY_NIGHTLY_RATE).to_numpy()
+    cost = np.round(nights * rate * rng.lognormal(0, 0.35, size=n), 2)
+
+    checkin = pd.Series(checkin.strftime("%Y-%m-%d"), dtype=object)
+    checkin[rng.random(n) < 0.005] = None
+    return pd.DataFrame({
+        "booking_uuid": random_uuids(rng, n),
+        "campground_uuid": df_camp["campground_uuid"].to_numpy()[cg_idx],
+        "trip_checkin_date": checkin,
+        "trip_checkout_date": checkout.strftime("%Y-%m-%d"),
+        "h3_hexagon_id_l4": df_camp["campground_h3_hexagon_id_l4"].to_numpy()[cg_idx],
+        "is_booking_canceled": rng.random(n) < 0.12,
+        "trip_total_cost": cost,
+        "campsite_category": category,
+    })
+
+
+def make_searches(rng, hexes, n):
+    # Demand partly follows supply and partly not, so some busy search
+    # destinations have few or no campgrounds.
+    demand = rng.permutation(hexes["weight"].to_numpy())
+    dest_p = 0.5 * hexes["weight"].to_numpy() + 0.5 * demand
+    dest = rng.choice(len(hexes), size=n, p=dest_p / dest_p.sum())
+    orig = rng.choice(len(hexes), size=n, p=rng.permutation(hexes["weight"].to_numpy()))
+
+    searchers = np.maximum(1, rng.lognormal(2.0, 1.3, size=n).astype(np.int64))
+    columns = {
+        "destination_h3_cell_id": hexes["h3_id"].to_numpy()[dest],
+        "destination_h3_parent_id": hexes["h3_parent_id"].to_numpy()[dest],
+        "origin_h3_cell_id": hexes["h3_id"].to_numpy()[orig],
+        "origin_h3_parent_id": hexes["h3_parent_id"].to_numpy()[orig],
+        "searchers": searchers.astype(float),
+    }
+    for col, share in zip(SEARCH_TYPES, SEARCH_TYPE_SHARE):
+        columns[col] = rng.binomial(searchers, share).astype(float)
+    channels = rng.multinomial(searchers, SEARCH_CHANNEL_SHARE)
+    for i, col in enumerate(SEARCH_CHANNELS):
+        columns[col] = channels[:, i].astype(float)
+    return pd.DataFrame(columns)
+
+
+# ==============================
+# 3. WRITING
+# ==============================
+def write_chunked(path, make_chunk, n, chunk_size):
+    """
+    Write `n` rows to `path`, `chunk_size` at a time. Uses pyarrow's CSV
+    writer when it is installed (several times faster than to_csv).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        pa = None
+
+    writer = None
+    try:
+        for first in range(0, max(n, 1), chunk_size):
+            df = make_chunk(min(chunk_size, n - first))
+            if pa is None:
+                df.to_csv(path, mode="w" if first == 0 else "a", header=first == 0, index=False)
+                continue
+            if writer is None:
+                schema = pa.Schema.from_pandas(df, preserve_index=False)
+                writer = pa_csv.CSVWriter(path, schema)
+            writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def generate(out, n_transactions, n_campgrounds=None, n_searches=None,
+             n_hexes=None, chunk_size=1_000_000, seed=0, log=None):
+    """Write the three CSVs to `out`. Unset sizes scale with n_transactions."""
+    n_campgrounds = n_campgrounds or max(50, n_transactions // 400)
+    n_searches = n_searches or max(1000, n_transactions // 4)
+    n_hexes = n_hexes or int(np.clip(n_campgrounds // 5, 50, 6000))
+    rng = np.random.default_rng(seed)
+    os.makedirs(out, exist_ok=True)
+
+    hexes = make_hexes(rng, n_hexes)
+    df_camp = make_campgrounds(rng, hexes, n_campgrounds)
+    df_camp.to_csv(os.path.join(out, "campgrounds.csv"), index=False)
+    if log is not None:
+        log(f"campgrounds.csv   {n_campgrounds:>12,} rows over {len(hexes):,} hexes")
+
+    write_chunked(
+        os.path.join(out, "transactions.csv"),
+        lambda rows: make_transactions(rng, df_camp, rows),
+        n_transactions, chunk_size,
+    )
+    if log is not None:
+        log(f"transactions.csv  {n_transactions:>12,} rows")
+
+    write_chunked(
+        os.path.join(out, "searches.csv"),
+        lambda rows: make_searches(rng, hexes, rows),
+        n_searches, chunk_size,
+    )
+    if log is not None:
+        log(f"searches.csv      {n_searches:>12,} rows")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic AllCamp CSVs.")
+    parser.add_argument("--out", default="synthetic", help="folder the CSVs are written to")
+    parser.add_argument("--transactions", type=int, default=100_000, help="booking rows")
+    parser.add_argument("--campgrounds", type=int, help="campground rows (default: transactions / 400)")
+    parser.add_argument("--searches", type=int, help="search rows (default: transactions / 4)")
+    parser.add_argument("--hexes", type=int, help="distinct L4 hexes (default: campgrounds / 5)")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="rows generated per write")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--force", action="store_true", help="overwrite existing CSVs in --out")
+    args = parser.parse_args(argv)
+
+    existing = [
+        name for name in ("campgrounds.csv", "transactions.csv", "searches.csv")
+        if os.path.exists(os.path.join(args.out, name))
+    ]
+    if existing and not args.force:
+        parser.error(f"{args.out} already has {', '.join(existing)}; pass --force to overwrite")
+
+    generate(
+        args.out,
+        args.transactions,
+        n_campgrounds=args.campgrounds,
+        n_searches=args.searches,
+        n_hexes=args.hexes,
+        chunk_size=args.chunk_size,
+        seed=args.seed,
+        log=print,
+    )
+
+
+if __name__ == "__main__":
+    main()